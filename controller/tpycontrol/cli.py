@@ -22,12 +22,12 @@
 
 import argparse
 import os
-import pkg_resources
 import sys
 
 from .devices import Devices
 from .tpycontrol import TPyControl
-from .deploy import deploy_package, restart_nodes, script_nodes
+from .deploy import deploy_package, restart_nodes, rolling_restart_nodes,\
+    script_nodes
 
 
 def main(args=None):
@@ -57,8 +57,8 @@ def main(args=None):
         help='deploys tpynode to all devices')
     parser_deploy.add_argument(
         '-p', '--pkg', dest='pkgfile',
-        default=pkg_resources.resource_filename(
-            __name__, 'data/tpynode-latest.tar.gz'),
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'data', 'tpynode-latest.tar.gz'),
         type=str, help='tpynode distribution package')
     parser_deploy.set_defaults(func=cli_deploy)
 
@@ -66,6 +66,12 @@ def main(args=None):
     parser_restart = subparsers.add_parser(
         'restart', parents=[parent_parser],
         help='restarts tpynode on all devices')
+    parser_restart.add_argument(
+        '-w', '--wave-size', dest='wave_size', default=None, type=int,
+        help='restart in waves of this many nodes and wait until ready')
+    parser_restart.add_argument(
+        '--ready-timeout', dest='ready_timeout', default=30, type=float,
+        help='seconds to wait for a restarted node to answer')
     parser_restart.set_defaults(func=cli_restart)
 
     # create the parser for the 'script' command
@@ -97,7 +103,12 @@ def cli_deploy(**kwargs):
 
 def cli_restart(**kwargs):
     devices = Devices(kwargs.get('devices', None))
-    restart_nodes(devices.get())
+    wave_size = kwargs.get('wave_size', None)
+    if wave_size is None:
+        restart_nodes(devices.get())
+    else:
+        rolling_restart_nodes(devices.get(), wave_size,
+                              ready_timeout=kwargs.get('ready_timeout', 30))
 
 
 def cli_script(**kwargs):
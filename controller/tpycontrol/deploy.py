@@ -23,6 +23,9 @@
 import os.path
 import time
 import subprocess
+import Pyro4
+
+from tabulate import tabulate
 
 
 def deploy_package(devices, file, timeout=None):
@@ -60,18 +63,91 @@ def deploy_package(devices, file, timeout=None):
 
 def restart_nodes(devices, timeout=10):
     print('Restarting TPyNode ...')
-
-    def restart_cmd(dev):
-        cmd = ['ssh', 'root@%s' % dev['host'],
-               '-o', 'StrictHostKeyChecking=no',
-               'tpynode', 'restart']
-        if dev.get('conf') is not None:
-            cmd.extend(['-c', dev['conf']])
-        return cmd
     cmds = [restart_cmd(dev) for dev in devices]
     run_parallel(cmds, timeout)
 
 
+def rolling_restart_nodes(devices, wave_size=1, timeout=10, ready_timeout=30):
+    """Restart nodes in waves and wait for each wave to become ready.
+
+    The nodes of a wave are restarted in parallel. Before the next wave is
+    started, the RPC endpoint of every node in the current wave is polled
+    until it answers again.
+
+    Args:
+        devices (list): Device configurations (see Devices.get())
+        wave_size (int): Number of nodes restarted at once
+        timeout (float): Timeout for the restart commands of a wave
+        ready_timeout (float): Deadline for a node to answer after restart
+
+    Returns:
+        list: Node, wave and seconds until ready for every device
+
+    Raises:
+        TimeoutError: If a node does not answer within ready_timeout
+    """
+    devices = list(devices)
+    wave_size = max(1, int(wave_size))
+    waves = [devices[i:i + wave_size]
+             for i in range(0, len(devices), wave_size)]
+
+    results = list()
+    for n, wave in enumerate(waves):
+        print('Restarting TPyNode wave %d/%d (%s) ...' % (
+            n + 1, len(waves), ', '.join(dev['name'] for dev in wave)))
+        tic = time.time()
+        run_parallel([restart_cmd(dev) for dev in wave], timeout)
+        for dev in wave:
+            wait_for_node(dev['host'], int(dev['port']), ready_timeout)
+            results.append({'node': dev['name'], 'host': dev['host'],
+                            'wave': n + 1,
+                            'ready': round(time.time() - tic, 3)})
+
+    print(tabulate(results, headers='keys'))
+    return results
+
+
+def wait_for_node(host, port, timeout=30, interval=0.05, max_interval=1.0):
+    """Poll the RPC endpoint of a node until it answers.
+
+    The poll interval starts at interval and is doubled after every failed
+    attempt, up to max_interval.
+
+    Returns:
+        float: Seconds until the node answered
+
+    Raises:
+        TimeoutError: If the node does not answer before the deadline
+    """
+    uri = 'PYRO:tpynode@{}:{}'.format(host, port)
+    tic = time.time()
+    deadline = tic + timeout
+    while True:
+        proxy = Pyro4.core.Proxy(uri)
+        proxy._pyroTimeout = max(0.1, min(max_interval, deadline - time.time()))
+        try:
+            proxy.echo('ready')
+            return time.time() - tic
+        except Pyro4.errors.CommunicationError:
+            pass
+        finally:
+            proxy._pyroRelease()
+        if time.time() + interval > deadline:
+            raise TimeoutError('Node %s:%d not ready after %.2f seconds' %
+                               (host, port, timeout))
+        time.sleep(interval)
+        interval = min(interval * 2, max_interval)
+
+
+def restart_cmd(dev):
+    cmd = ['ssh', 'root@%s' % dev['host'],
+           '-o', 'StrictHostKeyChecking=no',
+           'tpynode', 'restart']
+    if dev.get('conf') is not None:
+        cmd.extend(['-c', dev['conf']])
+    return cmd
+
+
 def script_nodes(devices, script, timeout=None):
     print('Running Custom Node Script ...')
     cmds = [[script, str(dev['host'])] for dev in devices]
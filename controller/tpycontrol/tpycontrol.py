@@ -20,14 +20,13 @@
 # Project:       TPY - The Testbed Experimentation Framework
 # Date:          2018-04-05
 
-import pkg_resources        # part of setuptools
-
 import logging
 from collections import OrderedDict
 from tabulate import tabulate
 
 from .devices import Devices
 from .tpyremotenode import TPyRemoteNode
+from .utils.version import get_version
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -82,7 +81,7 @@ class TPyControl:
 
     @property
     def version(self):
-        return pkg_resources.require("tpycontrol")[0].version
+        return get_version("tpycontrol")
 
     def get_deviceinfo(self, printable=False):
         info = list()
@@ -49,3 +49,20 @@ class TPyRemoteNode(TPyRemoteModule):
     def _lookup_modules(self):
         for module in self.modules:
             setattr(self, module, self._get_remote_module(module))
+
+    def reload_modules(self):
+        """Reload the node configuration and refresh the module proxies.
+
+        Only proxies of modules that were removed or changed on the node are
+        dropped, all other proxies stay connected.
+        """
+        result = self._proxy.reload()
+        for name in result['removed'] + result['changed'] + result['failed']:
+            module = self._modules.pop(name, None)
+            if module is not None:
+                module._proxy._pyroRelease()
+            if name in self.__dict__:
+                delattr(self, name)
+        self.modules = self._proxy.modules
+        self._lookup_modules()
+        return result
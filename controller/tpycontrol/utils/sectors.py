@@ -20,6 +20,7 @@
 # Project:       TPY - The Testbed Experimentation Framework
 # Date:          2018-02-05
 
+import serpent
 from tabulate import tabulate
 
 default_zero_sector_definition = {
@@ -33,3 +34,29 @@ default_zero_sector_definition = {
 def print_sector_codebook(device):
     codebook = device.wil6210iface.get_rf_tx_sector_codebook()
     print(tabulate(codebook, headers='keys'))
+
+
+def get_codebook_snapshot(device, name):
+    """Content of a codebook snapshot stored on a device."""
+    # Pyro transfers bytes base64 encoded
+    return serpent.tobytes(device.wil6210iface.get_rf_codebook_snapshot(name))
+
+
+def transfer_codebook_snapshot(src, dst, name, dst_name=None, force=False):
+    """Copy a codebook snapshot between devices with the same RF module.
+
+    The destination refuses snapshots of a different RF module unless
+    force is set.
+    """
+    data = get_codebook_snapshot(src, name)
+    dst.wil6210iface.put_rf_codebook_snapshot(dst_name or name, data, force)
+
+
+def download_codebook_snapshot(device, name, filename):
+    with open(filename, 'wb') as f:
+        f.write(get_codebook_snapshot(device, name))
+
+
+def upload_codebook_snapshot(device, filename, name, force=False):
+    with open(filename, 'rb') as f:
+        device.wil6210iface.put_rf_codebook_snapshot(name, f.read(), force)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#          ###########   ###########   ##########    ##########
+#         ############  ############  ############  ############
+#         ##            ##            ##   ##   ##  ##        ##
+#         ##            ##            ##   ##   ##  ##        ##
+#         ###########   ####  ######  ##   ##   ##  ##    ######
+#          ###########  ####  #       ##   ##   ##  ##    #    #
+#                   ##  ##    ######  ##   ##   ##  ##    #    #
+#                   ##  ##    #       ##   ##   ##  ##    #    #
+#         ############  ##### ######  ##   ##   ##  ##### ######
+#         ###########    ###########  ##   ##   ##   ##########
+#
+#            S E C U R E   M O B I L E   N E T W O R K I N G
+#
+# Author:        Daniel Steinmetzer
+# E-Mail:        dsteinmetzer@seemoo.tu-darmstadt.de
+# Website:       https://www.seemoo.de/dsteinmetzer
+# Project:       TPY - The Testbed Experimentation Framework
+# File:          version.py
+# Date:          2026-10-19
+#
+
+
+"""Versions of installed distributions, looked up once per process."""
+
+_versions = dict()
+
+
+def get_version(dist):
+    """Version of an installed distribution.
+
+    Uses importlib.metadata, or its backport on Python < 3.8, and only falls
+    back to the slow pkg_resources if neither is available.
+
+    Args:
+        dist (str): Name of the distribution
+
+    Returns:
+        str: The version
+    """
+    version = _versions.get(dist)
+    if version is None:
+        version = _versions[dist] = _lookup_version(dist)
+    return version
+
+
+def _lookup_version(dist):
+    try:
+        from importlib import metadata
+    except ImportError:
+        try:
+            import importlib_metadata as metadata
+        except ImportError:
+            metadata = None
+    if metadata is not None:
+        return metadata.version(dist)
+    import pkg_resources
+    return pkg_resources.require(dist)[0].version
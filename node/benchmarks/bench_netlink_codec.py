@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#          ###########   ###########   ##########    ##########
+#         ############  ############  ############  ############
+#         ##            ##            ##   ##   ##  ##        ##
+#         ##            ##            ##   ##   ##  ##        ##
+#         ###########   ####  ######  ##   ##   ##  ##    ######
+#          ###########  ####  #       ##   ##   ##  ##    #    #
+#                   ##  ##    ######  ##   ##   ##  ##    #    #
+#                   ##  ##    #       ##   ##   ##  ##    #    #
+#         ############  ##### ######  ##   ##   ##  ##### ######
+#         ###########    ###########  ##   ##   ##   ##########
+#
+#            S E C U R E   M O B I L E   N E T W O R K I N G
+#
+# Author:        Daniel Steinmetzer
+# E-Mail:        dsteinmetzer@seemoo.tu-darmstadt.de
+# Website:       https://www.seemoo.de/dsteinmetzer
+# Project:       TPY - The Testbed Experimentation Framework
+# File:          bench_netlink_codec.py
+# Date:          2026-10-19
+#
+
+
+"""Compare the netlink attribute codec against the previous implementation.
+
+Decodes the vendor responses in fixtures/nl_vendor_responses.txt and
+encodes a sector configuration request with both implementations, checks
+that their results are equal and reports the time per call.
+
+Usage: python3 bench_netlink_codec.py [-n ITERATIONS]
+"""
+
+import argparse
+import json
+import math
+import os
+import struct
+import sys
+import timeit
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tpynode.tools import netlink  # noqa: E402
+
+NLA_ATTR_BYTE_ALIGN = netlink.NLA_ATTR_BYTE_ALIGN
+NLParseError = netlink.NLParseError
+
+fixtures = os.path.join(os.path.dirname(__file__), 'fixtures')
+policy_file = os.path.join(os.path.dirname(__file__), '..', 'tpynode',
+                           'data', 'wil_rf_sector_policy.json')
+
+
+def legacy_nl_decode(nla, policy):
+    nla_parsed = OrderedDict()
+    ptr = 0
+
+    # Iterate over nla to find all attributes
+    while ptr < len(nla):
+
+        # Extract the current nla header
+        cur_hdr = struct.unpack_from('HH', nla, offset=ptr)
+        cur_attr_type = cur_hdr[1]
+        cur_attr_len = cur_hdr[0]
+        cur_attr_payload = nla[ptr + 4: ptr + cur_attr_len]
+
+        if not len(cur_attr_payload) == (cur_attr_len - 4):
+            raise EnvironmentError('Payload Length Check failed, \
+                this should not happen')
+
+        # Detect Attribute Type
+        matched_policies =\
+            [key for key, value in policy.items()
+                if ('nla_type' not in value or
+                    value['nla_type'] == cur_attr_type) and
+                   ('nla_len' not in value or
+                    value['nla_len'] == cur_attr_len - 4)]
+
+        if not matched_policies:
+            print('Unmatched type found %d' % cur_attr_type)
+
+        else:
+            cur_attr_key = matched_policies[0]
+            cur_attr = policy[cur_attr_key].copy()
+            cur_attr.pop('nested', None)
+            cur_attr['nla_type'] = cur_attr_type
+            cur_attr['nla_len'] = cur_attr_len - 4
+
+            # Check the data type to encode according to policy
+            if cur_attr['data_type'] == 'NLA_U8':
+                cur_attr_value =\
+                    struct.unpack_from('B', nla, offset=(ptr + 4))[0]
+                cur_attr_value_raw = nla[ptr + 4: ptr + 5]
+                cur_attr_value_raw.reverse()
+                cur_attr_value_raw =\
+                    "".join("%02x" % b for b in cur_attr_value_raw)
+            elif cur_attr['data_type'] == 'NLA_U16':
+                cur_attr_value =\
+                    struct.unpack_from('H', nla, offset=(ptr + 4))[0]
+                cur_attr_value_raw = nla[ptr + 4: ptr + 6]
+                cur_attr_value_raw.reverse()
+                cur_attr_value_raw =\
+                    "".join("%02x" % b for b in cur_attr_value_raw)
+            elif cur_attr['data_type'] == 'NLA_U32':
+                cur_attr_value =\
+                    struct.unpack_from('I', nla, offset=(ptr + 4))[0]
+                cur_attr_value_raw = nla[ptr + 4: ptr + 8]
+                cur_attr_value_raw.reverse()
+                cur_attr_value_raw =\
+                    "".join("%02x" % b for b in cur_attr_value_raw)
+            elif cur_attr['data_type'] == 'NLA_U64':
+                cur_attr_value =\
+                    struct.unpack_from('Q', nla, offset=(ptr + 4))[0]
+                cur_attr_value_raw = nla[ptr + 4: ptr + 12]
+                cur_attr_value_raw.reverse()
+                cur_attr_value_raw =\
+                    "".join("%02x" % b for b in cur_attr_value_raw)
+            elif cur_attr['data_type'] == 'NLA_NESTED':
+                    cur_attr_value = legacy_nl_decode(
+                        cur_attr_payload, policy[cur_attr_key]['nested'])
+                    cur_attr_value_raw = None
+            else:
+                raise NLParseError('Unsupported Datatype detected')
+
+            # Append current attr to list
+            cur_attr['value'] = cur_attr_value
+            cur_attr['value_raw'] = cur_attr_value_raw
+            nla_parsed[cur_attr_key] = cur_attr
+
+        # Set pointer to next attribute and align to 4 bytes
+        b = NLA_ATTR_BYTE_ALIGN
+        ptr = ptr + b * math.ceil(cur_attr_len / b)
+
+    return nla_parsed
+
+
+def legacy_nl_encode(dataset, policy):
+    nla_stream = bytearray()
+
+    # Iterate over all elements in nla_struct
+    for cur_key, cur_val in dataset.items():
+
+        try:
+
+            if not (type(cur_val) is dict or type(cur_val) is OrderedDict):
+                cur_val = {'value': cur_val}
+
+            # Check for matching policy
+            mpolicies =\
+                [pol_val for pol_key, pol_val in policy.items() if
+                    (pol_key == cur_key) and
+                    ('nla_type' not in pol_val or 'nla_type' not in cur_val or
+                     cur_val['nla_type'] == pol_val['nla_type']) and
+                    ('nla_len' not in pol_val or 'nla_len' not in cur_val or
+                     cur_val['nla_len'] == pol_val['nla_len'])]
+
+            exp_attr = mpolicies[0].copy()
+            exp_attr.update(cur_val)
+
+            # TODO: Check for all variables available
+
+            if exp_attr['data_type'] == 'NLA_U8':
+                attr_enc =\
+                    struct.pack('HHB', exp_attr['nla_len'] + 4,
+                                exp_attr['nla_type'], exp_attr['value'])
+            elif exp_attr['data_type'] == 'NLA_U16':
+                attr_enc =\
+                    struct.pack('HHH', exp_attr['nla_len'] + 4,
+                                exp_attr['nla_type'], exp_attr['value'])
+            elif exp_attr['data_type'] == 'NLA_U32':
+                attr_enc =\
+                    struct.pack('HHI', exp_attr['nla_len'] + 4,
+                                exp_attr['nla_type'], exp_attr['value'])
+            elif exp_attr['data_type'] == 'NLA_U64':
+                attr_enc =\
+                    struct.pack('HHQ', exp_attr['nla_len'] + 4,
+                                exp_attr['nla_type'], exp_attr['value'])
+            elif exp_attr['data_type'] == 'NLA_NESTED':
+                payload = legacy_nl_encode(cur_val, mpolicies[0]['nested'])
+                attr_enc =\
+                    struct.pack('HH', len(payload) + 4,
+                                exp_attr['nla_type'])
+                attr_enc = attr_enc + payload
+            elif exp_attr['data_type'] == 'NLA_UNSPEC':
+                attr_enc =\
+                    struct.pack('HH', exp_attr['nla_len'] + 4,
+                                exp_attr['nla_type'])
+                enc_payload = bytearray(exp_attr['value'].to_bytes(
+                    exp_attr['nla_len'], byteorder='little', signed=False))
+                attr_enc = attr_enc + enc_payload
+            else:
+                raise EnvironmentError('Unsupported Data-type detected')
+
+            # Add padding
+            b = NLA_ATTR_BYTE_ALIGN
+            numpad = math.ceil(len(attr_enc) / b) * b - len(attr_enc)
+            attr_enc = bytearray(attr_enc) + bytearray(numpad)
+
+            nla_stream = nla_stream + attr_enc
+
+        except Exception:
+            raise Exception('Error parsing attribute %s' % cur_key)
+
+    return nla_stream
+
+
+def sector_cfg_request():
+    cfg = OrderedDict()
+    cfg['QCA_ATTR_DMG_RF_SECTOR_CFG_MODULE_INDEX'] = 0
+    for n, name in enumerate(('ETYPE0', 'ETYPE1', 'ETYPE2', 'PSH_HI',
+                              'PSH_LO', 'DTYPE_X16')):
+        cfg['QCA_ATTR_DMG_RF_SECTOR_CFG_%s' % name] = 0x01010101 * (n + 1)
+    request = OrderedDict()
+    request['QCA_ATTR_DMG_RF_SECTOR_INDEX'] = 12
+    request['QCA_ATTR_DMG_RF_SECTOR_TYPE'] = 1
+    request['QCA_ATTR_DMG_RF_SECTOR_CFG'] = OrderedDict(
+        [('QCA_ATTR_DMG_RF_SECTOR_CFG_MODULE_0', cfg)])
+    return request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--iterations', type=int, default=10000)
+    args = parser.parse_args()
+
+    with open(policy_file) as f:
+        policy = json.load(f)
+    compiled = netlink.NLPolicy(policy)
+    with open(os.path.join(fixtures, 'nl_vendor_responses.txt')) as f:
+        responses = [bytearray.fromhex(line) for line in f
+                     if not line.startswith('#')]
+    request = sector_cfg_request()
+
+    benchmarks = [
+        ('decode[%d]' % n,
+         lambda r=r: legacy_nl_decode(r, policy),
+         lambda r=r: netlink.nl_decode(r, compiled))
+        for n, r in enumerate(responses)]
+    benchmarks.append(('encode',
+                       lambda: legacy_nl_encode(request, policy),
+                       lambda: netlink.nl_encode(request, compiled)))
+
+    print('%-12s %12s %12s %8s' % ('entry', 'legacy [us]', 'new [us]',
+                                   'speedup'))
+    for name, legacy, new in benchmarks:
+        assert legacy() == new()
+        t_legacy = timeit.timeit(legacy, number=args.iterations)
+        t_new = timeit.timeit(new, number=args.iterations)
+        print('%-12s %12.1f %12.1f %7.1fx' % (
+            name, t_legacy / args.iterations * 1e6,
+            t_new / args.iterations * 1e6, t_legacy / t_new))
+
+
+if __name__ == '__main__':
+    main()
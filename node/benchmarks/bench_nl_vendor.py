@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#          ###########   ###########   ##########    ##########
+#         ############  ############  ############  ############
+#         ##            ##            ##   ##   ##  ##        ##
+#         ##            ##            ##   ##   ##  ##        ##
+#         ###########   ####  ######  ##   ##   ##  ##    ######
+#          ###########  ####  #       ##   ##   ##  ##    #    #
+#                   ##  ##    ######  ##   ##   ##  ##    #    #
+#                   ##  ##    #       ##   ##   ##  ##    #    #
+#         ############  ##### ######  ##   ##   ##  ##### ######
+#         ###########    ###########  ##   ##   ##   ##########
+#
+#            S E C U R E   M O B I L E   N E T W O R K I N G
+#
+# Author:        Daniel Steinmetzer
+# E-Mail:        dsteinmetzer@seemoo.tu-darmstadt.de
+# Website:       https://www.seemoo.de/dsteinmetzer
+# Project:       TPY - The Testbed Experimentation Framework
+# File:          bench_nl_vendor.py
+# Date:          2026-10-19
+#
+
+
+"""Compare the transports of QCA vendor commands on a node.
+
+Reads sector configurations through generic netlink and through iw,
+checks that both return the same configuration and reports the time per
+call. Has to run as root on a node with a wil6210 interface.
+
+Usage: python3 bench_nl_vendor.py [-i IFACE] [-n ITERATIONS] [-s SECTOR]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tpynode.tools import genl  # noqa: E402
+from tpynode.tools.rfantenna import rfantenna  # noqa: E402
+
+
+def get_sector_config(backend, iface, sector):
+    genl.nl80211_backend = backend
+    return rfantenna.get_sector_config(iface, rfantenna.RF_SECTOR_TYPE_TX,
+                                       sector)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-i', '--iface', default='wlan2')
+    parser.add_argument('-n', '--iterations', type=int, default=100)
+    parser.add_argument('-s', '--sector', type=int, default=1)
+    args = parser.parse_args()
+
+    assert get_sector_config('iw', args.iface, args.sector) == \
+        get_sector_config('genl', args.iface, args.sector)
+
+    print('%-8s %12s' % ('backend', 'call [ms]'))
+    for backend in ('iw', 'genl'):
+        t = timeit.timeit(
+            lambda: get_sector_config(backend, args.iface, args.sector),
+            number=args.iterations)
+        print('%-8s %12.2f' % (backend, t / args.iterations * 1e3))
+
+
+if __name__ == '__main__':
+    main()
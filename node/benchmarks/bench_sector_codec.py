@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#          ###########   ###########   ##########    ##########
+#         ############  ############  ############  ############
+#         ##            ##            ##   ##   ##  ##        ##
+#         ##            ##            ##   ##   ##  ##        ##
+#         ###########   ####  ######  ##   ##   ##  ##    ######
+#          ###########  ####  #       ##   ##   ##  ##    #    #
+#                   ##  ##    ######  ##   ##   ##  ##    #    #
+#                   ##  ##    #       ##   ##   ##  ##    #    #
+#         ############  ##### ######  ##   ##   ##  ##### ######
+#         ###########    ###########  ##   ##   ##   ##########
+#
+#            S E C U R E   M O B I L E   N E T W O R K I N G
+#
+# Author:        Daniel Steinmetzer
+# E-Mail:        dsteinmetzer@seemoo.tu-darmstadt.de
+# Website:       https://www.seemoo.de/dsteinmetzer
+# Project:       TPY - The Testbed Experimentation Framework
+# File:          bench_sector_codec.py
+# Date:          2026-10-19
+#
+
+
+"""Compare the bulk sector config codec against the scalar one.
+
+Encodes and decodes random sector configs with both implementations, checks
+that they are bit-exact and reports the time per sector.
+
+Usage: python3 bench_sector_codec.py [-n SECTORS]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tpynode.tools.rfantenna import rfantenna  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--sectors', type=int, default=4096)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    psh = rng.randint(0, 4, (args.sectors, 32))
+    etype = rng.randint(0, 8, (args.sectors, 32))
+    dtype = rng.randint(0, 8, (args.sectors, 8))
+    x16 = rng.randint(0, 256, args.sectors)
+    configs = [{'psh': psh[i].tolist(), 'etype': etype[i].tolist(),
+                'dtype': dtype[i].tolist(), 'x16': int(x16[i])}
+               for i in range(args.sectors)]
+
+    def scalar_encode():
+        return [rfantenna.encode_sector_config(cfg) for cfg in configs]
+
+    def bulk_encode():
+        return rfantenna.encode_sector_configs(psh, etype, dtype, x16)
+
+    raw = bulk_encode()
+    raw_list = [tuple(int(w) for w in words) for words in raw]
+    assert raw_list == scalar_encode()
+
+    def scalar_decode():
+        return [rfantenna.decode_sector_config(*words) for words in raw_list]
+
+    def bulk_decode():
+        return rfantenna.decode_sector_configs(raw)
+
+    decoded = bulk_decode()
+    for i, cfg in enumerate(scalar_decode()):
+        assert cfg == {key: value[i].tolist()
+                       for key, value in decoded.items()}
+
+    print('%-8s %12s %12s %8s' % ('entry', 'scalar [us]', 'bulk [us]',
+                                  'speedup'))
+    for name, scalar, bulk in (('encode', scalar_encode, bulk_encode),
+                               ('decode', scalar_decode, bulk_decode)):
+        t_scalar = min(timeit.repeat(scalar, number=1, repeat=3))
+        t_bulk = min(timeit.repeat(bulk, number=1, repeat=3))
+        print('%-8s %12.2f %12.2f %7.1fx' % (
+            name, t_scalar / args.sectors * 1e6,
+            t_bulk / args.sectors * 1e6, t_scalar / t_bulk))
+
+
+if __name__ == '__main__':
+    main()
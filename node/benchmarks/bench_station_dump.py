@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#          ###########   ###########   ##########    ##########
+#         ############  ############  ############  ############
+#         ##            ##            ##   ##   ##  ##        ##
+#         ##            ##            ##   ##   ##  ##        ##
+#         ###########   ####  ######  ##   ##   ##  ##    ######
+#          ###########  ####  #       ##   ##   ##  ##    #    #
+#                   ##  ##    ######  ##   ##   ##  ##    #    #
+#                   ##  ##    #       ##   ##   ##  ##    #    #
+#         ############  ##### ######  ##   ##   ##  ##### ######
+#         ###########    ###########  ##   ##   ##   ##########
+#
+#            S E C U R E   M O B I L E   N E T W O R K I N G
+#
+# Author:        Daniel Steinmetzer
+# E-Mail:        dsteinmetzer@seemoo.tu-darmstadt.de
+# Website:       https://www.seemoo.de/dsteinmetzer
+# Project:       TPY - The Testbed Experimentation Framework
+# File:          bench_station_dump.py
+# Date:          2026-10-19
+#
+
+
+"""Compare the backends of the station dump on a node.
+
+Checks the iw parser against fixtures/iw_station_dump.txt and reports the
+time per parse. Then dumps the stations of an interface through generic
+netlink and through iw, checks that both report the same stations and
+prints the calls per second of each backend. The second part has to run
+as root on a node with an associated interface and is skipped with -f.
+
+Usage: python3 bench_station_dump.py [-f] [-i IFACE] [-n ITERATIONS]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tpynode.tools import genl, link  # noqa: E402
+
+fixtures = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# Bitrate and MCS of the stations in the fixture
+fixture_rates = [(2502.5, 8, 385.0, 1), (150.0, 7, 866.7, 9),
+                 (6.0, None, None, None)]
+
+
+def get_stations(backend, iface):
+    genl.nl80211_backend = backend
+    return link.get_station_dump(iface)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-i', '--iface', default='wlan2')
+    parser.add_argument('-n', '--iterations', type=int, default=100)
+    parser.add_argument('-f', '--fixture-only', action='store_true')
+    args = parser.parse_args()
+
+    with open(os.path.join(fixtures, 'iw_station_dump.txt')) as f:
+        data = f.read()
+    assert [(sta['tx_bitrate'], sta['tx_mcs'], sta['rx_bitrate'],
+             sta['rx_mcs']) for sta in link.parse_iw_station_dump(data)] == \
+        fixture_rates
+    t = timeit.timeit(lambda: link.parse_iw_station_dump(data),
+                      number=args.iterations)
+    print('iw parse %12.2f us' % (t / args.iterations * 1e6))
+    if args.fixture_only:
+        return
+
+    assert [sta['mac'] for sta in get_stations('iw', args.iface)] == \
+        [sta['mac'] for sta in get_stations('genl', args.iface)]
+
+    print('%-8s %12s %12s' % ('backend', 'call [ms]', 'calls/s'))
+    for backend in ('iw', 'genl'):
+        t = timeit.timeit(lambda: get_stations(backend, args.iface),
+                          number=args.iterations)
+        print('%-8s %12.2f %12.1f' % (backend, t / args.iterations * 1e3,
+                                      args.iterations / t))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#          ###########   ###########   ##########    ##########
+#         ############  ############  ############  ############
+#         ##            ##            ##   ##   ##  ##        ##
+#         ##            ##            ##   ##   ##  ##        ##
+#         ###########   ####  ######  ##   ##   ##  ##    ######
+#          ###########  ####  #       ##   ##   ##  ##    #    #
+#                   ##  ##    ######  ##   ##   ##  ##    #    #
+#                   ##  ##    #       ##   ##   ##  ##    #    #
+#         ############  ##### ######  ##   ##   ##  ##### ######
+#         ###########    ###########  ##   ##   ##   ##########
+#
+#            S E C U R E   M O B I L E   N E T W O R K I N G
+#
+# Author:        Daniel Steinmetzer
+# E-Mail:        dsteinmetzer@seemoo.tu-darmstadt.de
+# Website:       https://www.seemoo.de/dsteinmetzer
+# Project:       TPY - The Testbed Experimentation Framework
+# File:          bench_wil6210_parsers.py
+# Date:          2026-10-19
+#
+
+"""Compare the wil6210 debugfs parsers against the previous implementation.
+
+The previous parsers are kept here as reference. Both are run on the
+fixtures in fixtures/, their results are checked for equivalence and the
+time per parse is reported.
+
+Usage: python3 bench_wil6210_parsers.py [-n ITERATIONS]
+"""
+
+import argparse
+import os
+import re
+import struct
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tpynode.tools import wil6210  # noqa: E402
+
+fixtures = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+with open(os.path.join(fixtures, 'wil6210_mbox_prev.txt')) as f:
+    data_mbox_prev = f.read()
+
+
+def legacy_bf(data):
+    for seg in data.split('CID'):
+        results = list()
+        m = re.findall('\s*(\d+)\s*\{', seg)
+        if m:
+            r = dict()
+            r['cid'] = m[0]
+            r['tsf'] = re.findall('TSF\s+=\s+(0x[0-9a-fA-F]+)', seg)[0]
+            r['tx_mcs'] = re.findall('TxMCS\s+=\s+(\d+)', seg)[0]
+            r['tx_tpt'] = re.findall('TxTpt\s+=\s+(\d+)', seg)[0]
+            r['sqi'] = re.findall('SQI\s+=\s+(\d+)', seg)[0]
+            r['rssi'] = re.findall('RSSI\s+=\s+(-?\d+)', seg)[0]
+            r['status_code'], r['status'] =\
+                re.findall('Status\s+=\s+(0x[0-9a-fA-F]+)\s(\w+)', seg)[0]
+            r['rx_sector'], r['tx_sector'] =\
+                re.findall('Sectors.*my\s+(\d+)\:\s*(\d+)', seg)[0]
+            r['rx_sector_peer'], r['tx_sector_peer'] =\
+                re.findall('Sectors.*peer\s+(\d+)\:\s*(\d+)', seg)[0]
+            r['rx_goodput'], r['tx_goodput'] =\
+                re.findall('Goodput\(rx\:tx\)\s+(\d+)\:\s*(\d+)', seg)[0]
+            results.append(r)
+    return results
+
+
+def legacy_sweep_dump(data):
+    sweepinfo = list()
+    for swp_data in re.findall('\[.*\]', data):
+        swp = dict()
+        swp['id'] = int(re.findall('\[\s*(\d+)', swp_data)[0])
+        swp['src'] = re.findall('src:\s+([0-9a-fA-F:]{17})', swp_data)[0]
+        swp['sec'] = int(re.findall('sec:\s+(\d+)', swp_data)[0])
+        swp['cdown'] = int(re.findall('cdown:\s+(\d+)', swp_data)[0])
+        swp['initiator'] = not bool(re.findall('dir:\s+(\d)', swp_data)[0])
+        swp['snr'] = float(re.findall('snr:\s+(-?\d+.\d+)\sdB', swp_data)[0])
+        swp['snr_raw'] = re.findall('snr:.*\((0x[0-9a-fA-F:]+)\)', swp_data)[0]
+        if swp['src'] != '00:00:00:00:00:00':
+            sweepinfo.append(swp)
+    return sweepinfo
+
+
+def legacy_recovery(data):
+    mode = re.findall('mode\s+=\s+(\S+)', data)
+    mode = mode[0] if mode else 'unknown'
+    state = re.findall('state\s+=\s+(\S+)', data)
+    state = state[0] if state else 'unknown'
+    return {'mode': mode, 'state': state}
+
+
+def legacy_temp(data):
+    t_mac = re.findall('T_mac\s+=\s+(\d+.\d+)', data)
+    t_mac = float(t_mac[0]) if t_mac else 0
+    t_rad = re.findall('T_radio\s+=\s+(\d+.\d+)', data)
+    t_rad = float(t_rad[0]) if t_rad else 0
+    return {'mac': t_mac, 'radio': t_rad}
+
+
+def legacy_mbox(data):
+    mbox = {'ring_tx': list(), 'ring_rx': list()}
+    ring_tx = data.split('ring rx = ')[0]
+    ring_rx = data.split('ring rx = ')[1]
+    for ring, ring_data in (('ring_rx', ring_rx), ('ring_tx', ring_tx)):
+        for entry in re.split('\[.{2}\]', ring_data)[1:]:
+            entry_lines = entry.splitlines()
+            entry_data = ''.join(entry_lines[1:])
+            entry_data = ''.join(re.findall('[0-9a-fA-F]{2}', entry_data))
+            if len(entry_data) > 0:
+                entry_bytes = bytearray.fromhex(entry_data)
+                evt_id = struct.unpack_from('B B H I', entry_bytes)[2]
+                mbox[ring].append({'id': evt_id, 'data': entry_bytes[8:]})
+    return mbox
+
+
+def mbox_reader(data):
+    # Reading the mailbox after a WMI call, with two new events in the ring
+    reader = wil6210.MailboxReader()
+    reader.read(data_mbox_prev)
+    return reader.read(data)
+
+
+def check_bf(legacy, parsed):
+    # The previous parser only returned the last connection as strings
+    last = parsed[-1]
+    for key, value in legacy[0].items():
+        conv = wil6210.hex_int if value.startswith('0x') else type(last[key])
+        assert conv(value) == last[key], key
+
+
+def check_sweep_dump(legacy, parsed):
+    # The previous parser always reported initiator as False
+    assert len(legacy) == len(parsed)
+    for old, new in zip(legacy, parsed):
+        assert {k: v for k, v in old.items() if k != 'initiator'} == \
+            {k: v for k, v in new.items() if k != 'initiator'}
+
+
+def check_mbox(legacy, parsed):
+    # The reader only decodes the events received after the previous read
+    with open(os.path.join(fixtures, 'wil6210_mbox.txt')) as f:
+        parsed_all = wil6210.parse_mbox(f.read())
+    for ring in ('ring_tx', 'ring_rx'):
+        assert [(e['id'], bytes(e['data'])) for e in legacy[ring]] == \
+            [(e.id, e.data) for e in parsed_all[ring]]
+    assert parsed == parsed_all['ring_rx'][5:7]
+
+    # The firmware rewrote the tail slot, but the driver did not consume it
+    with open(os.path.join(fixtures, 'wil6210_mbox.txt')) as f:
+        data = f.read()
+    reader = wil6210.MailboxReader()
+    reader.read(data)
+    assert reader.read(data.replace('E th 0x008c0700 -> 0008',
+                                    'E th 0x008c0700 -> 0081')) == []
+
+    # The driver consumed a full round of the ring
+    reader.read(data)
+    assert len(reader.read(data.replace('0x008c0600 -> 0082',
+                                        '0x008c0600 -> 0102'))) == \
+        len(parsed_all['ring_rx'])
+
+
+def check_equal(legacy, parsed):
+    assert legacy == parsed
+
+
+benchmarks = [
+    ('bf', legacy_bf, wil6210.parse_bf, check_bf),
+    ('sweep_dump', legacy_sweep_dump, wil6210.parse_sweep_dump,
+     check_sweep_dump),
+    ('recovery', legacy_recovery, wil6210.parse_recovery, check_equal),
+    ('temp', legacy_temp, wil6210.parse_temp, check_equal),
+    ('mbox', legacy_mbox, mbox_reader, check_mbox)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    print('%-12s %12s %12s %8s' % ('entry', 'legacy [us]', 'new [us]',
+                                   'speedup'))
+    for name, legacy, parse, check in benchmarks:
+        with open(os.path.join(fixtures, 'wil6210_%s.txt' % name)) as f:
+            data = f.read()
+        check(legacy(data), parse(data))
+        t_legacy = timeit.timeit(lambda: legacy(data), number=args.iterations)
+        t_parse = timeit.timeit(lambda: parse(data), number=args.iterations)
+        print('%-12s %12.1f %12.1f %7.1fx' % (
+            name, t_legacy / args.iterations * 1e6,
+            t_parse / args.iterations * 1e6, t_legacy / t_parse))
+
+
+if __name__ == '__main__':
+    main()
@@ -64,6 +64,7 @@ setup(
     extras_require={
         'dev': ['check-manifest'],
         'test': ['coverage'],
+        'numpy': ['numpy'],
     },
 
     # If there are data files included in your packages that need to be
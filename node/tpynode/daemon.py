@@ -22,20 +22,26 @@
 
 import argparse
 import configparser
+import functools
 import inspect
+import json
 import logging
-import pkg_resources
+import pkgutil
 import Pyro4
 import sys
 import os
 import signal
+import tempfile
 import time
 
+from collections import OrderedDict
 from daemonize import Daemonize
 from pluginbase import PluginBase
 from tabulate import tabulate
 
 from .tpynode import TPyNode
+from .tools.version import get_version
+from .worker import ModuleWorker, create_forwarder
 import tpynode.modules
 
 # -----------------------------------------------------------------------------
@@ -44,6 +50,8 @@ import tpynode.modules
 
 sys.excepthook = Pyro4.util.excepthook
 cfgfile_default = '/etc/tpynode.conf'
+module_index_default = os.path.join(tempfile.gettempdir(),
+                                    'tpynode-modules.json')
 
 # -----------------------------------------------------------------------------
 # --- Logger Settings ---------------------------------------------------------
@@ -63,85 +71,176 @@ logger.setLevel(log_level)
 # --- Functions ---------------------------------------------------------------
 # -----------------------------------------------------------------------------
 
-def load_external_modules(module_path, base_type=object):
-
+def load_plugin_index(index_file):
+    try:
+        with open(index_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return dict()
+
+
+def store_plugin_index(index_file, index):
+    try:
+        tmp_file = '%s.%d' % (index_file, os.getpid())
+        with open(tmp_file, 'w') as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp_file, index_file)
+    except OSError as e:
+        logger.warning('Unable to store module index %s: %s' % (index_file, e))
+
+
+def find_plugins(module_path):
+    plugins = list()
+    for plugin in pkgutil.iter_modules([module_path]):
+        if plugin.ispkg:
+            plugin_file = os.path.join(module_path, plugin.name, '__init__.py')
+        else:
+            plugin_file = os.path.join(module_path, plugin.name + '.py')
+        if os.path.isfile(plugin_file):
+            plugins.append((plugin.name, plugin_file))
+    return plugins
+
+
+def scan_plugin(plugin_source, plugin_module, base_type=object):
+    # Import the plugin and list its local classes of base type
+    plugin = plugin_source.load_plugin(plugin_module)
+    classes = list()
+    for class_name, plugin_class in inspect.getmembers(plugin, inspect.isclass):
+        if plugin_class.__module__ == plugin.__name__ and \
+                issubclass(plugin_class, base_type):
+            classes.append(class_name)
+    return classes
+
+
+def load_external_module(plugin_source, plugin_module, name):
+    plugin = plugin_source.load_plugin(plugin_module)
+    module = getattr(plugin, name)
+    module.__file__ = plugin.__file__
+    module.__plugin__ = True
+    return module
+
+
+def load_external_modules(module_path, base_type=object, index_file=None,
+                          rescan=False):
+    """Discover external modules in module_path.
+
+    Plugins are only imported if they are new or changed since the last
+    scan, according to the index stored in index_file (keyed on file path,
+    mtime and size). All other plugins are imported when their modules are
+    used for the first time.
+    """
+    modules = OrderedDict()
     if not module_path:
         logger.info('Skipping loading external modules')
-        return list()
+        return modules
 
     logger.info('Loading external modules from %s' % (module_path))
     pluginbase = PluginBase(package='modules_ext')
     plugin_source = pluginbase.make_plugin_source(searchpath=[module_path],
                                                   persist=True,
                                                   identifier='tpymodules')
-    modules = list()
 
-    # Find the Plugins
-    for plugin_module in plugin_source.list_plugins():
+    base_type_name = '%s.%s' % (base_type.__module__, base_type.__qualname__)
+    index = dict()
+    if index_file and not rescan:
+        index = load_plugin_index(index_file)
+        if index.get('base_type') != base_type_name:
+            index = dict()
+    cached_plugins = index.get('plugins', dict())
+    plugins = dict()
 
-        # Try to load the plugin
-        try:
-            plugin = plugin_source.load_plugin(plugin_module)
-            plugin_classes = inspect.getmembers(plugin, inspect.isclass)
-
-            # Check the classes in the plugin
-            for plugin_class in plugin_classes:
-
-                # Only scan local classes
-                if plugin_class[1].__module__ == plugin.__name__:
-
-                    # Check base type
-                    if issubclass(plugin_class[1], base_type):
-
-                        module_name = plugin_class[0]
-                        module = plugin_class[1]
-                        module_file = os.path.basename(plugin.__file__)   
-                        logger.info('Importing external module %s from %s' % (module_name, module_file))
-                        module.__file__ = plugin.__file__
-                        module.__plugin__ = True
-
-                        # Add this module
-                        modules.append(module)
-        except Exception as e:
-            logger.error('Unable to load external modules from %s, import failed' % plugin_module)
-            # ToDo: Real parsing here
-            logger.exception(e)
+    # Find the Plugins
+    for plugin_module, plugin_file in find_plugins(module_path):
+        stat = os.stat(plugin_file)
+        entry = cached_plugins.get(plugin_file)
+        if entry and entry['plugin'] == plugin_module and \
+                entry['mtime'] == stat.st_mtime_ns and \
+                entry['size'] == stat.st_size:
+            logger.debug('Using module index for %s' % plugin_file)
+        else:
+            # Try to load the plugin
+            try:
+                logger.info('Scanning external modules in %s' % plugin_file)
+                entry = {'plugin': plugin_module,
+                         'mtime': stat.st_mtime_ns,
+                         'size': stat.st_size,
+                         'classes': scan_plugin(plugin_source, plugin_module,
+                                                base_type)}
+            except Exception as e:
+                logger.error('Unable to load external modules from %s, import failed' % plugin_module)
+                # ToDo: Real parsing here
+                logger.exception(e)
+                continue
+        plugins[plugin_file] = entry
+
+        for module_name in entry['classes']:
+            logger.info('Found external module %s in %s' % (
+                module_name, os.path.basename(plugin_file)))
+            modules[module_name] = functools.partial(
+                load_external_module, plugin_source, plugin_module,
+                module_name)
+
+    if index_file and plugins != cached_plugins:
+        store_plugin_index(index_file, {'base_type': base_type_name,
+                                        'plugins': plugins})
     return modules
 
 
-def load_internal_modules(base_type=object):
+def load_internal_module(name):
+    module = tpynode.modules.get_module(name)
+    module.__plugin__ = False
+    return module
 
-    # Find internal modules
-    modules = list()
-    int_modules = inspect.getmembers(tpynode.modules, inspect.isclass)
-    for module_class in int_modules:
-        module = module_class[1]
-        if issubclass(module, base_type):
-            logger.info('Using internal module %s' % module.__name__)
-            module.__plugin__ = False
-            modules.append(module)
+
+def load_internal_modules():
+
+    # Internal modules are only imported once they are used
+    modules = OrderedDict()
+    for name in tpynode.modules.module_index:
+        modules[name] = functools.partial(load_internal_module, name)
     return modules
 
 
-def load_modules(ext_module_path, base_type=object):
-    modules = load_internal_modules(base_type)
-    modules.extend(load_external_modules(ext_module_path, base_type))
+def load_modules(ext_module_path, base_type=object, index_file=None,
+                 rescan=False):
+    modules = load_internal_modules()
+    ext_modules = load_external_modules(ext_module_path, base_type,
+                                        index_file, rescan)
+    for name, loader in ext_modules.items():
+        if name in modules:
+            logger.warning('External module %s shadowed by internal module' % name)
+            continue
+        modules[name] = loader
     return modules
 
 
 def get_module_by_name(modules, name):
-    for module in modules:
-        if module.__name__ == name:
-            return module
-    return None
+    loader = modules.get(name)
+    if loader is None:
+        return None
+    tic = time.time()
+    module = loader()
+    logger.debug('Loaded module %s in %.3f seconds' % (name, time.time() - tic))
+    return module
 
 
 # -----------------------------------------------------------------------------
 # --- Daemon ------------------------------------------------------------------
 # -----------------------------------------------------------------------------
 
-def run_tpynode(config, modules):
+def get_module_configs(config):
+    modulecfg = [{**dict(config.items(k)), **{'name': k}}
+                 for k in config.keys() if k != 'TPyNode' and
+                 k != 'DEFAULT']
+    for mcfg in modulecfg:
+        if mcfg.get('module') is None:
+            mcfg['module'] = mcfg['name']
+    return modulecfg
+
+
+def run_tpynode(config, modules, cfgfile=None):
 
+    tic = time.time()
     tpy_config = config['TPyNode']
     host = tpy_config.get('host', 'localhost')
     port = int(tpy_config.get('port', '42337'))
@@ -149,34 +248,56 @@ def run_tpynode(config, modules):
 
     setattr(Pyro4.config, 'HOST', host)
 
+    def create_module(mcfg):
+        module_class = get_module_by_name(modules, mcfg['module'])
+        if module_class is None:
+            raise Exception('Unknown module %s for %s.' % (mcfg['module'], mcfg['name']))
+        if mcfg.get('worker', 'thread') == 'process':
+            worker = ModuleWorker(module_class, mcfg)
+            worker.start()
+            return create_forwarder(module_class, worker)
+        return module_class(**mcfg)
+
+    def reload_module_configs():
+        reload_config = configparser.ConfigParser()
+        if not reload_config.read(cfgfile) or 'TPyNode' not in reload_config.sections():
+            raise Exception('Unable to parse configuration %s' % cfgfile)
+        if dict(reload_config['TPyNode']) != dict(tpy_config):
+            logger.warning('Changes in the TPyNode section require a restart')
+        return get_module_configs(reload_config)
+
     # Start the Pyro Daemon
     pyro = Pyro4.Daemon(port=port)
-    tpynode = TPyNode(pyro=pyro)
+    tpynode = TPyNode(pyro=pyro, module_factory=create_module,
+                      config_loader=reload_module_configs if cfgfile else None)
     uri = pyro.register(tpynode, 'tpynode')
     if not uri:
         raise Exception('Unable to register TPyHost in daemon service.')
     logger.info('Registered TPyHost instance at %s' % uri)
+    logger.info('Startup phase pyro daemon took %.3f seconds' % (time.time() - tic))
 
     # Register modules ...
-    modulecfg = [{**dict(config.items(k)), **{'name': k}}
-                 for k in config.keys() if k != 'TPyNode' and
-                 k != 'DEFAULT']
-    for mcfg in modulecfg:
-        if mcfg.get('module') is None:
-            mcfg['module'] = mcfg['name']
+    for mcfg in get_module_configs(config):
+        toc = time.time()
         logger.info('Exposing module %s as %s' % (mcfg['module'],
                                                   mcfg['name']))
-        module = get_module_by_name(modules, mcfg['module'])(**mcfg)
-        uri = pyro.register(module, mcfg['name'])
-        if not uri:
-            raise Exception('Unable to register module %s in daemon service.' % mcfg['name'])
-        logger.info('Registered %s Module instance at %s' % (mcfg['module'], uri))
-        tpynode.register_module(mcfg['module'], mcfg['name'])
+        tpynode.add_module(mcfg)
+        logger.info('Startup phase module %s took %.3f seconds' % (mcfg['name'], time.time() - toc))
 
+    logger.info('Startup completed in %.3f seconds' % (time.time() - tic))
     logger.info('Awaiting incoming Connections ...')
     pyro.requestLoop()
 
 
+class VersionAction(argparse.Action):
+
+    """Print the version, which is only looked up when requested."""
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        print(get_version('tpynode'))
+        parser.exit()
+
+
 # -----------------------------------------------------------------------------
 # --- MAIN --------------------------------------------------------------------
 # -----------------------------------------------------------------------------
@@ -185,8 +306,8 @@ def main():
 
     # Initialize argument parser
     parser = argparse.ArgumentParser(description='TPyNode Daemon')
-    parser.add_argument('--version', action='version', help='show version',
-                        version=pkg_resources.require("tpynode")[0].version)
+    parser.add_argument('--version', action=VersionAction, nargs=0,
+                        help='show version')
 
     parser.add_argument('cmd', action='store', help='operation mode',
                         nargs='?', choices=['start', 'stop', 'restart', 'run',
@@ -197,22 +318,32 @@ def main():
         "-c", "--conf", dest='cfgfile', default=cfgfile_default,
         type=str, help='configuration file')
 
+    parser.add_argument(
+        '--rescan', action='store_true',
+        help='rescan all external modules instead of using the module index')
+
     # Parse Command Line Arguments
     args = parser.parse_args(sys.argv[1:])
 
     # Load the configuration file
+    tic = time.time()
     config = configparser.ConfigParser()
     logger.info('Loading configuration from %s' % args.cfgfile)
     if not config.read(args.cfgfile) or 'TPyNode' not in config.sections():
         logger.error('Unable to parse configuration, please check file')
         sys.exit(1)
+    logger.info('Startup phase configuration took %.3f seconds' % (time.time() - tic))
 
     ext_module_path = config['TPyNode'].get('module_path')
-    modules = load_modules(ext_module_path)
+    module_index = config['TPyNode'].get('module_index', module_index_default)
+    tic = time.time()
+    modules = load_modules(ext_module_path, index_file=module_index,
+                           rescan=args.rescan)
+    logger.info('Startup phase module discovery took %.3f seconds' % (time.time() - tic))
 
     def run():
         logger.info('Running TPyNode')
-        run_tpynode(config, modules)
+        run_tpynode(config, modules, os.path.abspath(args.cfgfile))
 
     def start():
         logger.info('Starting TPyNode in Daemon Mode')
@@ -220,7 +351,7 @@ def main():
         pidfile = config['TPyNode'].get('pidfile')
 
         def runner():
-            run_tpynode(config, modules)
+            run_tpynode(config, modules, os.path.abspath(args.cfgfile))
 
         daemon = Daemonize(app="tpynode", pid=pidfile, action=runner)
         daemon.start()
@@ -242,7 +373,16 @@ def main():
     def list_modules():
         # list all modules
         module_info = list()
-        for m in modules:
+        for name in modules:
+            try:
+                m = get_module_by_name(modules, name)
+            except Exception as e:
+                module_info.append({
+                    'Name': name,
+                    'Base': '',
+                    'Definition': '',
+                    'Description': 'unavailable (%s)' % e})
+                continue
             module_name = m.__name__
             module_desc = m.__doc__
             module_desc = ' '.join([str.strip() for str in  module_desc.splitlines()]) if module_desc else ''
@@ -21,13 +21,40 @@
 # Last Modified: 2018-07-02
 
 
-from .openwrt import OpenWrt
-from .wifiinterface import WiFiInterface
-from .wigiginterface import WiGigInterface
-from .adhocinterface import AdHocInterface
-from .click import Click
-from .ping import Ping
-from .iperf import IPerf
-from .ntp import NTP
-from .hostapd import Hostapd
-from .wpasupplicant import WPASupplicant
+import importlib
+from collections import OrderedDict
+
+# Module classes and the submodules defining them. Submodules are only
+# imported once a module is requested, so that the node does not pay for
+# heavy dependencies (pyric, ntplib, sector policies, ...) it does not use.
+module_index = OrderedDict([
+    ('OpenWrt', 'openwrt'),
+    ('WiFiInterface', 'wifiinterface'),
+    ('WiGigInterface', 'wigiginterface'),
+    ('AdHocInterface', 'adhocinterface'),
+    ('Click', 'click'),
+    ('Ping', 'ping'),
+    ('IPerf', 'iperf'),
+    ('NTP', 'ntp'),
+    ('Hostapd', 'hostapd'),
+    ('WPASupplicant', 'wpasupplicant'),
+])
+
+__all__ = list(module_index)
+
+
+def get_module(name):
+    """Import and return an internal module class by its name.
+
+    Raises:
+        KeyError: If there is no internal module with that name
+    """
+    submodule = importlib.import_module('.' + module_index[name], __name__)
+    return getattr(submodule, name)
+
+
+def __getattr__(name):
+    # Keeps 'from tpynode.modules import Ping' working (Python >= 3.7)
+    if name in module_index:
+        return get_module(name)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
@@ -38,7 +38,6 @@ class AdHocInterface(WiFiInterface):
 
     def __init__(self, **kwargs):
         super(AdHocInterface, self).__init__(**kwargs)
-        self._card = pyw.getcard(self.iface)
         self._channel = int(kwargs.get('channel', 1))
         self._bssid = kwargs.get('bssid', 'c0:ff:ee:c0:ff:ee')
         self._ssid = kwargs.get('ssid', 'erlab')
@@ -67,12 +66,12 @@ class AdHocInterface(WiFiInterface):
     @Pyro4.expose
     @property
     def ipaddress(self):
-        return pyw.ifaddrget(self._card)[0]
+        return self._card_call(pyw.ifaddrget)[0]
 
     @Pyro4.expose
     @property
     def macaddress(self):
-        return pyw.macget(self._card)
+        return self._card_call(pyw.macget)
 
     def _iw_set_type(self, type='ibss'):
         cmd = ['iw', 'dev', self.iface, 'set', 'type', type]
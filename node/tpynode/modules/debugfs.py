@@ -20,13 +20,15 @@
 # Date:          2018-06-12
 # Last Modified: 2018-10-31
 
+import errno
 import os
 import Pyro4
 import re
 import struct
-import subprocess
+import threading
 
 from .wifiinterface import WiFiInterface
+from ..tools import counters, wil6210
 
 rx_mbox = re.compile((
     '\s+\[\s?([0-9a-f]+)\].*0x[0-9a-f]{8}\s->\s[0-9a-f\s]{17}\n(\s{3}.*\n)?'))
@@ -46,8 +48,32 @@ rx_stations4 = re.compile((
     '\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)'
     '\s+(\d+)\s+(\d+)'))
 
+# Cumulative counters of wil6210/stations
+debug_station_counters = ('pkts_total', 'pkts_drop', 'pkts_dup', 'pkts_old',
+                          'inv_nondata', 'inv_short', 'inv_large',
+                          'inv_replay', 'rx_mcs')
+
 rx_fw_version = re.compile('(\d+\.\d+\.\d+\.\d+)')
 
+debugfs_root = None
+debugfs_buffer_size = 16384
+wmi_send_buffer_size = 256
+
+
+def get_debugfs_root():
+    """Mount point of the debugfs, looked up once per process."""
+    global debugfs_root
+    if debugfs_root is None:
+        with open('/proc/mounts') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) > 2 and fields[2] == 'debugfs':
+                    debugfs_root = fields[1]
+                    break
+            else:
+                raise EnvironmentError('debugfs is not mounted')
+    return debugfs_root
+
 
 def mac_addr_to_bytearray(addr):
     """Convert MAC Address to Bytearray
@@ -81,29 +107,98 @@ class DebugFS (WiFiInterface):
     """
 
     def __init__(self, **kwargs):
+        self._debugfs_path = None
+        self._debugfs_files = dict()
+        self._debugfs_buffer = bytearray(debugfs_buffer_size)
+        self._debugfs_lock = threading.RLock()
+        self._wmi_mbox = wil6210.MailboxReader()
+        self._wmi_send_buffer = bytearray(wmi_send_buffer_size)
+        self._sweep_capture = None
+        self._debug_station_counters = counters.CounterTracker(
+            debug_station_counters, key=lambda sta: (sta['cid'], sta['mac']))
         super(DebugFS, self).__init__(**kwargs)
 
+    def _release(self):
+        if self._sweep_capture is not None:
+            self._sweep_capture.stop()
+        with self._debugfs_lock:
+            for debugfs in list(self._debugfs_files):
+                self._close_debugfs(debugfs)
+
+    def _invalidate_card(self):
+        super(DebugFS, self)._invalidate_card()
+        with self._debugfs_lock:
+            self._debugfs_path = None
+            self._wmi_mbox.reset()
+            for debugfs in list(self._debugfs_files):
+                self._close_debugfs(debugfs)
+
     @property
     def debugfs_path(self):
-        if hasattr(self, '_debugfs_path') and self._debugfs_path:
-            return self._debugfs_path
-        else:
-            rx = re.compile('debugfs\\s+on\\s+(.+)\\s+type\\s+debugfs')
-            mounts = subprocess.check_output(['mount']).decode()
-            rootpath = rx.findall(mounts)[0]
+        if self._debugfs_path is None:
             self._debugfs_path = os.path.join(
-                rootpath, 'ieee80211', 'phy%d' % self.get_phy_id())
-            return self._debugfs_path
+                get_debugfs_root(), 'ieee80211', 'phy%d' % self._get_card().phy)
+        return self._debugfs_path
+
+    def _open_debugfs(self, debugfs):
+        fd = self._debugfs_files.get(debugfs)
+        if fd is None:
+            fd = os.open(os.path.join(self.debugfs_path, debugfs), os.O_RDONLY)
+            self._debugfs_files[debugfs] = fd
+        return fd
+
+    def _close_debugfs(self, debugfs):
+        fd = self._debugfs_files.pop(debugfs, None)
+        if fd is not None:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _read_debugfs_fd(self, debugfs):
+        # Rewind the open entry, so that the kernel generates its content
+        # again, and read it into the reusable buffer
+        fd = self._open_debugfs(debugfs)
+        try:
+            os.lseek(fd, 0, os.SEEK_SET)
+        except OSError as e:
+            if e.errno != errno.ESPIPE:
+                raise
+            self._close_debugfs(debugfs)
+            fd = self._open_debugfs(debugfs)
+
+        size = 0
+        while True:
+            if size == len(self._debugfs_buffer):
+                self._debugfs_buffer.extend(bytes(size))
+            with memoryview(self._debugfs_buffer) as view:
+                n = os.readv(fd, [view[size:]])
+            if n == 0:
+                break
+            size += n
+        return self._debugfs_buffer[:size].decode()
 
     @Pyro4.expose
     def read_debugfs(self, debugfs):
-        filepath = os.path.join(self.debugfs_path, debugfs)
-        if not os.path.isfile(filepath):
-            self.logger.error('Unable to read file %s' % filepath)
-            return
-        with open(filepath, mode='r') as file:
-            data = file.read()
-        return data
+        with self._debugfs_lock:
+            try:
+                return self._read_debugfs_fd(debugfs)
+            except OSError:
+                # The entry might have been recreated, e.g. after firmware
+                # recovery, so only its descriptor is dropped
+                self._close_debugfs(debugfs)
+            try:
+                phy_gone = not os.path.isdir(self.debugfs_path)
+            except OSError:
+                phy_gone = True
+            if phy_gone:
+                # The phy is gone, e.g. after reloading the driver
+                self._invalidate_card()
+            try:
+                return self._read_debugfs_fd(debugfs)
+            except OSError as e:
+                self._close_debugfs(debugfs)
+                self.logger.error('Unable to read debugfs %s: %s' % (debugfs, e))
 
     @Pyro4.expose
     def write_debugfs(self, debugfs, data):
@@ -116,28 +211,7 @@ class DebugFS (WiFiInterface):
     @Pyro4.expose
     def get_bf(self):
         data = self.read_debugfs('wil6210/bf')
-
-        for seg in data.split('CID'):
-            results = list()
-            m = re.findall('\s*(\d+)\s*\{', seg)
-            if m:
-                r = dict()
-                r['cid'] = m[0]
-                r['tsf'] = re.findall('TSF\s+=\s+(0x[0-9a-fA-F]+)', seg)[0]
-                r['tx_mcs'] = re.findall('TxMCS\s+=\s+(\d+)', seg)[0]
-                r['tx_tpt'] = re.findall('TxTpt\s+=\s+(\d+)', seg)[0]
-                r['sqi'] = re.findall('SQI\s+=\s+(\d+)', seg)[0]
-                r['rssi'] = re.findall('RSSI\s+=\s+(-?\d+)', seg)[0]
-                r['status_code'], r['status'] =\
-                    re.findall('Status\s+=\s+(0x[0-9a-fA-F]+)\s(\w+)', seg)[0]
-                r['rx_sector'], r['tx_sector'] =\
-                    re.findall('Sectors.*my\s+(\d+)\:\s*(\d+)', seg)[0]
-                r['rx_sector_peer'], r['tx_sector_peer'] =\
-                    re.findall('Sectors.*peer\s+(\d+)\:\s*(\d+)', seg)[0]
-                r['rx_goodput'], r['tx_goodput'] =\
-                    re.findall('Goodput\(rx\:tx\)\s+(\d+)\:\s*(\d+)', seg)[0]
-                results.append(r)
-        return results
+        return wil6210.parse_bf(data)
 
     @Pyro4.expose
     def get_wmi_mbox(self):
@@ -145,35 +219,25 @@ class DebugFS (WiFiInterface):
             return None
 
         data = self.read_debugfs('wil6210/mbox')
-        mbox = {'ring_tx': list(), 'ring_rx': list()}
-
-        ring_tx = data.split('ring rx = ')[0]
-        ring_rx = data.split('ring rx = ')[1]
-
-        ring_rx_entries = re.split('\[.{2}\]', ring_rx)[1:]
-        for entry in ring_rx_entries:
-            entry_lines = entry.splitlines()
-            entry_data = ''.join(entry_lines[1:])
-            entry_data = ''.join(re.findall('[0-9a-fA-F]{2}', entry_data))
-            if len(entry_data) > 0:
-                entry_bytes = bytearray.fromhex(entry_data)
-                evt_id = struct.unpack_from('B B H I', entry_bytes)[2]
-                evt_data = entry_bytes[8:]
-
-                mbox['ring_rx'].append({'id': evt_id, 'data': evt_data})
-
-        ring_tx_entries = re.split('\[.{2}\]', ring_tx)[1:]
-        for entry in ring_tx_entries:
-            entry_lines = entry.splitlines()
-            entry_data = ''.join(entry_lines[1:])
-            entry_data = ''.join(re.findall('[0-9a-fA-F]{2}', entry_data))
-            if len(entry_data) > 0:
-                entry_bytes = bytearray.fromhex(entry_data)
-                cmd_id = struct.unpack_from('B B H I', entry_bytes)[2]
-                cmd_data = entry_bytes[8:]
-
-                mbox['ring_tx'].append({'id': cmd_id, 'data': cmd_data})
-        return mbox
+        mbox = wil6210.parse_mbox(data)
+        return {ring: [{'id': evt.id, 'data': evt.data} for evt in evts]
+                for ring, evts in mbox.items()}
+
+    def read_wmi_events(self):
+        """Read the WMI events received since the previous call.
+
+        The first call only records the state of the mailbox, so it needs to
+        be done before sending the command whose events are of interest.
+
+        Returns:
+            list: WMIEvent records in the order of reception
+        """
+        with self._debugfs_lock:
+            data = self.read_debugfs('wil6210/mbox')
+            if data is None:
+                self._wmi_mbox.reset()
+                return list()
+            return self._wmi_mbox.read(data)
 
     @Pyro4.expose
     def get_fw_version(self):
@@ -189,11 +253,7 @@ class DebugFS (WiFiInterface):
     @Pyro4.expose
     def get_recovery(self):
         data = self.read_debugfs('wil6210/recovery')
-        mode = re.findall('mode\s+=\s+(\S+)', data)
-        mode = mode[0] if mode else 'unknown'
-        state = re.findall('state\s+=\s+(\S+)', data)
-        state = state[0] if state else 'unknown'
-        return {'mode': mode, 'state': state}
+        return wil6210.parse_recovery(data)
 
     @Pyro4.expose
     def get_recovery_count(self):
@@ -251,6 +311,25 @@ class DebugFS (WiFiInterface):
             results.append(r)
         return results
 
+    def _counter_epoch(self):
+        # The firmware resets all counters when it recovers
+        return self.get_recovery_count()
+
+    @Pyro4.expose
+    def get_debug_station_deltas(self):
+        """Stations of get_debug_stations with the change of their counters.
+
+        Counters are considered reset whenever the recovery count changed
+        since the previous call.
+
+        Returns:
+            list: The stations, each with time, interval, reset, delta and
+                rate as described for get_station_deltas.
+        """
+        epoch = self._counter_epoch()
+        return self._debug_station_counters.sample(self.get_debug_stations(),
+                                                   epoch)
+
     @Pyro4.expose
     def get_fw_status(self):
         data = self.read_debugfs('wil6210/status[0]')
@@ -261,30 +340,52 @@ class DebugFS (WiFiInterface):
     @Pyro4.expose
     def get_sweep_dump(self):
         data = self.read_debugfs('wil6210/sweep_dump')
-        sweepinfo = list()
-        for swp_data in re.findall('\[.*\]', data):
-            swp = dict()
-            swp['id'] = int(re.findall('\[\s*(\d+)', swp_data)[0])
-            swp['src'] = re.findall('src:\s+([0-9a-fA-F:]{17})', swp_data)[0]
-            swp['sec'] = int(re.findall('sec:\s+(\d+)', swp_data)[0])
-            swp['cdown'] = int(re.findall('cdown:\s+(\d+)', swp_data)[0])
-            swp['initiator'] = not bool(re.findall('dir:\s+(\d)', swp_data)[0])
-            swp['snr'] = float(re.findall('snr:\s+(-?\d+.\d+)\sdB', swp_data)[0])
-            swp['snr_raw'] = re.findall('snr:.*\((0x[0-9a-fA-F:]+)\)', swp_data)[0]
-            if swp['src'] != '00:00:00:00:00:00':
-                sweepinfo.append(swp)
-        return sweepinfo
+        return wil6210.parse_sweep_dump(data)
+
+    @Pyro4.expose
+    def start_sweep_capture(self, interval=0.05, maxlen=4096):
+        """Start capturing the sweep ring in the background.
+
+        Args:
+            interval (float): Seconds between polls of the ring
+            maxlen (int): Number of entries kept on the node
+        """
+        if self._sweep_capture is not None:
+            self._sweep_capture.stop()
+        self._sweep_capture = wil6210.SweepCapture(
+            lambda: self.read_debugfs('wil6210/sweep_dump'), interval, maxlen)
+        self._sweep_capture.start()
+
+    @Pyro4.expose
+    def stop_sweep_capture(self):
+        if self._sweep_capture is not None:
+            self._sweep_capture.stop()
+
+    @Pyro4.expose
+    def get_sweep_capture(self, cursor=0, limit=None):
+        """Return the sweeps captured since cursor.
+
+        Returns:
+            dict: entries, each with seq and time, the cursor to pass to the
+                next call, and the number of entries dropped from the buffer
+                before they were fetched
+        """
+        if self._sweep_capture is None:
+            return {'entries': list(), 'cursor': cursor, 'dropped': 0}
+        return self._sweep_capture.get(cursor, limit)
+
+    @Pyro4.expose
+    def get_sweep_capture_status(self):
+        if self._sweep_capture is None:
+            return {'running': False}
+        return self._sweep_capture.status()
 
     @Pyro4.expose
     def get_debugfs_temp(self):
         data = self.read_debugfs('wil6210/temp')
         if data == 'Failed':
             return {'mac': -1, 'radio': -1}
-        t_mac = re.findall('T_mac\s+=\s+(\d+.\d+)', data)
-        t_mac = float(t_mac[0]) if t_mac else 0
-        t_rad = re.findall('T_radio\s+=\s+(\d+.\d+)', data)
-        t_rad = float(t_rad[0]) if t_rad else 0
-        return {'mac': t_mac, 'radio': t_rad}
+        return wil6210.parse_temp(data)
 
     @Pyro4.expose
     def send_mgmt_frame(self, ftype, dst, src, bss, payload):
@@ -311,9 +412,13 @@ class DebugFS (WiFiInterface):
 
     @Pyro4.expose
     def send_wmi(self, cmd_id, payload):
-        data = bytearray(struct.pack('H H I', 0, cmd_id, 0))
         if type(payload) is str:
-            data.extend(payload.encode())
-        else:
-            data.extend(payload)
-        self.write_debugfs('wil6210/wmi_send', data)
+            payload = payload.encode()
+        size = wil6210.wmi_hdr.size + len(payload)
+        with self._debugfs_lock:
+            if size > len(self._wmi_send_buffer):
+                self._wmi_send_buffer = bytearray(size)
+            wil6210.wmi_hdr.pack_into(self._wmi_send_buffer, 0, 0, 0, cmd_id, 0)
+            self._wmi_send_buffer[wil6210.wmi_hdr.size:size] = payload
+            with memoryview(self._wmi_send_buffer) as view:
+                self.write_debugfs('wil6210/wmi_send', view[:size])
@@ -20,13 +20,65 @@
 # Date:          2018-07-17
 # Last Modified: 2018-07-17
 
+import logging
+import os
+import re
+import time
 import Pyro4
+import serpent
 
-from tpynode.tools.rfantenna import rfantenna
+from tpynode.tools.rfantenna import SectorCodebook, rfantenna
+from tpynode.tools.rfantenna import pack_codebook_snapshot
+from tpynode.tools.rfantenna import unpack_codebook_snapshot
+
+logger = logging.getLogger(__name__)
+
+rx_snapshot_name = re.compile(r'^[\w.-]+$')
+snapshot_suffix = '.cb'
 
 
 class RFAntenna():
 
+    # Codebook caches by sector type, created on first use
+    _rf_codebooks = None
+
+    # Time of the last check of the codebook epoch
+    _rf_codebook_checked = None
+
+    # Seconds single sector accesses rely on the last epoch check
+    rf_codebook_epoch_ttl = 1.0
+
+    # Directory of the codebook snapshots
+    rf_snapshot_dir = '/var/lib/tpynode/codebooks'
+
+    def _rf_codebook(self, sector_type, check=False):
+        """Codebook cache of a sector type.
+
+        Checking the epoch reads the recovery count from debugfs, which
+        costs far more than a cached sector. The epoch is therefore only
+        checked if check is set, as done by all operations on whole
+        codebooks, or if the last check is older than
+        rf_codebook_epoch_ttl. Single sector accesses within that time
+        after a firmware recovery still see the stale cache.
+        """
+        if self._rf_codebooks is None:
+            self._rf_codebooks = {
+                t: SectorCodebook(t) for t in (rfantenna.RF_SECTOR_TYPE_TX,
+                                               rfantenna.RF_SECTOR_TYPE_RX)}
+        now = time.monotonic()
+        if check or self._rf_codebook_checked is None or \
+                now - self._rf_codebook_checked >= self.rf_codebook_epoch_ttl:
+            epoch = self._rf_codebook_epoch()
+            for codebook in self._rf_codebooks.values():
+                codebook.check_epoch(epoch)
+            self._rf_codebook_checked = now
+        return self._rf_codebooks[sector_type]
+
+    def _rf_codebook_epoch(self):
+        # The firmware restores its default codebook when it recovers
+        get_recovery_count = getattr(self, 'get_recovery_count', None)
+        return get_recovery_count() if get_recovery_count else None
+
     @Pyro4.expose
     def get_rf_selected_tx_sector(self, peer):
         return rfantenna.get_selected_sector(self.iface, 0x01, peer)
@@ -45,19 +97,19 @@ class RFAntenna():
 
     @Pyro4.expose
     def get_rf_tx_sector_config_raw(self, sector):
-        return rfantenna.get_sector_config(self.iface, 0x01, sector)
+        return self._rf_codebook(0x01).get(self.iface, [sector])[0]
 
     @Pyro4.expose
     def get_rf_rx_sector_config_raw(self, sector):
-        return rfantenna.get_sector_config(self.iface, 0x00, sector)
+        return self._rf_codebook(0x00).get(self.iface, [sector])[0]
 
     @Pyro4.expose
     def set_rf_tx_sector_config_raw(self, sector, *args):
-        return rfantenna.set_sector_config(self.iface, 0x01, sector, *args)
+        self._rf_codebook(0x01).set(self.iface, {sector: args})
 
     @Pyro4.expose
     def set_rf_rx_sector_config_raw(self, sector, *args):
-        return rfantenna.set_sector_config(self.iface, 0x00, sector, *args)
+        self._rf_codebook(0x00).set(self.iface, {sector: args})
 
     @Pyro4.expose
     def get_rf_tx_sector_config(self, sector):
@@ -79,11 +131,13 @@ class RFAntenna():
         cfg = rfantenna.encode_sector_config(definition)
         self.set_rf_rx_sector_config_raw(sector, *cfg)
 
-    @Pyro4.expose
-    def get_rf_tx_sector_codebook(self, max_sectors=64, ignore_invalid=True):
+    def _get_rf_sector_codebook(self, sector_type, max_sectors,
+                                ignore_invalid):
+        configs = self._rf_codebook(sector_type, check=True).get(
+            self.iface, range(0, max_sectors))
         codebook = list()
-        for s in range(0, max_sectors):
-            data = self.get_rf_tx_sector_config(s)
+        for s, cfg in enumerate(configs):
+            data = rfantenna.decode_sector_config(*cfg)
             if ignore_invalid:
                 if data['dtype'] == ([0] * 8) and data['etype'] == [0] * 32:
                     continue
@@ -92,6 +146,192 @@ class RFAntenna():
         return codebook
 
     @Pyro4.expose
-    def set_rf_tx_sector_codebook(self, codebook):
-        for sector in codebook:
-            self.set_rf_tx_sector_config(sector['sid'], sector)
+    def get_rf_tx_sector_codebook(self, max_sectors=64, ignore_invalid=True):
+        return self._get_rf_sector_codebook(0x01, max_sectors, ignore_invalid)
+
+    @Pyro4.expose
+    def get_rf_rx_sector_codebook(self, max_sectors=64, ignore_invalid=True):
+        return self._get_rf_sector_codebook(0x00, max_sectors, ignore_invalid)
+
+    def _set_rf_sector_codebook(self, sector_type, codebook, verify):
+        configs = {sector['sid']: rfantenna.encode_sector_config(sector)
+                   for sector in codebook}
+        return self._rf_codebook(sector_type, check=True).update(
+            self.iface, configs, verify)
+
+    @Pyro4.expose
+    def set_rf_tx_sector_codebook(self, codebook, verify=False):
+        """Write the sectors of a codebook that differ from the current one.
+
+        Args:
+            codebook (list): Sector definitions with their sid
+            verify (bool): Read back the written sectors
+
+        Returns:
+            dict: Number of sectors written and skipped, and the sids of
+                sectors that read back differently if verified
+        """
+        return self._set_rf_sector_codebook(0x01, codebook, verify)
+
+    @Pyro4.expose
+    def set_rf_rx_sector_codebook(self, codebook, verify=False):
+        """Write the sectors of an RX codebook, see set_rf_tx_sector_codebook.
+        """
+        return self._set_rf_sector_codebook(0x00, codebook, verify)
+
+    @Pyro4.expose
+    def get_rf_tx_codebook_version(self):
+        """Version of the TX codebook, changes with every modification."""
+        return self._rf_codebook(0x01, check=True).version
+
+    @Pyro4.expose
+    def get_rf_rx_codebook_version(self):
+        """Version of the RX codebook, changes with every modification."""
+        return self._rf_codebook(0x00, check=True).version
+
+    @Pyro4.expose
+    def invalidate_rf_codebook(self):
+        """Read the codebooks from the driver again on their next use."""
+        for sector_type in (0x00, 0x01):
+            self._rf_codebook(sector_type).invalidate()
+
+    def _rf_identity(self):
+        """Identity of the RF module recorded in codebook snapshots.
+
+        Returns:
+            dict: Hardware version of the chip and firmware version, None
+                if the node cannot report them
+        """
+        get_hw_version = getattr(self, 'get_debugfs_hw_version', None)
+        get_fw_version = getattr(self, 'get_fw_version', None)
+        if get_hw_version is None or get_fw_version is None:
+            return None
+        return {'hw_version': get_hw_version(),
+                'fw_version': get_fw_version()}
+
+    def _check_rf_identity(self, identity, force):
+        # Codebooks only apply to the RF module they were taken on, a
+        # firmware update keeps the codebook valid
+        own = self._rf_identity()
+        if identity is None or own is None or \
+                identity['hw_version'] != own['hw_version']:
+            if not force:
+                raise ValueError('Snapshot of RF module %s does not match '
+                                 '%s, use force to apply it anyway'
+                                 % (identity, own))
+        elif identity['fw_version'] != own['fw_version']:
+            logger.warning('Snapshot was taken with firmware %s, running %s'
+                           % (identity['fw_version'], own['fw_version']))
+
+    def _rf_snapshot_file(self, name):
+        if not rx_snapshot_name.match(name) or name.startswith('.'):
+            raise ValueError('Invalid snapshot name %s' % name)
+        return os.path.join(self.rf_snapshot_dir, name + snapshot_suffix)
+
+    def _store_rf_snapshot(self, name, data):
+        snapshot_file = self._rf_snapshot_file(name)
+        os.makedirs(self.rf_snapshot_dir, exist_ok=True)
+        tmp_file = '%s.%d' % (snapshot_file, os.getpid())
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_file, snapshot_file)
+
+    @Pyro4.expose
+    def list_rf_codebook_snapshots(self):
+        """Snapshots stored on the node.
+
+        Returns:
+            list: Name, size in bytes and modification time of every
+                snapshot
+        """
+        snapshots = list()
+        try:
+            files = sorted(os.listdir(self.rf_snapshot_dir))
+        except FileNotFoundError:
+            return snapshots
+        for snapshot_file in files:
+            name, suffix = os.path.splitext(snapshot_file)
+            if suffix != snapshot_suffix:
+                continue
+            st = os.stat(os.path.join(self.rf_snapshot_dir, snapshot_file))
+            snapshots.append({'name': name, 'size': st.st_size,
+                              'mtime': st.st_mtime})
+        return snapshots
+
+    @Pyro4.expose
+    def save_rf_codebook_snapshot(self, name, max_sectors=64):
+        """Store the raw TX and RX codebooks in a snapshot on the node.
+
+        Returns:
+            int: Number of sectors in the snapshot
+        """
+        configs = dict()
+        for sector_type in (0x01, 0x00):
+            sectors = range(0, max_sectors)
+            configs.update(zip(
+                ((sector_type, s) for s in sectors),
+                self._rf_codebook(sector_type, check=True).get(self.iface,
+                                                               sectors)))
+        identity = self._rf_identity()
+        if identity is None:
+            raise ValueError('RF module of %s cannot be identified'
+                             % self.iface)
+        self._store_rf_snapshot(name,
+                                pack_codebook_snapshot(configs, identity))
+        return len(configs)
+
+    @Pyro4.expose
+    def get_rf_codebook_snapshot(self, name):
+        """Content of a snapshot, to transfer it to another node."""
+        with open(self._rf_snapshot_file(name), 'rb') as f:
+            return f.read()
+
+    @Pyro4.expose
+    def put_rf_codebook_snapshot(self, name, data, force=False):
+        """Store a snapshot obtained by get_rf_codebook_snapshot.
+
+        Args:
+            force (bool): Store the snapshot even if it was taken on a
+                different RF module
+
+        Raises:
+            ValueError: If data is no valid snapshot or of a different RF
+                module
+        """
+        if isinstance(data, dict):
+            # bytes arrive base64 encoded by the serializer
+            data = serpent.tobytes(data)
+        identity, _ = unpack_codebook_snapshot(data)
+        self._check_rf_identity(identity, force)
+        self._store_rf_snapshot(name, data)
+
+    @Pyro4.expose
+    def delete_rf_codebook_snapshot(self, name):
+        os.remove(self._rf_snapshot_file(name))
+
+    @Pyro4.expose
+    def restore_rf_codebook_snapshot(self, name, verify=False, force=False):
+        """Write the sectors of a snapshot that differ from the codebooks.
+
+        Args:
+            verify (bool): Read back the written sectors
+            force (bool): Restore the snapshot even if it was taken on a
+                different RF module
+
+        Returns:
+            dict: Result of the write per sector type, tx and rx, as
+                returned by set_rf_tx_sector_codebook
+
+        Raises:
+            ValueError: If the snapshot is of a different RF module
+        """
+        with open(self._rf_snapshot_file(name), 'rb') as f:
+            identity, configs = unpack_codebook_snapshot(f.read())
+        self._check_rf_identity(identity, force)
+        results = dict()
+        for sector_type, key in ((0x01, 'tx'), (0x00, 'rx')):
+            results[key] = self._rf_codebook(sector_type, check=True).update(
+                self.iface, {sector: cfg for (t, sector), cfg
+                             in configs.items() if t == sector_type},
+                verify)
+        return results
@@ -29,11 +29,15 @@ import time
 
 from .interface import Interface
 from tpynode import TPyModule
-from ..tools import link
+from ..tools import counters, link
 
 
 logger = logging.getLogger(__name__)
 
+# Cumulative counters of the station dump
+station_counters = ('rx_bytes', 'rx_pkts', 'tx_bytes', 'tx_pkts', 'tx_failed',
+                    'rx_dropped')
+
 
 class WiFiInterface(Interface):
 
@@ -44,8 +48,38 @@ class WiFiInterface(Interface):
 
     def __init__(self, **kwargs):
         self._interface = kwargs.get('interface', None)
+        self._card = None
+        self._station_counters = counters.CounterTracker(
+            station_counters, key=lambda sta: sta['mac'])
         super(WiFiInterface, self).__init__(**kwargs)
 
+    def _get_card(self):
+        # Resolving the card is a netlink query, so the handle is cached
+        card = self._card
+        if card is None:
+            card = self._card = pyw.getcard(self._interface)
+        return card
+
+    def _invalidate_card(self):
+        """Drop all cached handles of the interface.
+
+        Has to be called whenever the interface might have been renamed,
+        taken down or recreated.
+        """
+        self._card = None
+
+    def _card_call(self, func, *args):
+        """Call a pyw function on the cached card.
+
+        Any error invalidates the cached handles, and the call is repeated
+        once with a freshly resolved card.
+        """
+        try:
+            return func(self._get_card(), *args)
+        except pyric.error:
+            self._invalidate_card()
+        return func(self._get_card(), *args)
+
     @Pyro4.expose
     @property
     def iface(self):
@@ -54,32 +88,28 @@ class WiFiInterface(Interface):
     @Pyro4.expose
     def get_ipaddr(self):
         try:
-            w = pyw.getcard(self._interface)
-            return pyw.ifaddrget(w)
+            return self._card_call(pyw.ifaddrget)
         except pyric.error as e:
             logger.error(e)
 
     @Pyro4.expose
     def get_hwaddr(self):
         try:
-            w = pyw.getcard(self._interface)
-            return pyw.macget(w)
+            return self._card_call(pyw.macget)
         except pyric.error as e:
             logger.error(e)
 
     @Pyro4.expose
     def set_hwaddr(self, addr):
         try:
-            w = pyw.getcard(self._interface)
-            pyw.macset(w, addr)
+            self._card_call(pyw.macset, addr)
         except pyric.error as e:
             logger.error(e)
 
     @Pyro4.expose
     def set_ipaddr(self, addr=None, mask=None, bcast=None):
         try:
-            w = pyw.getcard(self._interface)
-            pyw.ifaddrset(w, addr, mask, bcast)
+            self._card_call(pyw.ifaddrset, addr, mask, bcast)
         except pyric.error as e:
             logger.error(e)
 
@@ -89,29 +119,53 @@ class WiFiInterface(Interface):
 
     @Pyro4.expose
     def get_stations(self):
-        return link.get_iw_station_dump(self._interface)
+        """Stations of the interface from the nl80211 station dump.
+
+        Returns:
+            list: Stations with mac, counters, signal in dBm and bitrates in
+                MBit/s, see genl.NL80211.get_stations
+        """
+        return link.get_station_dump(self._interface)
+
+    def _counter_epoch(self):
+        """Value that changes whenever the station counters were reset."""
+        return None
+
+    @Pyro4.expose
+    def get_station_deltas(self):
+        """Stations with the change of their counters since the last call.
+
+        Returns:
+            list: The stations of get_stations, each with the local time of
+                the sample, the interval to the previous sample in seconds,
+                and the delta and rate per second of every counter. interval,
+                delta and rate are None for stations seen the first time.
+        """
+        return self._station_counters.sample(self.get_stations(),
+                                             self._counter_epoch())
 
     @Pyro4.expose
     def set_down(self):
         try:
-            w = pyw.getcard(self._interface)
-            pyw.down(w)
+            self._card_call(pyw.down)
         except pyric.error as e:
             logger.error(e)
+        finally:
+            self._invalidate_card()
 
     @Pyro4.expose
     def set_up(self):
         try:
-            w = pyw.getcard(self._interface)
-            pyw.up(w)
+            self._card_call(pyw.up)
         except pyric.error as e:
             logger.error(e)
+        finally:
+            self._invalidate_card()
 
     @Pyro4.expose
     def is_up(self):
         try:
-            w = pyw.getcard(self._interface)
-            return pyw.isup(w)
+            return self._card_call(pyw.isup)
         except pyric.error as e:
             logger.error(e)
 
@@ -122,6 +176,7 @@ class WiFiInterface(Interface):
     @Pyro4.expose
     def is_connected_to(self, peer):
         if self.is_up:
+            peer = peer.lower()
             for sta in self.get_stations():
                 if sta and sta['mac'] == peer:
                     return True
@@ -129,16 +184,26 @@ class WiFiInterface(Interface):
 
     @Pyro4.expose
     def wait_for_peer(self, peer, timeout=10):
+        """Wait until the interface is connected to peer.
+
+        Sleeps on the station events of nl80211 between the checks, so the
+        call returns right after the association without polling.
+
+        Raises:
+            TimeoutError: If the peer did not connect within timeout seconds
+        """
         tic = time.time()
         logger.info('Waiting for Connection ...')
-        while(time.time() < (tic + timeout)):
-            try:
+        with link.StationEvents(self._interface) as events:
+            while True:
                 if self.is_connected_to(peer):
                     logger.debug('Connection established after %.2f seconds' %
                                  (time.time() - tic))
                     return True
-            except IndexError:
-                logger.error('Index error while checking connectivity ...')
+                remaining = tic + timeout - time.time()
+                if remaining <= 0:
+                    break
+                events.wait(remaining)
         raise TimeoutError('Connection to %s timed out after %.2f seconds' %
                            (peer, timeout))
 
@@ -152,32 +217,28 @@ class WiFiInterface(Interface):
     @Pyro4.expose
     def get_iface_info(self):
         try:
-            w = pyw.getcard(self._interface)
-            return pyw.ifinfo(w)
+            return self._card_call(pyw.ifinfo)
         except pyric.error as e:
             logger.error(e)
 
     @Pyro4.expose
     def get_dev_info(self):
         try:
-            w = pyw.getcard(self._interface)
-            return pyw.devinfo(w)
+            return self._card_call(pyw.devinfo)
         except pyric.error as e:
             logger.error(e)
 
     @Pyro4.expose
     def get_phy_info(self):
         try:
-            w = pyw.getcard(self._interface)
-            return pyw.phyinfo(w)
+            return self._card_call(pyw.phyinfo)
         except pyric.error as e:
             logger.error(e)
 
     @Pyro4.expose
     def get_phy_id(self):
         try:
-            w = pyw.getcard(self._interface)
-            return w.phy
+            return self._get_card().phy
         except pyric.error as e:
             logger.error(e)
 
@@ -188,9 +249,15 @@ class WiFiInterface(Interface):
     @Pyro4.expose
     def get_signal_strength_for_peer(self, peer, timeout=3):
         tic = time.time()
-        while time.time() < (tic + timeout):
-            station_dump = [x for x in self.get_stations()
-                            if x['mac'] == peer]
-            if station_dump:
-                return station_dump[0]['signal']
+        peer = peer.lower()
+        with link.StationEvents(self._interface) as events:
+            while True:
+                station_dump = [x for x in self.get_stations()
+                                if x['mac'] == peer]
+                if station_dump:
+                    return station_dump[0]['signal']
+                remaining = tic + timeout - time.time()
+                if remaining <= 0:
+                    break
+                events.wait(remaining)
         raise TimeoutError('Timeout reading signal strength for device')
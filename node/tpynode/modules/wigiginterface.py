@@ -21,13 +21,60 @@
 # Last Modified: 2018-10-31
 
 import logging
+import time
 import Pyro4
+from collections import namedtuple
+
 from .wigigwmi import WiGigWMI
 from .rfantenna import RFAntenna
+from ..tools import wmi
+from ..tools.counters import counter_delta
+from ..tools.rfantenna import rfantenna
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# Sector index that unlocks the selected sector of a peer
+WMI_INVALID_RF_SECTOR_INDEX = 0xffff
+
+
+def _find_record(records, key, value):
+    for record in records:
+        found = record.get(key)
+        if isinstance(found, str):
+            # MAC addresses in any case
+            found = found.lower()
+        if found == value:
+            return record
+    return dict()
+
+
+def _sample_bf(iface, peer):
+    return _find_record(iface.get_bf(), 'cid', peer['cid'])
+
+
+def _sample_station(iface, peer):
+    return _find_record(iface.get_stations(), 'mac', peer['mac'])
+
+
+def _sample_rx(iface, peer):
+    return _find_record(iface.get_debug_stations(), 'mac', peer['mac'])
+
+
+# Measurements available to sector sweeps: the fields of the record the
+# sample function returns for a peer, and whether the fields are counters
+# reported as their change during the dwell time
+SweepMetric = namedtuple('SweepMetric', ['fields', 'sample', 'delta'])
+
+sweep_metrics = {
+    'bf': SweepMetric(('rssi', 'sqi', 'tx_mcs', 'tx_tpt', 'rx_goodput',
+                       'tx_goodput', 'rx_sector', 'tx_sector'),
+                      _sample_bf, False),
+    'station': SweepMetric(('signal', 'tx_bitrate', 'tx_mcs'),
+                           _sample_station, False),
+    'rx': SweepMetric(('pkts_total', 'pkts_drop', 'pkts_dup', 'pkts_old'),
+                      _sample_rx, True)}
+
 
 class WiGigInterface (WiGigWMI, RFAntenna):
 
@@ -42,7 +89,87 @@ class WiGigInterface (WiGigWMI, RFAntenna):
     def select_enabled_tx_sectors(self, sectors, cid):
         order = sectors + ([0xff] * (128 - len(sectors)))
         n = len(sectors)
-        if self.wmi_prio_tx_sectors_order(order, 0x02, cid):
-            raise Exception('Error setting sector order')
-        if self.wmi_prio_tx_sectors_number(n, n, cid):
-            raise Exception('Error setting sector number')
+        evts = self.wmi_transact_batch([
+            wmi.encode_command('prio_tx_sectors_order', order, 0x02, cid),
+            wmi.encode_command('prio_tx_sectors_number', n, n, cid)])
+        for evt, what in zip(evts, ('order', 'number')):
+            if evt is None:
+                raise TimeoutError('No response setting sector %s' % what)
+            if wmi.wmi_status_event.unpack(evt.data).status:
+                raise Exception('Error setting sector %s' % what)
+
+    def _get_peer(self, peer):
+        # MAC address and connection id of a connected peer
+        peer = peer.lower()
+        for sta in self.get_debug_stations():
+            if sta['mac'].lower() == peer and sta['status'] == 'connected':
+                return {'mac': peer, 'cid': int(sta['cid'])}
+        return {'mac': peer, 'cid': None}
+
+    @Pyro4.expose
+    def sweep_sectors(self, peer, sectors, dwell=0.1, metrics=('bf',),
+                      sector_type=0x01, unlock=False):
+        """Measure the link to a peer for every sector of a list.
+
+        Selects each sector in turn for the given dwell time and samples the
+        metrics at its end. The sectors follow a fixed schedule, so a slow
+        measurement shortens the dwell time of the next sector instead of
+        delaying the sweep. The originally selected sector is restored
+        afterwards.
+
+        Args:
+            peer (str): MAC address of the peer
+            sectors (list): Sector indices to sweep
+            dwell (float): Seconds per sector
+            metrics (list): Names of the metrics in sweep_metrics to sample
+            sector_type (int): 0x01 for TX, 0x00 for RX sectors
+            unlock (bool): Unlock the sector selection afterwards instead
+                of restoring the originally selected sector
+
+        Returns:
+            dict: columns and one row per sector with the sector, the time
+                of the measurement since the start of the sweep and the
+                metric fields, as well as the start time and dwell time
+
+        Raises:
+            ValueError: If a metric is unknown
+        """
+        for name in metrics:
+            if name not in sweep_metrics:
+                raise ValueError('Unknown sweep metric %s' % name)
+        used = [(name, sweep_metrics[name]) for name in metrics]
+        columns = ['sector', 'time'] + ['%s_%s' % (name, field)
+                                        for name, metric in used
+                                        for field in metric.fields]
+        peer = self._get_peer(peer)
+        original = rfantenna.get_selected_sector(self.iface, sector_type,
+                                                 peer['mac'])
+        rows = list()
+        start = time.time()
+        t0 = time.monotonic()
+        try:
+            for i, sector in enumerate(sectors):
+                rfantenna.set_selected_sector(self.iface, sector_type,
+                                              peer['mac'], sector)
+                before = {name: metric.sample(self, peer)
+                          for name, metric in used if metric.delta}
+                remaining = t0 + (i + 1) * dwell - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
+                row = [sector, time.monotonic() - t0]
+                for name, metric in used:
+                    sample = metric.sample(self, peer)
+                    if metric.delta:
+                        row.extend(counter_delta(before[name].get(field),
+                                                 sample.get(field))
+                                   for field in metric.fields)
+                    else:
+                        row.extend(sample.get(field)
+                                   for field in metric.fields)
+                rows.append(row)
+        finally:
+            rfantenna.set_selected_sector(
+                self.iface, sector_type, peer['mac'],
+                WMI_INVALID_RF_SECTOR_INDEX if unlock else original)
+        return {'columns': columns, 'rows': rows, 'start': start,
+                'dwell': dwell}
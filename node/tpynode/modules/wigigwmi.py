@@ -21,9 +21,31 @@
 # Last Modified: 2018-10-31
 
 import Pyro4
+import serpent
 import struct
+import threading
+import time
 
 from .debugfs import DebugFS, mac_addr_to_bytearray
+from ..tools import wil6210, wmi
+
+wmi_timeout = 1.0
+wmi_poll_interval_min = 0.0005
+wmi_poll_interval_max = 0.02
+wmi_batch_size = 8
+
+
+def wmi_payload(payload):
+    """Payload of a WMI command as bytes.
+
+    Accepts strings, and bytes as they arrive through Pyro, where serpent
+    encodes them as a dict of base64 data.
+    """
+    if isinstance(payload, dict):
+        return serpent.tobytes(payload)
+    if isinstance(payload, str):
+        return payload.encode()
+    return bytes(payload)
 
 
 class WiGigWMI(DebugFS):
@@ -33,30 +55,250 @@ class WiGigWMI(DebugFS):
     """
 
     def __init__(self, **kwargs):
+        self._wmi_lock = threading.Lock()
+        self._wmi_stats = dict()
         super(WiGigWMI, self).__init__(**kwargs)
 
+    def _record_wmi_stats(self, cmd_id, latency):
+        stats = self._wmi_stats.get(cmd_id)
+        if stats is None:
+            stats = self._wmi_stats[cmd_id] = {
+                'count': 0, 'timeouts': 0, 'last': None, 'min': None,
+                'max': None, 'total': 0.0}
+        if latency is None:
+            stats['timeouts'] += 1
+            return
+        stats['count'] += 1
+        stats['last'] = latency
+        stats['total'] += latency
+        if stats['min'] is None or latency < stats['min']:
+            stats['min'] = latency
+        if stats['max'] is None or latency > stats['max']:
+            stats['max'] = latency
+
+    def _wmi_poll_interval(self, cmd_id):
+        # Start polling at half the latency observed for the command before
+        stats = self._wmi_stats.get(cmd_id)
+        if stats and stats['last'] is not None:
+            return min(max(stats['last'] / 2, wmi_poll_interval_min),
+                       wmi_poll_interval_max)
+        return wmi_poll_interval_min
+
+    def _wmi_run(self, commands, timeout):
+        # Send a chunk of commands back-to-back and collect their events in
+        # order. The caller holds the wmi lock.
+        results = [None] * len(commands)
+        pending = list(range(len(commands)))
+        interval = min(self._wmi_poll_interval(cmd_id)
+                       for cmd_id, _, _ in commands)
+
+        # Drop whatever arrived before the commands, only events after the
+        # last one consumed by now can complete them
+        for evt in self.read_wmi_events():
+            self.logger.debug('Skipping stale wmi evt %s' % hex(evt.id))
+        last_seq = self._wmi_mbox.last_seq
+        start = time.monotonic()
+        for cmd_id, payload, _ in commands:
+            self.send_wmi(cmd_id, payload)
+        while True:
+            for evt in self.read_wmi_events():
+                if last_seq is not None and \
+                        not wil6210.mbox_seq_newer(evt.seq, last_seq):
+                    self.logger.debug('Skipping old wmi evt %s (seq %d)' %
+                                      (hex(evt.id), evt.seq))
+                    continue
+                for i in pending:
+                    if evt.id in commands[i][2]:
+                        break
+                else:
+                    self.logger.debug('Skipping unrelated wmi evt %s' %
+                                      hex(evt.id))
+                    continue
+                pending.remove(i)
+                results[i] = evt
+                latency = time.monotonic() - start
+                self._record_wmi_stats(commands[i][0], latency)
+                self.logger.debug(
+                    'rx evt: %s payload %s (%d) after %.1f ms',
+                    hex(evt.id), evt.data.hex(), len(evt.data),
+                    latency * 1e3)
+            if not pending:
+                return results
+            remaining = start + timeout - time.monotonic()
+            if remaining <= 0:
+                for i in pending:
+                    self._record_wmi_stats(commands[i][0], None)
+                return results
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, wmi_poll_interval_max)
+
+    def wmi_transact_batch(self, commands, timeout=None, batch_size=None):
+        """Send several WMI commands and wait for their completion events.
+
+        The commands are written back-to-back in chunks of batch_size,
+        without waiting for the individual events in between. Events are
+        assigned to the commands in the order they were sent; events
+        received before the commands and events with other ids are
+        skipped. The mailbox is polled with an interval that starts at half
+        the last round-trip time of the commands and doubles up to
+        wmi_poll_interval_max.
+
+        Args:
+            commands (list): Tuples of cmd_id, payload and optionally the
+                expected event id(s), which default to cmd_id | 0x1000
+            timeout (float, optional): Seconds to wait for the events of a
+                chunk, defaults to wmi_timeout
+            batch_size (int, optional): Commands per chunk, defaults to
+                wmi_batch_size
+
+        Returns:
+            list: The completion WMIEvent per command, None if it was not
+                received in time
+        """
+        if timeout is None:
+            timeout = wmi_timeout
+        if batch_size is None:
+            batch_size = wmi_batch_size
+        cmds = list()
+        for cmd in commands:
+            cmd_id, payload = cmd[0], cmd[1]
+            event_ids = cmd[2] if len(cmd) > 2 else None
+            if event_ids is None:
+                event_ids = (cmd_id | 0x1000, )
+            elif isinstance(event_ids, int):
+                event_ids = (event_ids, )
+            cmds.append((cmd_id, wmi_payload(payload), tuple(event_ids)))
+
+        results = list()
+        with self._wmi_lock:
+            for i in range(0, len(cmds), batch_size):
+                results.extend(self._wmi_run(cmds[i:i + batch_size], timeout))
+        return results
+
+    def wmi_transact(self, cmd_id, payload, event_ids=None, timeout=None):
+        """Send a WMI command and wait for its completion event.
+
+        Args:
+            cmd_id (int): WMI command id
+            payload (bytes): Command payload
+            event_ids (int|tuple, optional): Expected event id(s), defaults
+                to cmd_id | 0x1000
+            timeout (float, optional): Seconds to wait for the event,
+                defaults to wmi_timeout
+
+        Returns:
+            WMIEvent: The completion event
+
+        Raises:
+            TimeoutError: If the event is not received in time
+        """
+        evt = self.wmi_transact_batch([(cmd_id, payload, event_ids)],
+                                      timeout)[0]
+        if evt is None:
+            raise TimeoutError('No response to wmi cmd %s within %.2fs' % (
+                hex(cmd_id), wmi_timeout if timeout is None else timeout))
+        return evt
+
+    @Pyro4.expose
+    def call_wmi(self, cmd_id, payload, event_ids=None, timeout=None):
+        """Send a WMI command and return its completion event.
+
+        Returns:
+            list: The completion event as dict with id and data, kept as a
+                list for compatibility with earlier versions
+
+        Raises:
+            TimeoutError: If the event is not received in time
+        """
+        evt = self.wmi_transact(cmd_id, payload, event_ids, timeout)
+        return [{'id': evt.id, 'data': evt.data}]
+
+    @Pyro4.expose
+    def wmi_batch(self, commands, timeout=None, batch_size=None):
+        """Send several WMI commands and return their results.
+
+        See wmi_transact_batch.
+
+        Returns:
+            list: Per command in order a dict with cmd_id, the id and raw
+                data of its completion event, the event decoded according
+                to the WMI command table as result, and the firmware status
+                of the event. Events of commands outside of the table have
+                no result, events without a status field no status. All but
+                cmd_id are None if the event was not received in time.
+        """
+        cmds = [tuple(cmd) for cmd in commands]
+        evts = self.wmi_transact_batch(cmds, timeout, batch_size)
+        results = list()
+        for cmd, evt in zip(cmds, evts):
+            result = wmi.decode_event(cmd[0], evt.data) if evt else None
+            results.append({
+                'cmd_id': cmd[0], 'id': evt.id if evt else None,
+                'data': evt.data if evt else None, 'result': result,
+                'status': result.get('status') if result else None})
+        return results
+
+    def wmi_request(self, name, *args, **kwargs):
+        """Send a command of the WMI command table and decode its event.
+
+        Args:
+            name (str): Name of the command in tools.wmi.commands
+            *args, **kwargs: Fields of the command struct
+
+        Returns:
+            namedtuple: The decoded event, or the raw event data for
+                commands without an event struct
+
+        Raises:
+            TimeoutError: If the event is not received in time
+        """
+        evt = self.wmi_transact(*wmi.encode_command(name, *args, **kwargs))
+        event = wmi.commands[name].event
+        return event.unpack(evt.data) if event else evt.data
+
     @Pyro4.expose
-    def call_wmi(self, cmd_id, payload):
-        self.send_wmi(cmd_id, payload)
-        responses = self.get_wmi_mbox()['ring_rx']
-        self.logger.debug('Received %d event(s) in wmi mbox' % len(responses))
-        for r in responses:
-            self.logger.debug('rx evt: %s payload %s (%d)', hex(r['id']),
-                              r['data'].hex(), len(r['data']))
-        return responses
+    def wmi_command(self, name, *args, **kwargs):
+        """Send a command of the WMI command table.
+
+        Returns:
+            dict: The fields of the decoded event
+        """
+        r = self.wmi_request(name, *args, **kwargs)
+        return dict(r._asdict()) if hasattr(r, '_asdict') else r
+
+    @Pyro4.expose
+    def get_wmi_commands(self):
+        return sorted(wmi.commands)
+
+    @Pyro4.expose
+    def get_wmi_stats(self):
+        """Round-trip statistics of the WMI commands sent so far.
+
+        Returns:
+            dict: Per command id, the number of completed calls and timeouts
+                and the last, min, max and mean latency in seconds
+        """
+        stats = dict()
+        for cmd_id, s in self._wmi_stats.items():
+            stats[cmd_id] = dict(s)
+            stats[cmd_id]['mean'] = s['total'] / s['count'] if s['count'] \
+                else None
+            del stats[cmd_id]['total']
+        return stats
+
+    @Pyro4.expose
+    def reset_wmi_stats(self):
+        self._wmi_stats.clear()
 
     WMI_ECHO_CMDID = 0x803
     WMI_ECHO_RSP_EVENTID = 0x1803
 
     @Pyro4.expose
     def wmi_echo(self, payload):
-        evt = self.call_wmi(self.WMI_ECHO_CMDID, payload)[0]
-        if evt['id'] == 0x1803:
-            if type(payload) is str:
-                return evt['data'].decode()
-            else:
-                return evt['data']
-        return None
+        data = self.wmi_request('echo', payload)
+        if type(payload) is str:
+            return data.decode()
+        return data
 
     WMI_RS_CFG_CMDID = 0x921
     WMI_RS_CFG_DONE_EVENTID = 0x1921
@@ -104,38 +346,13 @@ class WiGigWMI(DebugFS):
             u8 reserved[2];
         } __packed;
         '''
-        rs_enable = 0x01 if rs_enable else 0x00
-        per_threshold = kwargs.get(
-            'per_threshold',
-            [00, 00, 40, 15, 10, 00, 20, 15, 10, 00, 15, 10, 10])
-        min_frame_cnt = kwargs.get(
-            'min_frame_cnt',
-            [0x00, 0x20, 0x40, 0x40, 0x40, 0x00, 0x50, 0x50, 0x50, 0x00, 0xA0,
-             0xA0, 0xA0])
-        stop_th = kwargs.get('stop_th', 0x01)
-        mcs1_fail_th = kwargs.get('mcs1_fail_th', 0x50)
-        max_back_failure_th = kwargs.get('max_back_failure_th', 0x03)
-        dbg_disable_internal_trigger = kwargs.get(
-            'dbg_disable_internal_trigger', 0x00)
-        back_failure_mask = kwargs.get('back_failure_mask', 0x0010)
-        mcs_en_vec = kwargs.get('mcs_en_vec', 0x1dde)
-
-        wmi_rs_cfg_data = struct.pack(
-            'BB BBBBBBBBBBBBB BBBBBBBBBBBBB BBBB II',
-            cid, rs_enable, *per_threshold, *min_frame_cnt, stop_th,
-            mcs1_fail_th, max_back_failure_th, dbg_disable_internal_trigger,
-            back_failure_mask, mcs_en_vec)
-        evt = self.call_wmi(self.WMI_RS_CFG_CMDID, wmi_rs_cfg_data)[0]
-        if evt['id'] == self.WMI_RS_CFG_DONE_EVENTID:
-            r = struct.unpack('BBxx', evt['data'])
-            if r[0] == cid and r[1] == 0x00:
-                return {
-                    'rs_enable': rs_enable, 'per_threshold': per_threshold,
-                    'min_frame_cnt': min_frame_cnt, 'stop_th': stop_th,
-                    'mcs1_fail_th': mcs1_fail_th, 'max_back_failure_th':
-                    max_back_failure_th, 'dbg_disable_internal_trigger':
-                    dbg_disable_internal_trigger, 'back_failure_mask':
-                    back_failure_mask, 'mcs_en_vec': mcs_en_vec}
+        values = dict(wmi.wmi_rs_cfg_cmd.defaults)
+        values.update(kwargs)
+        values.update(cid=cid, rs_enable=0x01 if rs_enable else 0x00)
+        r = self.wmi_request('rs_cfg', **values)
+        if r.cid == cid and r.status == 0x00:
+            return {name: values[name] for name in wmi.wmi_rs_cfg_cmd.fields
+                    if name != 'cid'}
         return None
 
     WMI_GET_DETAILED_RS_RES_CMDID = 0x922
@@ -143,16 +360,8 @@ class WiGigWMI(DebugFS):
 
     @Pyro4.expose
     def wmi_get_detailed_rs_res(self, cid):
-        payload = struct.pack('B x x x', cid)
-        evt = self.call_wmi(self.WMI_GET_DETAILED_RS_RES_CMDID, payload)[0]
-        if evt['id'] == self.WMI_GET_DETAILED_RS_RES_EVENTID:
-            r = struct.unpack('BB BBBBBBBBBBBBB BBBBBBBBBBBBB <I B xxx',
-                              evt['data'])
-            rs_res = {'cid': r[0], 'status': r[1], 'num_of_tx_pkt': r[2:15],
-                      'num_of_non_acked_pkt': r[15:28], 'tsf': r[28],
-                      'mcs': r[29]}
-            return rs_res
-        return None
+        r = self.wmi_request('get_detailed_rs_res', cid)
+        return dict(r._asdict())
 
     WMI_BF_CONTROL_CMDID = 0x9AA
     WMI_BF_CONTROL_EVENTID = 0x19AA
@@ -265,43 +474,31 @@ class WiGigWMI(DebugFS):
         long_term_trig_timeout_per_mcs = kwargs.get(
             'long_term_trig_timeout_per_mcs', [0x00] * 13)
 
-        payload = struct.pack(
-            'I BBBB BBBx I BB BBBBBBBBBBBBB x HHHHHHHHHHHHH xx',
-            bf_triggers, cid, txss_mode, brp_mode,
+        bf_control = {
+            'bf_triggers': bf_triggers, 'cid': cid,
+            'txss_mode': txss_mode, 'brp_mode': brp_mode,
+            'bf_trigger_max_cts_failure_thr':
             bf_trigger_max_cts_failure_thr,
+            'bf_trigger_max_cts_failure_dense_thr':
             bf_trigger_max_cts_failure_dense_thr,
+            'bf_trigger_max_back_failure_thr':
             bf_trigger_max_back_failure_thr,
+            'bf_trigger_max_back_failure_dense_thr':
             bf_trigger_max_back_failure_dense_thr,
-            wrong_sector_bis_thr,
-            long_term_enable, long_term_update_thr,
-            *long_term_mbps_th_tbl,
-            *long_term_trig_timeout_per_mcs)
-
-        evt = self.call_wmi(self.WMI_BF_CONTROL_CMDID, payload)[0]
-        if evt['id'] == self.WMI_BF_CONTROL_EVENTID:
-            status = struct.unpack('Bxxx', evt['data'])[0]
-            if status == 0x00:
-                self.logger.info('WMI_FW_STATUS_SUCCESS')
-                return {
-                    'bf_triggers': bf_triggers, 'cid': cid,
-                    'txss_mode': txss_mode, 'brp_mode': brp_mode,
-                    'bf_trigger_max_cts_failure_thr':
-                    bf_trigger_max_cts_failure_thr,
-                    'bf_trigger_max_cts_failure_dense_thr':
-                    bf_trigger_max_cts_failure_dense_thr,
-                    'bf_trigger_max_back_failure_thr':
-                    bf_trigger_max_back_failure_thr,
-                    'bf_trigger_max_back_failure_dense_thr':
-                    bf_trigger_max_back_failure_dense_thr,
-                    'wrong_sector_bis_thr': wrong_sector_bis_thr,
-                    'long_term_enable': long_term_enable,
-                    'long_term_update_thr': long_term_update_thr,
-                    'long_term_mbps_th_tbl': long_term_mbps_th_tbl,
-                    'long_term_trig_timeout_per_mcs':
-                    long_term_trig_timeout_per_mcs}
-            else:
-                self.logger.error('WMI_FW_STATUS_FAILURE')
-                return None
+            'wrong_sector_bis_thr': wrong_sector_bis_thr,
+            'long_term_enable': long_term_enable,
+            'long_term_update_thr': long_term_update_thr,
+            'long_term_mbps_th_tbl': long_term_mbps_th_tbl,
+            'long_term_trig_timeout_per_mcs':
+            long_term_trig_timeout_per_mcs}
+
+        status = self.wmi_request('bf_control', **bf_control).status
+        if status == 0x00:
+            self.logger.info('WMI_FW_STATUS_SUCCESS')
+            return bf_control
+        else:
+            self.logger.error('WMI_FW_STATUS_FAILURE')
+            return None
 
     WMI_SET_RF_SECTOR_ON_CMDID = 0x9A4
     WMI_SET_RF_SECTOR_ON_DONE_EVENTID = 0x19A4
@@ -328,21 +525,18 @@ class WiGigWMI(DebugFS):
             u8 reserved[3];
         } __packed;
         '''
-        payload = struct.pack('HBB', sector, sector_type, rf_modules_vec)
-        evt = self.call_wmi(self.WMI_SET_RF_SECTOR_ON_CMDID, payload)[0]
+        r = self.wmi_request('set_rf_sector_on', sector, sector_type,
+                             rf_modules_vec).status
         self.logger.info('Setting RF sector on using wmi command')
-        if evt['id'] == self.WMI_SET_RF_SECTOR_ON_DONE_EVENTID:
-            r = struct.unpack('Bxxx', evt['data'])[0]
-            if r == 0:
-                self.logger.info('WMI_RF_SECTOR_STATUS_SUCCESS')
-            elif r == 1:
-                self.logger.error('WMI_RF_SECTOR_STATUS_BAD_PARAMETERS_ERROR')
-            elif r == 1:
-                self.logger.error('WMI_RF_SECTOR_STATUS_BUSY_ERROR')
-            elif r == 1:
-                self.logger.error('WMI_RF_SECTOR_STATUS_NOT_SUPPORTED_ERROR')
-            return r
-        return None
+        if r == 0:
+            self.logger.info('WMI_RF_SECTOR_STATUS_SUCCESS')
+        elif r == 1:
+            self.logger.error('WMI_RF_SECTOR_STATUS_BAD_PARAMETERS_ERROR')
+        elif r == 1:
+            self.logger.error('WMI_RF_SECTOR_STATUS_BUSY_ERROR')
+        elif r == 1:
+            self.logger.error('WMI_RF_SECTOR_STATUS_NOT_SUPPORTED_ERROR')
+        return r
 
     @Pyro4.expose
     def wmi_prio_tx_sectors_order(self, prio, swptype, cid):
@@ -388,22 +582,18 @@ class WiGigWMI(DebugFS):
         } __packed;
 
         """
-        max_sectors = 128
-        payload = struct.pack('B' * max_sectors + 'BBxx', *prio, swptype, cid)
-        evt = self.call_wmi(0x9a5, payload)[0]
+        r = self.wmi_request('prio_tx_sectors_order', prio, swptype,
+                             cid).status
         self.logger.info('Setting TX sector prio using wmi command')
-        if evt['id'] == 0x19a5:
-            r = struct.unpack('Bxxx', evt['data'])[0]
-            if r == 0:
-                self.logger.info('WMI_RF_SECTOR_STATUS_SUCCESS')
-            elif r == 1:
-                self.logger.error('WMI_RF_SECTOR_STATUS_BAD_PARAMETERS_ERROR')
-            elif r == 2:
-                self.logger.error('WMI_RF_SECTOR_STATUS_BUSY_ERROR')
-            elif r == 3:
-                self.logger.error('WMI_RF_SECTOR_STATUS_NOT_SUPPORTED_ERROR')
-            return r
-        return None
+        if r == 0:
+            self.logger.info('WMI_RF_SECTOR_STATUS_SUCCESS')
+        elif r == 1:
+            self.logger.error('WMI_RF_SECTOR_STATUS_BAD_PARAMETERS_ERROR')
+        elif r == 2:
+            self.logger.error('WMI_RF_SECTOR_STATUS_BUSY_ERROR')
+        elif r == 3:
+            self.logger.error('WMI_RF_SECTOR_STATUS_NOT_SUPPORTED_ERROR')
+        return r
 
     @Pyro4.expose
     def wmi_prio_tx_sectors_number(self, beacon_num, txss_num, cid):
@@ -435,21 +625,18 @@ class WiGigWMI(DebugFS):
             u8 reserved[3];
         } __packed;
         """
-        payload = struct.pack('BBBx', beacon_num, txss_num, cid)
-        evt = self.call_wmi(0x9a6, payload)[0]
+        r = self.wmi_request('prio_tx_sectors_number', beacon_num, txss_num,
+                             cid).status
         self.logger.info('Setting TX sector number using wmi command')
-        if evt['id'] == 0x19a6 or evt['id'] == 0x19a5:
-            r = struct.unpack('Bxxx', evt['data'])[0]
-            if r == 0:
-                self.logger.info('WMI_RF_SECTOR_STATUS_SUCCESS')
-            elif r == 1:
-                self.logger.error('WMI_RF_SECTOR_STATUS_BAD_PARAMETERS_ERROR')
-            elif r == 1:
-                self.logger.error('WMI_RF_SECTOR_STATUS_BUSY_ERROR')
-            elif r == 1:
-                self.logger.error('WMI_RF_SECTOR_STATUS_NOT_SUPPORTED_ERROR')
-            return r
-        return None
+        if r == 0:
+            self.logger.info('WMI_RF_SECTOR_STATUS_SUCCESS')
+        elif r == 1:
+            self.logger.error('WMI_RF_SECTOR_STATUS_BAD_PARAMETERS_ERROR')
+        elif r == 1:
+            self.logger.error('WMI_RF_SECTOR_STATUS_BUSY_ERROR')
+        elif r == 1:
+            self.logger.error('WMI_RF_SECTOR_STATUS_NOT_SUPPORTED_ERROR')
+        return r
 
     @Pyro4.expose
     def wmi_ps_dev_profile_cfg(self, ps_profile):
@@ -485,19 +672,15 @@ class WiGigWMI(DebugFS):
             WMI_PS_CFG_CMD_STATUS_ERROR = 0x02,
         };
         """
-        payload = struct.pack('Bxxx', ps_profile)
-        evt = self.call_wmi(0x91C, payload)[0]
+        r = self.wmi_request('ps_dev_profile_cfg', ps_profile).status
         self.logger.info('Setting Power save profile using wmi command')
-        if evt['id'] == 0x191C:
-            r = struct.unpack('I', evt['data'])[0]
-            if r == 0:
-                self.logger.info('WMI_PS_CFG_CMD_STATUS_SUCCESS')
-            elif r == 1:
-                self.logger.error('WMI_PS_CFG_CMD_STATUS_BAD_PARAM')
-            elif r == 2:
-                self.logger.error('WMI_PS_CFG_CMD_STATUS_ERROR')
-            return r
-        return None
+        if r == 0:
+            self.logger.info('WMI_PS_CFG_CMD_STATUS_SUCCESS')
+        elif r == 1:
+            self.logger.error('WMI_PS_CFG_CMD_STATUS_BAD_PARAM')
+        elif r == 2:
+            self.logger.error('WMI_PS_CFG_CMD_STATUS_ERROR')
+        return r
 
     @Pyro4.expose
     def wmi_ps_dev_profile_cfg_read(self):
@@ -527,21 +710,17 @@ class WiGigWMI(DebugFS):
         } __packed;
         """
 
-        payload = bytearray(4)
-        evt = self.call_wmi(0x942, payload)[0]
+        r = self.wmi_request('ps_dev_profile_cfg_read').ps_profile
         self.logger.info('Reading current power profile')
-        if evt['id'] == 0x1942:
-            r = struct.unpack('Bxxx', evt['data'])[0]
-            if r == 0:
-                self.logger.info('WMI_PS_PROFILE_TYPE_DEFAULT')
-            elif r == 1:
-                self.logger.info('WMI_PS_PROFILE_TYPE_PS_DISABLED')
-            elif r == 2:
-                self.logger.info('WMI_PS_PROFILE_TYPE_MAX_PS')
-            elif r == 3:
-                self.logger.info('WMI_PS_PROFILE_TYPE_LOW_LATENCY_PS')
-            return r
-        return None
+        if r == 0:
+            self.logger.info('WMI_PS_PROFILE_TYPE_DEFAULT')
+        elif r == 1:
+            self.logger.info('WMI_PS_PROFILE_TYPE_PS_DISABLED')
+        elif r == 2:
+            self.logger.info('WMI_PS_PROFILE_TYPE_MAX_PS')
+        elif r == 3:
+            self.logger.info('WMI_PS_PROFILE_TYPE_LOW_LATENCY_PS')
+        return r
 
     @Pyro4.expose
     def wmi_prio_tx_sectors_default_cfg(self, swptype, cid):
@@ -568,21 +747,18 @@ class WiGigWMI(DebugFS):
             u8 reserved[3];
         } __packed;
         '''
-        payload = struct.pack('BBxx', swptype, cid)
-        evt = self.call_wmi(0x9a7, payload)[0]
+        r = self.wmi_request('prio_tx_sectors_set_default_cfg', swptype,
+                             cid).status
         self.logger.info('Setting TX sector number using wmi command')
-        if evt['id'] == 0x19a7 or evt['id'] == 0x19a5:
-            r = struct.unpack('Bxxx', evt['data'])[0]
-            if r == 0:
-                self.logger.info('WMI_RF_SECTOR_STATUS_SUCCESS')
-            elif r == 1:
-                self.logger.error('WMI_RF_SECTOR_STATUS_BAD_PARAMETERS_ERROR')
-            elif r == 1:
-                self.logger.error('WMI_RF_SECTOR_STATUS_BUSY_ERROR')
-            elif r == 1:
-                self.logger.error('WMI_RF_SECTOR_STATUS_NOT_SUPPORTED_ERROR')
-            return r
-        return None
+        if r == 0:
+            self.logger.info('WMI_RF_SECTOR_STATUS_SUCCESS')
+        elif r == 1:
+            self.logger.error('WMI_RF_SECTOR_STATUS_BAD_PARAMETERS_ERROR')
+        elif r == 1:
+            self.logger.error('WMI_RF_SECTOR_STATUS_BUSY_ERROR')
+        elif r == 1:
+            self.logger.error('WMI_RF_SECTOR_STATUS_NOT_SUPPORTED_ERROR')
+        return r
 
     @Pyro4.expose
     def wmi_aoa_meas(self, peer, channel, meas_type, rf_mask):
@@ -639,29 +815,25 @@ class WiGigWMI(DebugFS):
         } __packed;
     '''
         print('Obtaining AoA Information')
-        addr = [b for b in mac_addr_to_bytearray(peer)]
-        payload = struct.pack('BBBBBB BB I', *addr, channel, meas_type,
-                              rf_mask)
-        evts = self.call_wmi(0x923, payload)
-        evt = [e for e in evts if e['id'] == 0x1923]
-        if evt:
-            evt = evt[0]
-        else:
-            return None
-        header = struct.unpack_from('BBBBBB BB I Bx H', evt['data'])
-        if header[9] == 0x00:
+        addr = mac_addr_to_bytearray(peer)
+        evt = self.wmi_transact(*wmi.encode_command(
+            'aoa_meas', addr, channel, meas_type, rf_mask))
+        header = wmi.wmi_aoa_meas_event.unpack(evt.data)
+        if header.meas_status == 0x00:
             print('WMI_AOA_MEAS_SUCCESS')
             self.logger.info('WMI_AOA_MEAS_SUCCESS')
-            data_length = header[-1]
+            data_length = header.length
             self.logger.info('Extracted %d bytes' % data_length)
-            meas_data = struct.unpack_from('H' * round(data_length / 2), evt['data'][16:])
+            meas_data = struct.unpack_from(
+                '<%dH' % (data_length // 2), evt.data,
+                wmi.wmi_aoa_meas_event.size)
             print(meas_data)
             return meas_data
-        elif header[9] == 0x01:
+        elif header.meas_status == 0x01:
             self.logger.error('WMI_AOA_MEAS_PEER_INCAPABLE')
 
             return None
-        elif header[9] == 0x02:
+        elif header.meas_status == 0x02:
             self.logger.error('WMI_AOA_MEAS_FAILURE')
             return None
 
@@ -700,18 +872,11 @@ class WiGigWMI(DebugFS):
             __le32 table;
         } __packed;
     '''
-        payload = struct.pack('I', wmi_silent_rssi_table)
-        cmd_id = self.WMI_SET_ACTIVE_SILENT_RSSI_TABLE_CMDID
-        evt = self.call_wmi(cmd_id, payload)[0]
-        if evt['id'] == self.WMI_SET_SILENT_RSSI_TABLE_DONE_EVENTID:
-            r = struct.unpack('II', evt['data'])
-            wmi_silent_rssi_status = r[0]
-            wmi_silent_rssi_table = r[1]
-
-            if wmi_silent_rssi_status == 0:
-                return wmi_silent_rssi_table
-            else:
-                self.logger.error('SILENT_RSSI_FAILURE')
+        r = self.wmi_request('set_active_silent_rssi_table',
+                             wmi_silent_rssi_table)
+        if r.status == 0:
+            return r.table
+        self.logger.error('SILENT_RSSI_FAILURE')
         return None
 
 
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#          ###########   ###########   ##########    ##########
+#         ############  ############  ############  ############
+#         ##            ##            ##   ##   ##  ##        ##
+#         ##            ##            ##   ##   ##  ##        ##
+#         ###########   ####  ######  ##   ##   ##  ##    ######
+#          ###########  ####  #       ##   ##   ##  ##    #    #
+#                   ##  ##    ######  ##   ##   ##  ##    #    #
+#                   ##  ##    #       ##   ##   ##  ##    #    #
+#         ############  ##### ######  ##   ##   ##  ##### ######
+#         ###########    ###########  ##   ##   ##   ##########
+#
+#            S E C U R E   M O B I L E   N E T W O R K I N G
+#
+# Author:        Daniel Steinmetzer
+# E-Mail:        dsteinmetzer@seemoo.tu-darmstadt.de
+# Website:       https://www.seemoo.de/dsteinmetzer
+# Project:       TPY - The Testbed Experimentation Framework
+# File:          counters.py
+# Date:          2026-10-19
+#
+
+"""Deltas and rates of cumulative counters between two samples."""
+
+import threading
+import time
+
+
+def counter_delta(prev, cur, reset=False):
+    """Difference of a counter between two samples.
+
+    A counter that decreased is assumed to have restarted from zero, so the
+    delta is its current value. Lists are compared elementwise. Negative
+    values mark unavailable counters and yield None.
+    """
+    if prev is None or cur is None:
+        return None
+    if isinstance(cur, (list, tuple)):
+        if not isinstance(prev, (list, tuple)) or len(prev) != len(cur):
+            return None
+        return [counter_delta(p, c, reset) for p, c in zip(prev, cur)]
+    if cur < 0 or prev < 0:
+        return None
+    if reset or cur < prev:
+        return cur
+    return cur - prev
+
+
+def counter_rate(delta, interval):
+    if delta is None or not interval:
+        return None
+    if isinstance(delta, list):
+        return [counter_rate(d, interval) for d in delta]
+    return delta / interval
+
+
+def counter_decreased(prev, cur):
+    if prev is None or cur is None:
+        return False
+    if isinstance(cur, (list, tuple)):
+        return isinstance(prev, (list, tuple)) and \
+            any(counter_decreased(p, c) for p, c in zip(prev, cur))
+    return 0 <= cur < prev
+
+
+class CounterTracker(object):
+
+    """Keeps the previous sample of a set of records to compute deltas.
+
+    Records are identified by a key, e.g. the MAC address of a station.
+    Each call to sample returns the records extended by the local time of
+    the sample, the interval to the previous sample of the same record and
+    the deltas and rates of the cumulative counters. Records missing from a
+    sample are forgotten.
+
+    Args:
+        counters (list): Names of the cumulative counters in the records
+        key (callable): Returns the key of a record
+    """
+
+    def __init__(self, counters, key):
+        self.counters = tuple(counters)
+        self._key = key
+        self._samples = dict()
+        self._epoch = None
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._samples = dict()
+            self._epoch = None
+
+    def sample(self, records, epoch=None):
+        """Compute deltas and rates against the previous sample.
+
+        Args:
+            records (list): Current records with cumulative counters
+            epoch (optional): Value that changes whenever all counters were
+                reset, e.g. the firmware recovery count
+
+        Returns:
+            list: The records with time, interval, reset, delta and rate.
+                interval, delta and rate are None for new records.
+        """
+        now = time.monotonic()
+        wall = time.time()
+        with self._lock:
+            reset_all = epoch is not None and self._epoch is not None and \
+                epoch != self._epoch
+            if epoch is not None:
+                self._epoch = epoch
+            samples = dict()
+            results = list()
+            for record in records:
+                key = self._key(record)
+                prev = self._samples.get(key)
+                result = dict(record)
+                result['time'] = wall
+                if prev is None:
+                    result.update(interval=None, reset=False, delta=None,
+                                  rate=None)
+                else:
+                    prev_time, prev_record = prev
+                    interval = now - prev_time
+                    reset = reset_all or any(
+                        counter_decreased(prev_record.get(name),
+                                          record.get(name))
+                        for name in self.counters)
+                    delta = {name: counter_delta(prev_record.get(name),
+                                                 record.get(name), reset_all)
+                             for name in self.counters}
+                    result.update(
+                        interval=interval, reset=reset, delta=delta,
+                        rate={name: counter_rate(d, interval)
+                              for name, d in delta.items()})
+                samples[key] = (now, record)
+                results.append(result)
+            self._samples = samples
+        return results
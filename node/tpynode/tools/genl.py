@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#          ###########   ###########   ##########    ##########
+#         ############  ############  ############  ############
+#         ##            ##            ##   ##   ##  ##        ##
+#         ##            ##            ##   ##   ##  ##        ##
+#         ###########   ####  ######  ##   ##   ##  ##    ######
+#          ###########  ####  #       ##   ##   ##  ##    #    #
+#                   ##  ##    ######  ##   ##   ##  ##    #    #
+#                   ##  ##    #       ##   ##   ##  ##    #    #
+#         ############  ##### ######  ##   ##   ##  ##### ######
+#         ###########    ###########  ##   ##   ##   ##########
+#
+#            S E C U R E   M O B I L E   N E T W O R K I N G
+#
+# Author:        Daniel Steinmetzer
+# E-Mail:        dsteinmetzer@seemoo.tu-darmstadt.de
+# Website:       https://www.seemoo.de/dsteinmetzer
+# Project:       TPY - The Testbed Experimentation Framework
+# File:          genl.py
+# Date:          2026-10-19
+#
+
+"""Generic netlink transport for nl80211.
+
+A single netlink socket is opened per process and kept for all requests,
+so commands to the driver cost a round trip through the kernel instead of
+starting iw for every call.
+"""
+
+import errno
+import logging
+import os
+import socket
+import struct
+import threading
+
+logger = logging.getLogger(__name__)
+
+NETLINK_GENERIC = 16
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+NLM_F_REQUEST = 0x01
+NLM_F_MULTI = 0x02
+NLM_F_ACK = 0x04
+NLM_F_DUMP = 0x300
+
+NLA_TYPE_MASK = 0x3fff
+
+GENL_ID_CTRL = 0x10
+CTRL_CMD_GETFAMILY = 3
+CTRL_ATTR_FAMILY_ID = 1
+CTRL_ATTR_FAMILY_NAME = 2
+CTRL_ATTR_MCAST_GROUPS = 7
+CTRL_ATTR_MCAST_GRP_NAME = 1
+CTRL_ATTR_MCAST_GRP_ID = 2
+
+SOL_NETLINK = 270
+NETLINK_ADD_MEMBERSHIP = 1
+
+NL80211_CMD_GET_STATION = 17
+NL80211_CMD_NEW_STATION = 19
+NL80211_CMD_DEL_STATION = 20
+NL80211_CMD_CONNECT = 46
+NL80211_CMD_DISCONNECT = 48
+NL80211_CMD_VENDOR = 103
+NL80211_ATTR_IFINDEX = 3
+NL80211_ATTR_MAC = 6
+NL80211_ATTR_STA_INFO = 21
+NL80211_ATTR_VENDOR_ID = 195
+NL80211_ATTR_VENDOR_SUBCMD = 196
+NL80211_ATTR_VENDOR_DATA = 197
+
+nlmsghdr = struct.Struct('=IHHII')
+genlmsghdr = struct.Struct('=BBH')
+nlattr = struct.Struct('=HH')
+nlmsgerr = struct.Struct('=i')
+
+# Counters of NL80211_ATTR_STA_INFO, the 64 bit variants take precedence
+sta_info_u32 = {2: 'rx_bytes', 3: 'tx_bytes', 9: 'rx_pkts', 10: 'tx_pkts',
+                12: 'tx_failed'}
+sta_info_u64 = {23: 'rx_bytes', 24: 'tx_bytes', 28: 'rx_dropped'}
+NL80211_STA_INFO_SIGNAL = 7
+# Nested rate info and the keys of its bitrate and MCS
+sta_info_rates = {8: ('tx_bitrate', 'tx_mcs'), 14: ('rx_bitrate', 'rx_mcs')}
+NL80211_RATE_INFO_BITRATE = 1
+NL80211_RATE_INFO_MCS = 2
+NL80211_RATE_INFO_BITRATE32 = 5
+
+station_fields = ('mac', 'rx_bytes', 'rx_pkts', 'tx_bytes', 'tx_pkts',
+                  'tx_failed', 'rx_dropped', 'signal', 'tx_bitrate', 'tx_mcs',
+                  'rx_bitrate', 'rx_mcs')
+
+genl_timeout = 2.0
+genl_recv_size = 65536
+genl_batch_size = 16
+
+
+class NetlinkError(OSError):
+    """Error reported by the kernel for a netlink request."""
+    pass
+
+
+def nla_align(length):
+    return (length + 3) & ~3
+
+
+def nla_pack(nla_type, payload):
+    """Encode a single attribute including its padding."""
+    length = nlattr.size + len(payload)
+    return nlattr.pack(length, nla_type) + bytes(payload) + \
+        bytes(nla_align(length) - length)
+
+
+def nla_pack_u32(nla_type, value):
+    return nla_pack(nla_type, struct.pack('=I', value))
+
+
+def nla_iter(data, offset=0, end=None):
+    """Iterate over the attributes of a stream.
+
+    Yields:
+        tuple: Type without flags and payload of every attribute
+    """
+    if end is None:
+        end = len(data)
+    view = memoryview(data)
+    while offset + nlattr.size <= end:
+        length, nla_type = nlattr.unpack_from(data, offset)
+        if length < nlattr.size:
+            break
+        yield nla_type & NLA_TYPE_MASK, view[offset + nlattr.size:
+                                             offset + length]
+        offset += nla_align(length)
+
+
+class GenlSocket(object):
+
+    """Generic netlink socket shared by all requests of a process.
+
+    Replies are matched by their sequence number, so replies of a request
+    that timed out earlier are discarded.
+    """
+
+    def __init__(self, timeout=None):
+        self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                                   NETLINK_GENERIC)
+        self._sock.bind((0, 0))
+        self._sock.settimeout(genl_timeout if timeout is None else timeout)
+        self._buffer = bytearray(genl_recv_size)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._families = dict()
+        self._groups = dict()
+
+    def close(self):
+        self._sock.close()
+
+    def request(self, family, cmd, attrs=b'', flags=NLM_F_ACK, version=1):
+        """Send a request and collect its replies.
+
+        Args:
+            family (int): Id of the generic netlink family
+            cmd (int): Command of the family
+            attrs (bytes): Encoded attributes of the request
+            flags (int): Netlink flags in addition to NLM_F_REQUEST
+
+        Returns:
+            list: Attribute streams of all replies as bytes
+
+        Raises:
+            NetlinkError: If the kernel rejected the request
+            socket.timeout: If the request was not completed in time
+        """
+        with self._lock:
+            self._seq = (self._seq + 1) & 0xffffffff
+            seq = self._seq
+            length = nlmsghdr.size + genlmsghdr.size + len(attrs)
+            msg = nlmsghdr.pack(length, family, NLM_F_REQUEST | flags, seq,
+                                0) + genlmsghdr.pack(cmd, version, 0) + attrs
+            self._sock.send(msg)
+            return self._receive(seq, flags)
+
+    def request_batch(self, family, cmd, attrs_list, version=1):
+        """Send several acknowledged requests back to back.
+
+        All requests are sent before the first reply is read, replies are
+        assigned to their requests by sequence number.
+
+        Args:
+            family (int): Id of the generic netlink family
+            cmd (int): Command of the family
+            attrs_list (list): Encoded attributes of every request
+
+        Returns:
+            list: Replies of every request, as returned by request
+
+        Raises:
+            NetlinkError: If the kernel rejected any of the requests
+            socket.timeout: If the requests were not completed in time
+        """
+        with self._lock:
+            seqs = list()
+            for attrs in attrs_list:
+                self._seq = (self._seq + 1) & 0xffffffff
+                seqs.append(self._seq)
+                length = nlmsghdr.size + genlmsghdr.size + len(attrs)
+                self._sock.send(
+                    nlmsghdr.pack(length, family, NLM_F_REQUEST | NLM_F_ACK,
+                                  self._seq, 0) +
+                    genlmsghdr.pack(cmd, version, 0) + attrs)
+            pending = {seq: list() for seq in seqs}
+            results = dict()
+            while pending:
+                self._receive_into(pending, results, NLM_F_ACK)
+            return [results[seq] for seq in seqs]
+
+    def _receive(self, seq, flags):
+        pending = {seq: list()}
+        results = dict()
+        while pending:
+            self._receive_into(pending, results, flags)
+        return results[seq]
+
+    def _receive_into(self, pending, results, flags):
+        # Read one datagram and file its messages under their requests,
+        # completed requests move from pending to results
+        buf = self._buffer
+        n = self._sock.recv_into(buf)
+        offset = 0
+        while offset + nlmsghdr.size <= n:
+            length, msg_type, msg_flags, msg_seq, _ = \
+                nlmsghdr.unpack_from(buf, offset)
+            if length < nlmsghdr.size:
+                break
+            start, offset = offset, offset + nla_align(length)
+            replies = pending.get(msg_seq)
+            if replies is None:
+                continue
+            if msg_type == NLMSG_ERROR:
+                err = nlmsgerr.unpack_from(buf, start + nlmsghdr.size)[0]
+                if err:
+                    raise NetlinkError(-err, os.strerror(-err))
+                results[msg_seq] = pending.pop(msg_seq)
+                continue
+            if msg_type == NLMSG_DONE:
+                results[msg_seq] = pending.pop(msg_seq)
+                continue
+            replies.append(bytes(buf[start + nlmsghdr.size +
+                                     genlmsghdr.size:start + length]))
+            if not (msg_flags & NLM_F_MULTI or flags & NLM_F_ACK):
+                results[msg_seq] = pending.pop(msg_seq)
+
+    def resolve_family(self, name):
+        """Look up the id of a generic netlink family by its name."""
+        family = self._families.get(name)
+        if family is None:
+            replies = self.request(
+                GENL_ID_CTRL, CTRL_CMD_GETFAMILY,
+                nla_pack(CTRL_ATTR_FAMILY_NAME, name.encode() + b'\0'))
+            groups = dict()
+            for reply in replies:
+                for nla_type, payload in nla_iter(reply):
+                    if nla_type == CTRL_ATTR_FAMILY_ID:
+                        family = struct.unpack_from('=H', payload)[0]
+                    elif nla_type == CTRL_ATTR_MCAST_GROUPS:
+                        groups.update(self._mcast_groups(payload))
+            if family is None:
+                raise NetlinkError(errno.ENOENT,
+                                   'Unknown netlink family %s' % name)
+            self._families[name] = family
+            self._groups[name] = groups
+        return family
+
+    def resolve_group(self, family, name):
+        """Look up the id of a multicast group of a family by its name."""
+        self.resolve_family(family)
+        group = self._groups[family].get(name)
+        if group is None:
+            raise NetlinkError(errno.ENOENT, 'Unknown multicast group %s/%s'
+                               % (family, name))
+        return group
+
+    @staticmethod
+    def _mcast_groups(data):
+        # Every group is a nested attribute with its name and id
+        for _, payload in nla_iter(data):
+            name = group = None
+            for nla_type, value in nla_iter(payload):
+                if nla_type == CTRL_ATTR_MCAST_GRP_NAME:
+                    name = bytes(value).rstrip(b'\0').decode()
+                elif nla_type == CTRL_ATTR_MCAST_GRP_ID:
+                    group = struct.unpack_from('=I', value)[0]
+            if name is not None and group is not None:
+                yield name, group
+
+
+class GenlEventSocket(object):
+
+    """Generic netlink socket receiving the events of multicast groups.
+
+    Events are only queued by the kernel while the socket is open, so it
+    has to be opened before checking the state the events report on.
+
+    Args:
+        groups (list): Ids of the multicast groups to join
+    """
+
+    def __init__(self, groups):
+        self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                                   NETLINK_GENERIC)
+        try:
+            self._sock.bind((0, 0))
+            for group in groups:
+                self._sock.setsockopt(SOL_NETLINK, NETLINK_ADD_MEMBERSHIP,
+                                      group)
+        except OSError:
+            self._sock.close()
+            raise
+        self._buffer = bytearray(genl_recv_size)
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def receive(self, timeout):
+        """Wait for the next datagram of events.
+
+        Args:
+            timeout (float): Seconds to wait at most
+
+        Returns:
+            list: Command and attribute stream of every event, empty if no
+                event arrived in time. Events lost because the socket
+                buffer overflowed are reported as a command of None.
+        """
+        self._sock.settimeout(max(timeout, 0))
+        buf = self._buffer
+        try:
+            n = self._sock.recv_into(buf)
+        except socket.timeout:
+            return list()
+        except OSError as e:
+            if e.errno != errno.ENOBUFS:
+                raise
+            return [(None, b'')]
+        events = list()
+        offset = 0
+        while offset + nlmsghdr.size <= n:
+            length, msg_type, _, _, _ = nlmsghdr.unpack_from(buf, offset)
+            if length < nlmsghdr.size:
+                break
+            start, offset = offset, offset + nla_align(length)
+            if msg_type in (NLMSG_ERROR, NLMSG_DONE):
+                continue
+            cmd = genlmsghdr.unpack_from(buf, start + nlmsghdr.size)[0]
+            events.append((cmd, bytes(buf[start + nlmsghdr.size +
+                                          genlmsghdr.size:start + length])))
+        return events
+
+
+class NL80211(object):
+
+    """nl80211 commands on a shared generic netlink socket."""
+
+    def __init__(self, sock=None):
+        self.sock = GenlSocket() if sock is None else sock
+        self.family = self.sock.resolve_family('nl80211')
+
+    def vendor_cmd(self, iface, vendor_id, subcmd, data=b''):
+        """Call a vendor command of the driver.
+
+        Args:
+            iface (str): Name of the interface
+            vendor_id (int): OUI of the vendor
+            subcmd (int): Vendor specific command
+            data (bytes): Encoded attributes passed to the driver
+
+        Returns:
+            bytes: Vendor data of the response, empty without response
+        """
+        return self.vendor_cmd_batch(iface, vendor_id, subcmd, [data])[0]
+
+    def vendor_cmd_batch(self, iface, vendor_id, subcmd, data_list):
+        """Call a vendor command once for every data in data_list.
+
+        The calls are pipelined in chunks of genl_batch_size, so their
+        replies never exceed the receive buffer of the socket.
+
+        Returns:
+            list: Vendor data of every response
+        """
+        header = nla_pack_u32(NL80211_ATTR_IFINDEX,
+                              socket.if_nametoindex(iface)) + \
+            nla_pack_u32(NL80211_ATTR_VENDOR_ID, vendor_id) + \
+            nla_pack_u32(NL80211_ATTR_VENDOR_SUBCMD, subcmd)
+        attrs_list = [header + nla_pack(NL80211_ATTR_VENDOR_DATA, data)
+                      if data else header for data in data_list]
+        results = list()
+        for i in range(0, len(attrs_list), genl_batch_size):
+            for replies in self.sock.request_batch(
+                    self.family, NL80211_CMD_VENDOR,
+                    attrs_list[i:i + genl_batch_size]):
+                results.append(self._vendor_data(replies))
+        return results
+
+    def get_stations(self, iface):
+        """Dump the stations of an interface.
+
+        Returns:
+            list: One dict per station with the fields of station_fields.
+                Counters are ints, signal in dBm, bitrates in MBit/s as
+                floats. Fields the driver does not report are None.
+        """
+        replies = self.sock.request(
+            self.family, NL80211_CMD_GET_STATION,
+            nla_pack_u32(NL80211_ATTR_IFINDEX, socket.if_nametoindex(iface)),
+            flags=NLM_F_DUMP)
+        stations = list()
+        for reply in replies:
+            sta = dict.fromkeys(station_fields)
+            for nla_type, payload in nla_iter(reply):
+                if nla_type == NL80211_ATTR_MAC:
+                    sta['mac'] = ':'.join('%02x' % b for b in payload)
+                elif nla_type == NL80211_ATTR_STA_INFO:
+                    self._decode_sta_info(payload, sta)
+            if sta['mac'] is not None:
+                stations.append(sta)
+        return stations
+
+    def subscribe(self, *groups):
+        """Open a socket receiving the events of nl80211 multicast groups.
+
+        Args:
+            groups (str): Names of the groups, e.g. 'mlme'
+
+        Returns:
+            GenlEventSocket: The socket, to be closed by the caller
+        """
+        return GenlEventSocket([self.sock.resolve_group('nl80211', group)
+                                for group in groups])
+
+    @staticmethod
+    def _decode_sta_info(data, sta):
+        for nla_type, payload in nla_iter(data):
+            if nla_type in sta_info_u64:
+                sta[sta_info_u64[nla_type]] = \
+                    struct.unpack_from('=Q', payload)[0]
+            elif nla_type in sta_info_u32:
+                key = sta_info_u32[nla_type]
+                if sta[key] is None:
+                    sta[key] = struct.unpack_from('=I', payload)[0]
+            elif nla_type == NL80211_STA_INFO_SIGNAL:
+                sta['signal'] = struct.unpack_from('=b', payload)[0]
+            elif nla_type in sta_info_rates:
+                bitrate_key, mcs_key = sta_info_rates[nla_type]
+                bitrate = None
+                for rate_type, rate in nla_iter(payload):
+                    if rate_type == NL80211_RATE_INFO_BITRATE32:
+                        bitrate = struct.unpack_from('=I', rate)[0]
+                    elif rate_type == NL80211_RATE_INFO_BITRATE and \
+                            bitrate is None:
+                        bitrate = struct.unpack_from('=H', rate)[0]
+                    elif rate_type == NL80211_RATE_INFO_MCS:
+                        sta[mcs_key] = rate[0]
+                if bitrate is not None:
+                    # Reported in units of 100 kbit/s
+                    sta[bitrate_key] = bitrate / 10
+
+    @staticmethod
+    def _vendor_data(replies):
+        for reply in replies:
+            for nla_type, payload in nla_iter(reply):
+                if nla_type == NL80211_ATTR_VENDOR_DATA:
+                    return bytes(payload)
+        return b''
+
+
+_nl80211 = None
+_nl80211_lock = threading.Lock()
+
+# Transport of nl80211 commands, 'auto' uses generic netlink if available
+# and iw otherwise, 'genl' and 'iw' force either of them
+nl80211_backend = 'auto'
+
+
+def get_nl80211():
+    """Shared nl80211 handle of the process, opened on first use.
+
+    Raises:
+        OSError: If generic netlink or nl80211 is not available
+    """
+    global _nl80211
+    if _nl80211 is None:
+        with _nl80211_lock:
+            if _nl80211 is None:
+                _nl80211 = NL80211()
+    return _nl80211
+
+
+def find_nl80211():
+    """Shared nl80211 handle, or None if iw has to be used instead.
+
+    The first failure to open generic netlink with backend 'auto' switches
+    the backend to 'iw', for vendor commands and station dumps alike.
+
+    Raises:
+        OSError: If generic netlink is not available with backend 'genl'
+    """
+    global nl80211_backend
+    if nl80211_backend == 'iw':
+        return None
+    try:
+        return get_nl80211()
+    except OSError as e:
+        if nl80211_backend == 'genl':
+            raise
+        logger.warning('Generic netlink unavailable (%s), '
+                       'falling back to iw' % e)
+        nl80211_backend = 'iw'
+        return None
+
+
+def reset_nl80211():
+    """Forget the shared nl80211 handle of the process.
+
+    Has to be called in a forked child, which must neither share the socket
+    with its parent nor wait for a lock held by a thread of the parent.
+    """
+    global _nl80211, _nl80211_lock
+    _nl80211 = None
+    _nl80211_lock = threading.Lock()
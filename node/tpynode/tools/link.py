@@ -23,13 +23,45 @@
 
 import logging
 import re
+import socket
+import struct
 import subprocess
+import time
+
+from . import genl
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 re_mac = re.compile('^[a-fA-F0-9\:]{17}')
 
+# Poll interval bounds of StationEvents without nl80211 events, and the
+# longest wait for an event before the caller checks again anyway
+station_poll_min = 0.01
+station_poll_max = 0.5
+station_event_max = 1.0
+
+# nl80211 events that change the stations or the link of an interface
+station_event_cmds = (genl.NL80211_CMD_NEW_STATION,
+                      genl.NL80211_CMD_DEL_STATION,
+                      genl.NL80211_CMD_CONNECT, genl.NL80211_CMD_DISCONNECT)
+
+# Fields of a station in the output of iw station dump
+station_fields = {
+    'rx bytes': 'rx_bytes', 'rx packets': 'rx_pkts', 'tx bytes': 'tx_bytes',
+    'tx packets': 'tx_pkts', 'tx failed': 'tx_failed',
+    'rx drop misc': 'rx_dropped', 'signal': 'signal'}
+
+rx_station_field = re.compile(
+    r'^\s*(rx bytes|rx packets|tx bytes|tx packets|tx failed|rx drop misc|'
+    r'signal):\s+(-?\d+)', re.MULTILINE)
+
+rx_station_rate = re.compile(
+    r'^\s*(rx|tx) bitrate:\s+([\d.]+)([^\n]*)', re.MULTILINE)
+
+# MCS anywhere in the flags of a bitrate, e.g. MCS 7 or VHT-MCS 9
+rx_station_mcs = re.compile(r'MCS (\d+)')
+
 
 def get_iw_link(iface):
     data = subprocess.check_output(['iw', 'dev', iface, 'link']).decode()
@@ -53,28 +85,125 @@ def get_iw_link(iface):
     return links
 
 
-def get_iw_station_dump(iface):
-    cmd = ['iw', 'dev', iface, 'station', 'dump']
-    data = subprocess.check_output(cmd).decode()
-    ddata = data.split('Station ')
+def parse_iw_station_dump(data):
+    """Parse the output of iw station dump into typed stations.
+
+    Returns:
+        list: Stations with the same fields and types as the stations of
+            genl.NL80211.get_stations, missing fields are None
+    """
     stations = list()
-    for dddata in ddata:
-        m = re_mac.match(dddata)
-        if m:
-            sta = dict()
-            sta['mac'] = m.group()
-            sta['rx_bytes'] = int(re.findall('rx bytes:\s+(\d+)', dddata)[0])
-            sta['rx_pkts'] = int(re.findall('rx packets:\s+(\d+)', dddata)[0])
-            sta['tx_bytes'] = int(re.findall('tx bytes:\s+(\d+)', dddata)[0])
-            sta['tx_pkts'] = int(re.findall('tx packets:\s+(\d+)', dddata)[0])
-            sta['tx_failed'] = int(re.findall('tx failed:\s+(\d+)', dddata)[0])
-            sta['rx_dropped'] =\
-                int(re.findall('rx drop misc:\s+(\d+)', dddata)[0])
-            sta['signal'] =\
-                int(re.findall('signal:\s+([\d.-]+)\s+dBm', dddata)[0])
-            sta['tx_bitrate'], sta['tx_mcs'] =\
-                re.findall('tx bitrate:\s+([\d.]*) .* MCS (\d+)', dddata)[0]
-            sta['rx_bitrate'], sta['rx_mcs'] =\
-                re.findall('rx bitrate:\s+([\d.]*) .* MCS (\d+)', dddata)[0]
-            stations.append(sta)
+    for block in data.split('Station ')[1:]:
+        m = re_mac.match(block)
+        if not m:
+            continue
+        sta = dict.fromkeys(genl.station_fields)
+        sta['mac'] = m.group().lower()
+        for m in rx_station_field.finditer(block):
+            sta[station_fields[m.group(1)]] = int(m.group(2))
+        for m in rx_station_rate.finditer(block):
+            sta[m.group(1) + '_bitrate'] = float(m.group(2))
+            mcs = rx_station_mcs.search(m.group(3))
+            if mcs is not None:
+                sta[m.group(1) + '_mcs'] = int(mcs.group(1))
+        stations.append(sta)
     return stations
+
+
+def get_iw_station_dump(iface):
+    cmd = ['iw', 'dev', iface, 'station', 'dump']
+    return parse_iw_station_dump(subprocess.check_output(cmd).decode())
+
+
+def get_station_dump(iface):
+    """Dump the stations of an interface.
+
+    The stations are requested on the shared nl80211 socket. If generic
+    netlink is not usable on this node, the output of iw is parsed instead
+    for this and all further calls.
+
+    Returns:
+        list: Stations as returned by genl.NL80211.get_stations
+    """
+    nl80211 = genl.find_nl80211()
+    if nl80211 is not None:
+        return nl80211.get_stations(iface)
+    return get_iw_station_dump(iface)
+
+
+class StationEvents(object):
+
+    """Wakes up a waiter when the stations of an interface change.
+
+    Joins the mlme multicast group of nl80211, so wait returns as soon as a
+    station of the interface was added or removed, or its link was
+    connected or disconnected. Without generic netlink, wait sleeps
+    instead, starting at station_poll_min and doubling up to
+    station_poll_max.
+
+    Create it before checking the condition to wait for, so no event in
+    between is lost::
+
+        with StationEvents(iface) as events:
+            while not condition():
+                events.wait(remaining)
+    """
+
+    def __init__(self, iface):
+        self._ifindex = None
+        self._events = None
+        self._interval = station_poll_min
+        nl80211 = genl.find_nl80211()
+        if nl80211 is not None:
+            try:
+                self._ifindex = socket.if_nametoindex(iface)
+                self._events = nl80211.subscribe('mlme')
+            except OSError as e:
+                logger.warning('Station events unavailable (%s), '
+                               'polling %s' % (e, iface))
+
+    def close(self):
+        if self._events is not None:
+            self._events.close()
+            self._events = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def wait(self, timeout):
+        """Wait for a change of the stations.
+
+        Args:
+            timeout (float): Seconds to wait at most, limited to
+                station_event_max with events and to the poll interval
+                without
+
+        Returns:
+            bool: True if an event of the interface arrived, False if the
+                wait ended without one
+        """
+        if self._events is None:
+            time.sleep(max(0, min(timeout, self._interval)))
+            self._interval = min(self._interval * 2, station_poll_max)
+            return False
+        deadline = time.monotonic() + min(timeout, station_event_max)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            for cmd, attrs in self._events.receive(remaining):
+                if cmd is None:
+                    return True
+                if cmd in station_event_cmds and \
+                        self._event_ifindex(attrs) == self._ifindex:
+                    return True
+
+    @staticmethod
+    def _event_ifindex(attrs):
+        for nla_type, payload in genl.nla_iter(attrs):
+            if nla_type == genl.NL80211_ATTR_IFINDEX:
+                return struct.unpack_from('=I', payload)[0]
+        return None
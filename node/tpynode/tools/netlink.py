@@ -23,18 +23,21 @@
 # Last Modified: 2018-10-31
 #
 
-import math
 import struct
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
 import logging
 import re
 import subprocess
 
+from . import genl
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 NLA_ATTR_BYTE_ALIGN = 4
 
+QCA_VENDOR_ID = 0x001374
+
 
 class NLParseError(Exception):
     """Error in NL Attribute Parser.
@@ -43,9 +46,66 @@ class NLParseError(Exception):
 
 
 def call_nl_vendor_cmd(nlcmd, request, policy, iface):
+    """Call a QCA vendor command of the driver.
+
+    The command is sent on the shared generic netlink socket. If generic
+    netlink is not usable on this node, iw is used instead for this and all
+    further calls.
+
+    Args:
+        nlcmd (str): Vendor subcommand, e.g. '0x8b'
+        request (dict): Attributes of the request
+        policy (dict): NLA Policy definition
+        iface (str): Name of the interface
+
+    Returns:
+        dict: Decoded response
+    """
     logger.info('Calling NL vendor command %s.' % nlcmd)
     nla_request = nl_encode(request, policy)
-    cmd2 = ['iw', 'dev', iface, 'vendor', 'recv', '0x001374', nlcmd, "-"]
+    nl80211 = genl.find_nl80211()
+    if nl80211 is not None:
+        nla_stream_bytes = nl80211.vendor_cmd(
+            iface, QCA_VENDOR_ID, int(nlcmd, 0), nla_request)
+        return _decode_vendor_response(nla_stream_bytes, policy)
+    return _call_nl_vendor_cmd_iw(nlcmd, nla_request, policy, iface)
+
+
+def call_nl_vendor_cmd_batch(nlcmd, requests, policy, iface):
+    """Call a QCA vendor command for every request of a list.
+
+    With generic netlink, the requests are pipelined instead of waiting for
+    every response before sending the next request.
+
+    Returns:
+        list: Decoded response of every request
+    """
+    logger.info('Calling NL vendor command %s %d times.' %
+                (nlcmd, len(requests)))
+    nla_requests = [nl_encode(request, policy) for request in requests]
+    nl80211 = genl.find_nl80211()
+    if nl80211 is not None:
+        responses = nl80211.vendor_cmd_batch(
+            iface, QCA_VENDOR_ID, int(nlcmd, 0), nla_requests)
+        return [_decode_vendor_response(response, policy)
+                for response in responses]
+    return [_call_nl_vendor_cmd_iw(nlcmd, nla_request, policy, iface)
+            for nla_request in nla_requests]
+
+
+def _decode_vendor_response(nla_stream_bytes, policy):
+    data = nl_decode(nla_stream_bytes, policy)
+    if 'QCA_ATTR_TSF' in data:
+        logger.debug('Receiving response with TSF: %s',
+                     data['QCA_ATTR_TSF']['value_raw'])
+    else:
+        logger.debug('Receiving no response')
+    return data
+
+
+def _call_nl_vendor_cmd_iw(nlcmd, nla_request, policy, iface):
+    cmd2 = ['iw', 'dev', iface, 'vendor', 'recv', '0x%06x' % QCA_VENDOR_ID,
+            nlcmd, "-"]
     logger.debug('Invoking %s' % ' '.join(cmd2))
     p = subprocess.Popen(cmd2,
                          stdin=subprocess.PIPE,
@@ -62,13 +122,7 @@ def call_nl_vendor_cmd(nlcmd, request, policy, iface):
         nla_stream_bytes = bytearray.fromhex(''.join(nla_stream_bytes))
 
         # Decode the stream
-        data = nl_decode(nla_stream_bytes, policy)
-        if 'QCA_ATTR_TSF' in data:
-            logger.debug('Receiving response with TSF: %s' %
-                         data['QCA_ATTR_TSF']['value_raw'])
-        else:
-            logger.debug('Receiving no response')
-        return data
+        return _decode_vendor_response(nla_stream_bytes, policy)
 
     except subprocess.TimeoutExpired as e:
         p.kill()
@@ -76,12 +130,111 @@ def call_nl_vendor_cmd(nlcmd, request, policy, iface):
         raise(e)
 
 
-def nl_decode(nla, policy):
+NLPolicyEntry = namedtuple('NLPolicyEntry', ['attr', 'data_type', 'value',
+                                             'encode', 'nested'])
+
+nla_hdr = struct.Struct('=HH')
+
+nla_value_structs = {
+    'NLA_U8': struct.Struct('=B'),
+    'NLA_U16': struct.Struct('=H'),
+    'NLA_U32': struct.Struct('=I'),
+    'NLA_U64': struct.Struct('=Q')}
+
+nla_attr_structs = {
+    data_type: struct.Struct('=HH' + value_struct.format[-1:])
+    for data_type, value_struct in nla_value_structs.items()}
+
+
+class NLPolicy(OrderedDict):
+
+    """NLA policy definition with lookup tables for the codec.
+
+    Behaves like the dict of the policy definition. Nested policies are
+    converted on construction. Matches of received attributes and the
+    structs of every entry are compiled on first use and kept until the
+    policy is modified.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._matches = dict()
+        self._entries = dict()
+        super(NLPolicy, self).__init__(*args, **kwargs)
+        for key, value in list(self.items()):
+            nested = value.get('nested')
+            if nested is not None and not isinstance(nested, NLPolicy):
+                value = value.copy()
+                value['nested'] = NLPolicy(nested)
+                OrderedDict.__setitem__(self, key, value)
+
+    def __setitem__(self, key, value):
+        OrderedDict.__setitem__(self, key, value)
+        self._matches = dict()
+        self._entries = dict()
+
+    def __delitem__(self, key):
+        OrderedDict.__delitem__(self, key)
+        self._matches = dict()
+        self._entries = dict()
+
+    def match(self, nla_type, nla_len):
+        """Key of the first entry matching a received attribute.
+
+        Args:
+            nla_type (int): Type of the attribute
+            nla_len (int): Length of the payload
+
+        Returns:
+            str: Key of the entry, None if no entry matches
+        """
+        try:
+            return self._matches[nla_type, nla_len]
+        except KeyError:
+            pass
+        for key, value in self.items():
+            if value.get('nla_type', nla_type) == nla_type and \
+                    value.get('nla_len', nla_len) == nla_len:
+                break
+        else:
+            key = None
+        self._matches[nla_type, nla_len] = key
+        return key
+
+    def entry(self, key):
+        """Compiled entry of the policy.
+
+        Returns:
+            NLPolicyEntry: The attribute template without nested policy,
+                its data type, the structs to unpack its value and to pack
+                the whole attribute, and the nested policy
+        """
+        try:
+            return self._entries[key]
+        except KeyError:
+            pass
+        value = self[key]
+        attr = value.copy()
+        attr.pop('nested', None)
+        data_type = value['data_type']
+        entry = NLPolicyEntry(attr, data_type,
+                              nla_value_structs.get(data_type),
+                              nla_attr_structs.get(data_type),
+                              value.get('nested'))
+        self._entries[key] = entry
+        return entry
+
+
+def nl_decode(nla, policy, start=0, end=None):
     """NL Decode.
 
+    Attributes are decoded in place, nested attributes without copying
+    their payload.
+
     Args:
         nla (bytearray): Coded NLA Stream
         policy (dict): NLA Policy definition
+        start (int, optional): Offset of the first attribute in nla
+        end (int, optional): Offset of the end of the stream in nla
 
     Returns:
         dict: Decoded NLA
@@ -90,84 +243,54 @@ def nl_decode(nla, policy):
         EnvironmentError: In case of implementation errors (don't be afraid)
 
     """
+    if not isinstance(policy, NLPolicy):
+        policy = NLPolicy(policy)
     nla_parsed = OrderedDict()
-    ptr = 0
+    ptr = start
+    if end is None:
+        end = len(nla)
+    unpack_hdr = nla_hdr.unpack_from
 
     # Iterate over nla to find all attributes
-    while ptr < len(nla):
+    while ptr < end:
 
         # Extract the current nla header
-        cur_hdr = struct.unpack_from('HH', nla, offset=ptr)
-        cur_attr_type = cur_hdr[1]
-        cur_attr_len = cur_hdr[0]
-        cur_attr_payload = nla[ptr + 4: ptr + cur_attr_len]
-
-        if not len(cur_attr_payload) == (cur_attr_len - 4):
+        cur_attr_len, cur_attr_type = unpack_hdr(nla, ptr)
+        if cur_attr_len < nla_hdr.size or ptr + cur_attr_len > end:
             raise EnvironmentError('Payload Length Check failed, \
                 this should not happen')
 
         # Detect Attribute Type
-        matched_policies =\
-            [key for key, value in policy.items()
-                if ('nla_type' not in value or
-                    value['nla_type'] == cur_attr_type) and
-                   ('nla_len' not in value or
-                    value['nla_len'] == cur_attr_len - 4)]
-
-        if not matched_policies:
+        cur_attr_key = policy.match(cur_attr_type, cur_attr_len - 4)
+
+        if cur_attr_key is None:
             print('Unmatched type found %d' % cur_attr_type)
 
         else:
-            cur_attr_key = matched_policies[0]
-            cur_attr = policy[cur_attr_key].copy()
-            cur_attr.pop('nested', None)
+            entry = policy.entry(cur_attr_key)
+            cur_attr = dict(entry.attr)
             cur_attr['nla_type'] = cur_attr_type
             cur_attr['nla_len'] = cur_attr_len - 4
 
             # Check the data type to encode according to policy
-            if cur_attr['data_type'] == 'NLA_U8':
-                cur_attr_value =\
-                    struct.unpack_from('B', nla, offset=(ptr + 4))[0]
-                cur_attr_value_raw = nla[ptr + 4: ptr + 5]
-                cur_attr_value_raw.reverse()
-                cur_attr_value_raw =\
-                    "".join("%02x" % b for b in cur_attr_value_raw)
-            elif cur_attr['data_type'] == 'NLA_U16':
-                cur_attr_value =\
-                    struct.unpack_from('H', nla, offset=(ptr + 4))[0]
-                cur_attr_value_raw = nla[ptr + 4: ptr + 6]
-                cur_attr_value_raw.reverse()
-                cur_attr_value_raw =\
-                    "".join("%02x" % b for b in cur_attr_value_raw)
-            elif cur_attr['data_type'] == 'NLA_U32':
-                cur_attr_value =\
-                    struct.unpack_from('I', nla, offset=(ptr + 4))[0]
-                cur_attr_value_raw = nla[ptr + 4: ptr + 8]
-                cur_attr_value_raw.reverse()
-                cur_attr_value_raw =\
-                    "".join("%02x" % b for b in cur_attr_value_raw)
-            elif cur_attr['data_type'] == 'NLA_U64':
-                cur_attr_value =\
-                    struct.unpack_from('Q', nla, offset=(ptr + 4))[0]
-                cur_attr_value_raw = nla[ptr + 4: ptr + 12]
-                cur_attr_value_raw.reverse()
-                cur_attr_value_raw =\
-                    "".join("%02x" % b for b in cur_attr_value_raw)
-            elif cur_attr['data_type'] == 'NLA_NESTED':
-                    cur_attr_value = nl_decode(
-                        cur_attr_payload, policy[cur_attr_key]['nested'])
-                    cur_attr_value_raw = None
+            if entry.value is not None:
+                value = entry.value.unpack_from(nla, ptr + 4)[0]
+                cur_attr['value'] = value
+                cur_attr['value_raw'] = '%0*x' % (2 * entry.value.size,
+                                                  value)
+            elif entry.data_type == 'NLA_NESTED':
+                cur_attr['value'] = nl_decode(nla, entry.nested, ptr + 4,
+                                              ptr + cur_attr_len)
+                cur_attr['value_raw'] = None
             else:
                 raise NLParseError('Unsupported Datatype detected')
 
             # Append current attr to list
-            cur_attr['value'] = cur_attr_value
-            cur_attr['value_raw'] = cur_attr_value_raw
             nla_parsed[cur_attr_key] = cur_attr
 
         # Set pointer to next attribute and align to 4 bytes
-        b = NLA_ATTR_BYTE_ALIGN
-        ptr = ptr + b * math.ceil(cur_attr_len / b)
+        ptr += (cur_attr_len + NLA_ATTR_BYTE_ALIGN - 1) & \
+            -NLA_ATTR_BYTE_ALIGN
 
     return nla_parsed
 
@@ -175,72 +298,91 @@ def nl_decode(nla, policy):
 def nl_encode(dataset, policy):
     """NL Encode.
 
-    Converts a nla_data to NetLink Attribute Stream according to policy
+    Converts a nla_data to NetLink Attribute Stream according to policy.
+    The size of the stream is determined first, so all attributes are
+    packed into a single buffer.
+    """
+    if not isinstance(policy, NLPolicy):
+        policy = NLPolicy(policy)
+    plan, size = _nl_encode_plan(dataset, policy)
+    nla_stream = bytearray(size)
+    _nl_encode_into(nla_stream, 0, plan)
+    return nla_stream
+
+
+def _nl_align(length):
+    return (length + NLA_ATTR_BYTE_ALIGN - 1) & -NLA_ATTR_BYTE_ALIGN
+
+
+def _nl_encode_plan(dataset, policy):
+    """Resolve the attributes of a dataset against the policy.
+
+    Returns:
+        tuple: One tuple of struct, type, length and value per attribute,
+            and the size of the encoded stream
     """
-    nla_stream = bytearray()
+    plan = list()
+    size = 0
 
     # Iterate over all elements in nla_struct
     for cur_key, cur_val in dataset.items():
 
         try:
 
-            if not (type(cur_val) is dict or type(cur_val) is OrderedDict):
-                cur_val = {'value': cur_val}
-
             # Check for matching policy
-            mpolicies =\
-                [pol_val for pol_key, pol_val in policy.items() if
-                    (pol_key == cur_key) and
-                    ('nla_type' not in pol_val or 'nla_type' not in cur_val or
-                     cur_val['nla_type'] == pol_val['nla_type']) and
-                    ('nla_len' not in pol_val or 'nla_len' not in cur_val or
-                     cur_val['nla_len'] == pol_val['nla_len'])]
-
-            exp_attr = mpolicies[0].copy()
-            exp_attr.update(cur_val)
+            entry = policy.entry(cur_key)
+            attr = entry.attr
+
+            if not isinstance(cur_val, dict):
+                if entry.encode is not None:
+                    # Plain value of a scalar attribute
+                    plan.append((entry.encode, attr['nla_type'],
+                                 attr['nla_len'], cur_val))
+                    size += _nl_align(attr['nla_len'] + 4)
+                    continue
+                cur_val = {'value': cur_val}
+            for field in ('nla_type', 'nla_len'):
+                if field in attr and field in cur_val and \
+                        cur_val[field] != attr[field]:
+                    raise KeyError(field)
+            nla_type = cur_val.get('nla_type', attr.get('nla_type'))
+            nla_len = cur_val.get('nla_len', attr.get('nla_len'))
+            data_type = cur_val.get('data_type', entry.data_type)
 
             # TODO: Check for all variables available
 
-            if exp_attr['data_type'] == 'NLA_U8':
-                attr_enc =\
-                    struct.pack('HHB', exp_attr['nla_len'] + 4,
-                                exp_attr['nla_type'], exp_attr['value'])
-            elif exp_attr['data_type'] == 'NLA_U16':
-                attr_enc =\
-                    struct.pack('HHH', exp_attr['nla_len'] + 4,
-                                exp_attr['nla_type'], exp_attr['value'])
-            elif exp_attr['data_type'] == 'NLA_U32':
-                attr_enc =\
-                    struct.pack('HHI', exp_attr['nla_len'] + 4,
-                                exp_attr['nla_type'], exp_attr['value'])
-            elif exp_attr['data_type'] == 'NLA_U64':
-                attr_enc =\
-                    struct.pack('HHQ', exp_attr['nla_len'] + 4,
-                                exp_attr['nla_type'], exp_attr['value'])
-            elif exp_attr['data_type'] == 'NLA_NESTED':
-                payload = nl_encode(cur_val, mpolicies[0]['nested'])
-                attr_enc =\
-                    struct.pack('HH', len(payload) + 4,
-                                exp_attr['nla_type'])
-                attr_enc = attr_enc + payload
-            elif exp_attr['data_type'] == 'NLA_UNSPEC':
-                attr_enc =\
-                    struct.pack('HH', exp_attr['nla_len'] + 4,
-                                exp_attr['nla_type'])
-                enc_payload = bytearray(exp_attr['value'].to_bytes(
-                    exp_attr['nla_len'], byteorder='little', signed=False))
-                attr_enc = attr_enc + enc_payload
+            if data_type == entry.data_type and entry.encode is not None:
+                attr_struct, value = entry.encode, cur_val['value']
+            elif data_type in nla_attr_structs:
+                attr_struct, value = nla_attr_structs[data_type], \
+                    cur_val['value']
+            elif data_type == 'NLA_NESTED':
+                value, nla_len = _nl_encode_plan(cur_val, entry.nested)
+                attr_struct = None
+            elif data_type == 'NLA_UNSPEC':
+                attr_struct = None
+                value = cur_val['value'].to_bytes(
+                    nla_len, byteorder='little', signed=False)
             else:
                 raise EnvironmentError('Unsupported Data-type detected')
 
-            # Add padding
-            b = NLA_ATTR_BYTE_ALIGN
-            numpad = math.ceil(len(attr_enc) / b) * b - len(attr_enc)
-            attr_enc = bytearray(attr_enc) + bytearray(numpad)
-
-            nla_stream = nla_stream + attr_enc
-
         except Exception:
             raise Exception('Error parsing attribute %s' % cur_key)
 
-    return nla_stream
+        plan.append((attr_struct, nla_type, nla_len, value))
+        size += _nl_align(nla_len + 4)
+
+    return plan, size
+
+
+def _nl_encode_into(buf, offset, plan):
+    for attr_struct, nla_type, nla_len, value in plan:
+        if attr_struct is not None:
+            attr_struct.pack_into(buf, offset, nla_len + 4, nla_type, value)
+        else:
+            nla_hdr.pack_into(buf, offset, nla_len + 4, nla_type)
+            if isinstance(value, list):
+                _nl_encode_into(buf, offset + 4, value)
+            else:
+                buf[offset + 4:offset + 4 + nla_len] = value
+        offset += _nl_align(nla_len + 4)
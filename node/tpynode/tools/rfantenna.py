@@ -24,9 +24,12 @@
 #
 
 import json
-import pkg_resources
+import os
+import struct
+import threading
 import time
 import logging
+import zlib
 from collections import OrderedDict
 
 from .netlink import *
@@ -73,10 +76,19 @@ def mac_addr_to_int(addr):
     return int.from_bytes(mac, 'little')
 
 
+rf_policy_file = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              '..', 'data', 'wil_rf_sector_policy.json')
+
+_rf_default_nl_attr_policy = None
+
+
 def get_rf_default_nl_attr_policy():
-    policy = pkg_resources.resource_string(
-        __name__, '../data/wil_rf_sector_policy.json')
-    return json.loads(policy.decode())
+    """Compiled RF sector policy, loaded on first use."""
+    global _rf_default_nl_attr_policy
+    if _rf_default_nl_attr_policy is None:
+        with open(rf_policy_file) as f:
+            _rf_default_nl_attr_policy = NLPolicy(json.load(f))
+    return _rf_default_nl_attr_policy
 
 
 class rfantenna(object):
@@ -91,8 +103,6 @@ class rfantenna(object):
     QCA_VENDOR_SUBCMD_DMG_RF_GET_SELECTED_SECTOR = "0x8d"
     QCA_VENDOR_SUBCMD_DMG_RF_SET_SELECTED_SECTOR = "0x8e"
 
-    _nl_policy = get_rf_default_nl_attr_policy()
-
     def __init__(self):
         pass
 
@@ -112,8 +122,8 @@ class rfantenna(object):
 
         # Call the vendor command
         vendor_cmd = cls.QCA_VENDOR_SUBCMD_DMG_RF_GET_SELECTED_SECTOR
-        response = call_nl_vendor_cmd(vendor_cmd, request, cls._nl_policy,
-                                      iface)
+        response = call_nl_vendor_cmd(vendor_cmd, request,
+                                      get_rf_default_nl_attr_policy(), iface)
 
         toc = time.time() - tic
         logger.debug('get rf selected sector completed in %.2f seconds'
@@ -136,7 +146,8 @@ class rfantenna(object):
 
         # Call the vendor command
         vendor_cmd = cls.QCA_VENDOR_SUBCMD_DMG_RF_SET_SELECTED_SECTOR
-        call_nl_vendor_cmd(vendor_cmd, request, cls._nl_policy, iface)
+        call_nl_vendor_cmd(vendor_cmd, request,
+                           get_rf_default_nl_attr_policy(), iface)
 
     @classmethod
     def get_sector_config(cls, iface, sector_type, sector_index):
@@ -148,55 +159,94 @@ class rfantenna(object):
         logger.debug('get rf sector config')
         tic = time.time()
 
-        # Create the request
+        # Call the vendor cmd
+        vendor_cmd = cls.QCA_VENDOR_SUBCMD_DMG_RF_GET_SECTOR_CFG
+        response = call_nl_vendor_cmd(
+            vendor_cmd, cls._get_sector_config_request(sector_type,
+                                                        sector_index),
+            get_rf_default_nl_attr_policy(), iface)
+
+        toc = time.time() - tic
+        logger.debug('get rf sector config completed in %.2f seconds'
+                     % toc)
+        return cls._extract_sector_config(response)
+
+    @classmethod
+    def get_sector_configs(cls, iface, sector_type, sector_indices):
+        """Get the configs of several sectors in one pass.
+
+        Returns:
+            list: Raw config tuple of every sector, as get_sector_config
+
+        Raises:
+            Exception: If the driver returned no config for any of the
+                sectors
+        """
+        logger.debug('get rf sector configs')
+        tic = time.time()
+
+        sector_indices = list(sector_indices)
+        vendor_cmd = cls.QCA_VENDOR_SUBCMD_DMG_RF_GET_SECTOR_CFG
+        responses = call_nl_vendor_cmd_batch(
+            vendor_cmd, [cls._get_sector_config_request(sector_type, index)
+                         for index in sector_indices],
+            get_rf_default_nl_attr_policy(), iface)
+
+        missing = [index for index, r in zip(sector_indices, responses)
+                   if not cls._has_sector_config(r)]
+        missing.extend(sector_indices[len(responses):])
+        if missing:
+            raise Exception('No config returned for sectors %s' %
+                            ', '.join(str(index) for index in missing))
+
+        toc = time.time() - tic
+        logger.debug('get %d rf sector configs completed in %.2f seconds'
+                     % (len(responses), toc))
+        return [cls._extract_sector_config(r) for r in responses]
+
+    @staticmethod
+    def _has_sector_config(response):
+        cfg = response.get('QCA_ATTR_DMG_RF_SECTOR_CFG')
+        return cfg is not None and \
+            'QCA_ATTR_DMG_RF_SECTOR_CFG_MODULE_0' in cfg['value']
+
+    @classmethod
+    def _get_sector_config_request(cls, sector_type, sector_index):
         request = OrderedDict()
         request['QCA_ATTR_DMG_RF_SECTOR_INDEX'] = sector_index
         request['QCA_ATTR_DMG_RF_SECTOR_TYPE'] = sector_type
         request['QCA_ATTR_DMG_RF_MODULE_MASK'] = 0x01
+        return request
 
-        # Call the vendor cmd
-        vendor_cmd = cls.QCA_VENDOR_SUBCMD_DMG_RF_GET_SECTOR_CFG
-        response = call_nl_vendor_cmd(vendor_cmd, request, cls._nl_policy,
-                                      iface)
-
+    @classmethod
+    def _extract_sector_config(cls, response):
         # Shorten the results
         shortresp = response['QCA_ATTR_DMG_RF_SECTOR_CFG']['value']
         shortresp = shortresp['QCA_ATTR_DMG_RF_SECTOR_CFG_MODULE_0']['value']
 
-        # results = OrderedDict()
         try:
-            # results['QCA_ATTR_DMG_RF_SECTOR_CFG_MODULE_INDEX'] =\
-            #     shortresp['QCA_ATTR_DMG_RF_SECTOR_CFG_MODULE_INDEX']['value']
-            # results['etype0'] =\
             etype0 = int(
                 shortresp['QCA_ATTR_DMG_RF_SECTOR_CFG_ETYPE0']['value_raw'],
                 16)
-            # results['etype1'] =\
             etype1 = int(
                 shortresp['QCA_ATTR_DMG_RF_SECTOR_CFG_ETYPE1']['value_raw'],
                 16)
-            # results['etype2'] =\
             etype2 = int(
                 shortresp['QCA_ATTR_DMG_RF_SECTOR_CFG_ETYPE2']['value_raw'],
                 16)
-            # results['psh_hi'] =\
             psh_hi = int(
                 shortresp['QCA_ATTR_DMG_RF_SECTOR_CFG_PSH_HI']['value_raw'],
                 16)
-            # results['psh_lo'] =\
             psh_lo = int(
                 shortresp['QCA_ATTR_DMG_RF_SECTOR_CFG_PSH_LO']['value_raw'],
                 16)
-            # results['dtype_x16'] =\
             dtype_x16 = int(
                 shortresp['QCA_ATTR_DMG_RF_SECTOR_CFG_DTYPE_X16']['value_raw'],
                 16)
         except KeyError:
             print('Key error in get_vendor_sector_cfg, aborting')
+            raise
 
-        toc = time.time() - tic
-        logger.debug('get rf sector config completed in %.2f seconds'
-                     % toc)
         return (psh_hi, psh_lo, etype0, etype1, etype2, dtype_x16)
 
     @classmethod
@@ -207,6 +257,31 @@ class rfantenna(object):
         Provides access to low level API
         """
 
+        # Call the vendor cmd
+        vendor_cmd = cls.QCA_VENDOR_SUBCMD_DMG_RF_SET_SECTOR_CFG
+        call_nl_vendor_cmd(
+            vendor_cmd, cls._set_sector_config_request(
+                sector_type, sector_index, psh_hi, psh_lo, etype0, etype1,
+                etype2, dtype_x16),
+            get_rf_default_nl_attr_policy(), iface)
+
+    @classmethod
+    def set_sector_configs(cls, iface, sector_type, configs):
+        """Set the configs of several sectors in one pass.
+
+        Args:
+            configs (dict): Raw config tuple by sector index
+        """
+        vendor_cmd = cls.QCA_VENDOR_SUBCMD_DMG_RF_SET_SECTOR_CFG
+        call_nl_vendor_cmd_batch(
+            vendor_cmd, [cls._set_sector_config_request(sector_type, index,
+                                                         *cfg)
+                         for index, cfg in configs.items()],
+            get_rf_default_nl_attr_policy(), iface)
+
+    @classmethod
+    def _set_sector_config_request(cls, sector_type, sector_index, psh_hi,
+                                   psh_lo, etype0, etype1, etype2, dtype_x16):
         # Create the request
         request = OrderedDict()
         request['QCA_ATTR_DMG_RF_SECTOR_INDEX'] = sector_index
@@ -225,13 +300,8 @@ class rfantenna(object):
         cfg_module_request['QCA_ATTR_DMG_RF_SECTOR_CFG_MODULE_0'] = \
             cfg_request
 
-        request['QCA_ATTR_DMG_RF_SECTOR_CFG'] = OrderedDict()
-        request['QCA_ATTR_DMG_RF_SECTOR_CFG'] =\
-            cfg_module_request
-
-        # Call the vendor cmd
-        vendor_cmd = cls.QCA_VENDOR_SUBCMD_DMG_RF_SET_SECTOR_CFG
-        call_nl_vendor_cmd(vendor_cmd, request, cls._nl_policy, iface)
+        request['QCA_ATTR_DMG_RF_SECTOR_CFG'] = cfg_module_request
+        return request
 
     @classmethod
     def extract_psh(cls, psh_hi, psh_lo):
@@ -330,6 +400,73 @@ class rfantenna(object):
 
         return dt_x16
 
+    @classmethod
+    def encode_sector_configs(cls, psh, etype, dtype, x16):
+        """Encode many sector configs at once.
+
+        Bit-exact bulk variant of encode_sector_config, requires numpy.
+
+        Args:
+            psh (array_like): N x 32 PSH values
+            etype (array_like): N x 32 ETYPE values
+            dtype (array_like): N x 8 DTYPE values
+            x16 (array_like): N X16 values
+
+        Returns:
+            numpy.ndarray: N x 6 raw words of every sector in the order
+                psh_hi, psh_lo, etype0, etype1, etype2, dtype_x16
+        """
+        import numpy as np
+        psh = np.asarray(psh, dtype=np.int64)
+        etype = np.asarray(etype, dtype=np.int64)
+        dtype = np.asarray(dtype, dtype=np.int64)
+        x16 = np.asarray(x16, dtype=np.int64)
+        if psh.shape[-1:] != (32,) or etype.shape[-1:] != (32,):
+            raise AttributeError('Values should be N x 32 matrices')
+        if dtype.shape[-1:] != (8,):
+            raise AttributeError('DType Value should be N x 8 matrix')
+
+        # Fields of a word occupy distinct bits, so their sum is their union.
+        # PSH 16 to 31 go to psh_hi at the positions of PSH 0 to 15.
+        psh_bits = (psh & 0x3) << (2 * (np.arange(32) % 16))
+        raw = np.empty(psh.shape[:-1] + (6,), dtype=np.uint32)
+        raw[..., 0] = psh_bits[..., 16:].sum(axis=-1)
+        raw[..., 1] = psh_bits[..., :16].sum(axis=-1)
+        for b in range(3):
+            raw[..., 2 + b] = (((etype >> b) & 1) << np.arange(32)).sum(
+                axis=-1)
+        raw[..., 5] = ((x16 & 0xff) << 24) + \
+            ((dtype & 0x7) << (3 * np.arange(8))).sum(axis=-1)
+        return raw
+
+    @classmethod
+    def decode_sector_configs(cls, raw):
+        """Decode many sector configs at once.
+
+        Bit-exact bulk variant of decode_sector_config, requires numpy.
+
+        Args:
+            raw (array_like): N x 6 raw words as returned by
+                encode_sector_configs
+
+        Returns:
+            dict: psh and etype as N x 32, dtype as N x 8 and x16 as N
+                matrices
+        """
+        import numpy as np
+        raw = np.asarray(raw, dtype=np.int64)
+        if raw.shape[-1:] != (6,):
+            raise AttributeError('Raw values should be N x 6 matrix')
+        words = raw[..., :, np.newaxis]
+        psh = np.concatenate(((words[..., 1, :] >> (2 * np.arange(16))) & 0x3,
+                              (words[..., 0, :] >> (2 * np.arange(16))) & 0x3),
+                             axis=-1)
+        etype = sum(((words[..., 2 + b, :] >> np.arange(32)) & 1) << b
+                    for b in range(3))
+        dtype = (words[..., 5, :] >> (3 * np.arange(8))) & 0x7
+        x16 = (raw[..., 5] >> 24) & 0xff
+        return {'psh': psh, 'etype': etype, 'dtype': dtype, 'x16': x16}
+
     @classmethod
     def decode_sector_config(cls, psh_hi, psh_lo, etype0, etype1, etype2,
                              dtype_x16):
@@ -344,3 +481,200 @@ class rfantenna(object):
         etype0, etype1, etype2 = cls.pack_etype(cfg['etype'])
         dt_x16 = cls.pack_dtype_x16(cfg['dtype'], cfg['x16'])
         return (psh_hi, psh_lo, etype0, etype1, etype2, dt_x16)
+
+
+class SectorCodebook(object):
+
+    """Cache of the raw sector configs of one sector type.
+
+    The cache is filled in bulk and updated by the set operations, so the
+    codebook only has to be read from the driver once. The version counts
+    the changes of the codebook, clients can compare it to a version they
+    fetched before to skip fetching the codebook again.
+
+    Args:
+        sector_type (int): RF_SECTOR_TYPE_TX or RF_SECTOR_TYPE_RX
+    """
+
+    def __init__(self, sector_type):
+        self.sector_type = sector_type
+        self.version = 0
+        self._configs = dict()
+        self._epoch = None
+        self._lock = threading.RLock()
+
+    def check_epoch(self, epoch):
+        """Drop the cache whenever epoch changed since the last check.
+
+        Args:
+            epoch: Value that changes whenever the firmware restored its
+                default codebook, e.g. the recovery count. Ignored if None.
+        """
+        if epoch is None:
+            return
+        with self._lock:
+            if self._epoch is not None and epoch != self._epoch:
+                self.invalidate()
+            self._epoch = epoch
+
+    def invalidate(self, sectors=None):
+        """Drop the cached configs of sectors, of all sectors if None."""
+        with self._lock:
+            if sectors is None:
+                self._configs = dict()
+            else:
+                for sector in sectors:
+                    self._configs.pop(sector, None)
+            self.version += 1
+
+    def get(self, iface, sectors):
+        """Raw configs of the sectors, fetching all uncached ones at once.
+
+        Returns:
+            list: Raw config tuple of every sector
+
+        Raises:
+            Exception: If the driver did not return the config of every
+                uncached sector, nothing of the batch is cached then
+        """
+        with self._lock:
+            missing = [s for s in sectors if s not in self._configs]
+            if missing:
+                configs = rfantenna.get_sector_configs(
+                    iface, self.sector_type, missing)
+                if len(configs) != len(missing):
+                    raise Exception(
+                        'Got %d of %d sector configs, missing sectors %s' %
+                        (len(configs), len(missing),
+                         ', '.join(str(s) for s in missing[len(configs):])))
+                self._configs.update(zip(missing, configs))
+            return [self._configs[s] for s in sectors]
+
+    def set(self, iface, configs):
+        """Write raw configs and update the cache accordingly.
+
+        Args:
+            configs (dict): Raw config tuple by sector index
+        """
+        configs = {sector: tuple(cfg) for sector, cfg in configs.items()}
+        if not configs:
+            return
+        with self._lock:
+            try:
+                rfantenna.set_sector_configs(iface, self.sector_type, configs)
+            except Exception:
+                # Some of the sectors might have been written
+                self.invalidate(configs)
+                raise
+            self._configs.update(configs)
+            self.version += 1
+
+    def update(self, iface, configs, verify=False):
+        """Write only the sectors whose config differs from the current one.
+
+        The current configs are taken from the cache, uncached sectors are
+        read from the driver first.
+
+        Args:
+            configs (dict): Raw config tuple by sector index
+            verify (bool): Read back the written sectors from the driver
+
+        Returns:
+            dict: Number of sectors written and skipped, and the indices of
+                written sectors that read back differently if verified
+        """
+        configs = {sector: tuple(cfg) for sector, cfg in configs.items()}
+        with self._lock:
+            sectors = list(configs)
+            current = dict(zip(sectors, self.get(iface, sectors)))
+            changed = {sector: cfg for sector, cfg in configs.items()
+                       if current[sector] != cfg}
+            self.set(iface, changed)
+            result = {'written': len(changed),
+                      'skipped': len(configs) - len(changed)}
+            if verify:
+                result['mismatched'] = list()
+            if verify and changed:
+                self.invalidate(changed)
+                readback = self.get(iface, list(changed))
+                result['mismatched'] = [
+                    sector for sector, cfg in zip(changed, readback)
+                    if cfg != changed[sector]]
+            return result
+
+
+# A codebook snapshot holds a header with the identity of the node it was
+# taken on, one record per sector with its raw config, and the CRC32 of all
+snapshot_magic = b'TPCB'
+snapshot_version = 2
+snapshot_prefix = struct.Struct('<4sH')
+snapshot_headers = {1: struct.Struct('<4sHH'),
+                    2: struct.Struct('<4sHHI16s')}
+snapshot_header = snapshot_headers[snapshot_version]
+snapshot_record = struct.Struct('<BB6I')
+snapshot_crc = struct.Struct('<I')
+
+
+def pack_codebook_snapshot(configs, identity):
+    """Serialize raw sector configs into a snapshot.
+
+    Args:
+        configs (dict): Raw config tuple by sector type and index
+        identity (dict): hw_version and fw_version of the node the configs
+            were read from
+
+    Returns:
+        bytes: The snapshot
+    """
+    buf = bytearray(snapshot_header.size +
+                    len(configs) * snapshot_record.size + snapshot_crc.size)
+    snapshot_header.pack_into(buf, 0, snapshot_magic, snapshot_version,
+                              len(configs), identity['hw_version'],
+                              identity['fw_version'].encode('ascii'))
+    offset = snapshot_header.size
+    for (sector_type, sector), cfg in sorted(configs.items()):
+        snapshot_record.pack_into(buf, offset, sector_type, sector, *cfg)
+        offset += snapshot_record.size
+    snapshot_crc.pack_into(buf, offset, zlib.crc32(buf[:offset]) & 0xffffffff)
+    return bytes(buf)
+
+
+def unpack_codebook_snapshot(data):
+    """Deserialize a snapshot created by pack_codebook_snapshot.
+
+    Returns:
+        tuple: Identity of the node the snapshot was taken on, None for
+            snapshots of version 1, and the raw config tuple by sector
+            type and index
+
+    Raises:
+        ValueError: If data is no valid snapshot
+    """
+    if len(data) < snapshot_prefix.size:
+        raise ValueError('Snapshot too short')
+    magic, version = snapshot_prefix.unpack_from(data)
+    header = snapshot_headers.get(version)
+    if magic != snapshot_magic:
+        raise ValueError('Not a codebook snapshot')
+    if header is None:
+        raise ValueError('Unsupported codebook snapshot version %d'
+                         % version)
+    if len(data) < header.size + snapshot_crc.size:
+        raise ValueError('Snapshot too short')
+    fields = header.unpack_from(data)
+    count = fields[2]
+    identity = None
+    if version >= 2:
+        identity = {'hw_version': fields[3],
+                    'fw_version': fields[4].rstrip(b'\0').decode('ascii')}
+    end = header.size + count * snapshot_record.size
+    if len(data) != end + snapshot_crc.size:
+        raise ValueError('Snapshot size does not match its %d sectors'
+                         % count)
+    if snapshot_crc.unpack_from(data, end)[0] != \
+            zlib.crc32(data[:end]) & 0xffffffff:
+        raise ValueError('Snapshot checksum mismatch')
+    configs = dict()
+    for record in snapshot_record.iter_unpack(data[header.size:end]):
+        configs[record[0], record[1]] = record[2:]
+    return identity, configs
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#          ###########   ###########   ##########    ##########
+#         ############  ############  ############  ############
+#         ##            ##            ##   ##   ##  ##        ##
+#         ##            ##            ##   ##   ##  ##        ##
+#         ###########   ####  ######  ##   ##   ##  ##    ######
+#          ###########  ####  #       ##   ##   ##  ##    #    #
+#                   ##  ##    ######  ##   ##   ##  ##    #    #
+#                   ##  ##    #       ##   ##   ##  ##    #    #
+#         ############  ##### ######  ##   ##   ##  ##### ######
+#         ###########    ###########  ##   ##   ##   ##########
+#
+#            S E C U R E   M O B I L E   N E T W O R K I N G
+#
+# Author:        Daniel Steinmetzer
+# E-Mail:        dsteinmetzer@seemoo.tu-darmstadt.de
+# Website:       https://www.seemoo.de/dsteinmetzer
+# Project:       TPY - The Testbed Experimentation Framework
+# File:          wil6210.py
+# Date:          2026-10-19
+#
+
+"""Parsers for the debugfs entries of the wil6210 driver.
+
+Every record is extracted with a single precompiled pattern, and all fields
+are converted to their natural types.
+"""
+
+import itertools
+import logging
+import re
+import struct
+import threading
+import time
+from collections import deque, namedtuple
+
+logger = logging.getLogger(__name__)
+
+
+def hex_int(value):
+    return int(value, 16)
+
+
+rx_bf = re.compile(
+    r'CID\s*(\d+)\s*\{\s*'
+    r'TSF\s+=\s+(0x[0-9a-fA-F]+)\s+'
+    r'TxMCS\s+=\s+(\d+)\s+TxTpt\s+=\s+(\d+)\s+'
+    r'SQI\s+=\s+(\d+)\s+'
+    r'(?:RSSI\s+=\s+(-?\d+)\s+)?'
+    r'Status\s+=\s+(0x[0-9a-fA-F]+)\s(\w+)\s+'
+    r'Sectors[^\n]*?my\s+(\d+):\s*(\d+)\s+peer\s+(\d+):\s*(\d+)\s+'
+    r'Goodput\(rx:tx\)\s+(\d+):\s*(\d+)')
+
+bf_fields = (
+    ('cid', int), ('tsf', hex_int), ('tx_mcs', int), ('tx_tpt', int),
+    ('sqi', int), ('rssi', int), ('status_code', hex_int), ('status', str),
+    ('rx_sector', int), ('tx_sector', int), ('rx_sector_peer', int),
+    ('tx_sector_peer', int), ('rx_goodput', int), ('tx_goodput', int))
+
+rx_sweep = re.compile(
+    r'\[\s*(\d+)[^\n]*?src:\s+([0-9a-fA-F:]{17})[^\n]*?sec:\s+(\d+)'
+    r'[^\n]*?cdown:\s+(\d+)[^\n]*?dir:\s+(\d)[^\n]*?'
+    r'snr:\s+(-?\d+.\d+)\sdB[^\n]*?\((0x[0-9a-fA-F:]+)\)')
+
+sweep_src_none = '00:00:00:00:00:00'
+
+rx_sweep_header = re.compile(r'Counter:\s+(\d+)\s+swps,\s+Pos:\s+(\d+)')
+
+rx_recovery = re.compile(r'(mode|state)\s+=\s+(\S+)')
+
+rx_temp = re.compile(r'(T_mac|T_radio)\s+=\s+(\d+.\d+)')
+
+temp_keys = {'T_mac': 'mac', 'T_radio': 'radio'}
+
+# One descriptor of a mailbox ring, followed by the header of the message
+# and its hexdump, if the descriptor points to a valid message
+rx_mbox_entry = re.compile(
+    r'^ *\[ *([0-9a-fA-F]+)\] ([FE]) ([t ])[h ] 0x[0-9a-fA-F]{8}'
+    r'(?: -> ([0-9a-fA-F]{4}) ([0-9a-fA-F]{4}) [0-9a-fA-F]{4} [0-9a-fA-F]{2}'
+    r'\n((?: +: [^\n]*\n?)*))?', re.MULTILINE)
+
+mbox_ring_rx = 'ring rx = '
+
+# struct wmi_cmd_hdr preceding every WMI command and event
+wmi_hdr = struct.Struct('<BBHI')
+
+WMIEvent = namedtuple('WMIEvent', ['seq', 'id', 'data'])
+
+# Mailbox sequence numbers are 16 bit and wrap around
+mbox_seq_mod = 0x10000
+
+
+def mbox_seq_newer(seq, ref):
+    """Whether mailbox sequence number seq was assigned after ref."""
+    return 0 < (seq - ref) % mbox_seq_mod < mbox_seq_mod // 2
+
+
+def parse_records(rx, fields, data):
+    """Parse all records matching rx into dicts of typed fields."""
+    records = list()
+    for m in rx.finditer(data):
+        records.append({name: None if value is None else conv(value)
+                        for (name, conv), value in zip(fields, m.groups())})
+    return records
+
+
+def parse_bf(data):
+    """Parse the wil6210/bf entry, one record per connection."""
+    return parse_records(rx_bf, bf_fields, data)
+
+
+def parse_sweep_dump(data):
+    """Parse the wil6210/sweep_dump entry, skipping unused ring entries."""
+    return [{'id': int(sid), 'src': src, 'sec': int(sec),
+             'cdown': int(cdown), 'initiator': direction == '0',
+             'snr': float(snr), 'snr_raw': snr_raw}
+            for sid, src, sec, cdown, direction, snr, snr_raw
+            in rx_sweep.findall(data) if src != sweep_src_none]
+
+
+def parse_sweep_header(data):
+    """Parse the total sweep counter and ring position of wil6210/sweep_dump.
+
+    Returns:
+        tuple: counter and pos, None if the entry has no header
+    """
+    m = rx_sweep_header.search(data)
+    if m is None:
+        return None
+    return int(m.group(1)), int(m.group(2))
+
+
+def parse_recovery(data):
+    """Parse the wil6210/recovery entry."""
+    # The first occurrence of each key takes precedence
+    found = dict(reversed(rx_recovery.findall(data)))
+    return {'mode': found.get('mode', 'unknown'),
+            'state': found.get('state', 'unknown')}
+
+
+def parse_temp(data):
+    """Parse the wil6210/temp entry into degrees celsius."""
+    temp = {'mac': 0.0, 'radio': 0.0}
+    for key, value in reversed(rx_temp.findall(data)):
+        temp[temp_keys[key]] = float(value)
+    return temp
+
+
+def decode_mbox_entry(m):
+    """Decode the message of a mailbox ring entry into a WMIEvent."""
+    msg = bytes.fromhex(''.join(m.group(6).split()).replace(':', ''))
+    msg = msg[:int(m.group(5), 16)]
+    return WMIEvent(int(m.group(4), 16), wmi_hdr.unpack_from(msg)[2],
+                    msg[wmi_hdr.size:])
+
+
+def parse_mbox_ring(data, pos=0, endpos=None):
+    """Decode all messages of a mailbox ring."""
+    if endpos is None:
+        endpos = len(data)
+    return [decode_mbox_entry(m)
+            for m in rx_mbox_entry.finditer(data, pos, endpos)
+            if m.group(6)]
+
+
+def parse_mbox(data):
+    """Parse both rings of the wil6210/mbox entry."""
+    split = data.find(mbox_ring_rx)
+    if split < 0:
+        split = len(data)
+    return {'ring_tx': parse_mbox_ring(data, 0, split),
+            'ring_rx': parse_mbox_ring(data, split)}
+
+
+class MailboxReader(object):
+
+    """Reads the RX ring of wil6210/mbox incrementally.
+
+    The driver consumes events at the tail of the RX ring, but leaves their
+    content in place. The reader remembers the tail from the previous read
+    and only decodes the entries the driver consumed since then. Slots at
+    and after the tail may already be rewritten by the firmware, so they
+    are never compared; a full wrap of the ring is detected by the sequence
+    number of the last consumed slot instead.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._tail = None
+        self._last = None
+        self._size = None
+
+    @property
+    def primed(self):
+        return self._tail is not None
+
+    @property
+    def last_seq(self):
+        """Sequence number of the last event consumed by the driver, None
+        if unknown."""
+        if self._last is None:
+            return None
+        return int(self._last, 16)
+
+    def read(self, data):
+        """Return the events received since the previous read.
+
+        The first read after construction or reset only records the state
+        of the ring and returns no events.
+
+        Args:
+            data (str): Content of wil6210/mbox
+
+        Returns:
+            list: New WMIEvent records in the order of reception
+        """
+        pos = data.find(mbox_ring_rx)
+        if pos < 0:
+            return list()
+        entries = list(rx_mbox_entry.finditer(data, pos))
+        if not entries:
+            return list()
+        tail = 0
+        for i, m in enumerate(entries):
+            if m.group(3) == 't':
+                tail = i
+                break
+        n = len(entries)
+        last = entries[(tail - 1) % n].group(4)
+
+        if self._tail is None or self._size != n:
+            count = 0
+        else:
+            count = (tail - self._tail) % n
+            if count == 0 and last != self._last:
+                # The ring wrapped around completely since the last read
+                count = n
+        self._tail, self._last, self._size = tail, last, n
+
+        events = list()
+        for i in range(tail - count, tail):
+            m = entries[i % n]
+            if m.group(6):
+                events.append(decode_mbox_entry(m))
+        return events
+
+
+class SweepCapture(object):
+
+    """Captures the entries of the sweep ring continuously.
+
+    The ring is polled in a background thread. Entries that were not in the
+    ring at the previous poll are appended to a bounded buffer, each tagged
+    with a sequence number and the time of the poll. Clients fetch the
+    entries newer than their cursor, so they neither get duplicates nor
+    depend on their own polling rate.
+
+    Args:
+        read (callable): Returns the content of wil6210/sweep_dump or None
+        interval (float): Seconds between polls of the ring
+        maxlen (int): Number of entries kept in the buffer
+    """
+
+    def __init__(self, read, interval=0.05, maxlen=4096):
+        self._read = read
+        self.interval = interval
+        self._buffer = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._seq = 0
+        self._keys = None
+        self._counter = None
+        self.polls = 0
+        self.overruns = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='sweep-capture', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.monotonic()
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error('Sweep capture failed: %s' % e)
+            self._stop.wait(max(0, self.interval - (time.monotonic() - start)))
+
+    def poll(self):
+        """Read the ring once and buffer its new entries.
+
+        Returns:
+            int: Number of new entries
+        """
+        data = self._read()
+        if data is None:
+            return 0
+        now = time.time()
+        header = parse_sweep_header(data)
+        entries = parse_sweep_dump(data)
+        keys = [(e['id'], e['src'], e['sec'], e['cdown'], e['initiator'],
+                 e['snr_raw']) for e in entries]
+
+        if self._keys is None:
+            # Everything in the ring predates the capture
+            new = list()
+        else:
+            new = [e for e, key in zip(entries, keys)
+                   if key not in self._keys]
+            if header is not None:
+                # Oldest first, the ring is written at pos
+                size = max(e['id'] for e in entries) + 1 if entries else 1
+                new.sort(key=lambda e: (e['id'] - header[1]) % size)
+        if header is not None and self._counter is not None:
+            missed = header[0] - self._counter - len(new)
+            if missed > 0:
+                self.overruns += missed
+        self._keys = set(keys)
+        self._counter = header[0] if header is not None else None
+
+        with self._lock:
+            self.polls += 1
+            for e in new:
+                e['seq'] = self._seq
+                e['time'] = now
+                self._seq += 1
+                self._buffer.append(e)
+        return len(new)
+
+    def get(self, cursor=0, limit=None):
+        """Return the captured entries starting at cursor.
+
+        Args:
+            cursor (int): Sequence number of the first entry to return,
+                usually the cursor returned by the previous call
+            limit (int, optional): Maximum number of entries to return
+
+        Returns:
+            dict: entries, the cursor for the next call, and the number of
+                entries after the given cursor already dropped from the
+                buffer
+        """
+        with self._lock:
+            first = self._seq - len(self._buffer)
+            start = max(cursor, first) - first
+            end = len(self._buffer) if limit is None else \
+                min(len(self._buffer), start + limit)
+            entries = list(itertools.islice(self._buffer, start, end))
+            return {'entries': entries, 'cursor': first + end,
+                    'dropped': max(0, first - cursor)}
+
+    def status(self):
+        with self._lock:
+            return {'running': self.running, 'interval': self.interval,
+                    'polls': self.polls, 'captured': self._seq,
+                    'buffered': len(self._buffer), 'overruns': self.overruns}
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#          ###########   ###########   ##########    ##########
+#         ############  ############  ############  ############
+#         ##            ##            ##   ##   ##  ##        ##
+#         ##            ##            ##   ##   ##  ##        ##
+#         ###########   ####  ######  ##   ##   ##  ##    ######
+#          ###########  ####  #       ##   ##   ##  ##    #    #
+#                   ##  ##    ######  ##   ##   ##  ##    #    #
+#                   ##  ##    #       ##   ##   ##  ##    #    #
+#         ############  ##### ######  ##   ##   ##  ##### ######
+#         ###########    ###########  ##   ##   ##   ##########
+#
+#            S E C U R E   M O B I L E   N E T W O R K I N G
+#
+# Author:        Daniel Steinmetzer
+# E-Mail:        dsteinmetzer@seemoo.tu-darmstadt.de
+# Website:       https://www.seemoo.de/dsteinmetzer
+# Project:       TPY - The Testbed Experimentation Framework
+# File:          wmi.py
+# Date:          2026-10-19
+#
+
+"""Declarative codec for the WMI commands and events of the wil6210 firmware.
+
+Structs are described by their fields as in the C definitions of the driver's
+wmi.h and compiled once into a little-endian struct.Struct, as all of them
+are __packed. Unpacked values are returned as namedtuple records, arrays as
+tuples.
+"""
+
+import struct
+from collections import namedtuple
+
+ctypes = {
+    'u8': 'B', 's8': 'b', 'le16': 'H', 's16': 'h', 'le32': 'I', 's32': 'i',
+    'le64': 'Q', 'pad': 'x'}
+
+
+class WMIStruct(object):
+
+    """A packed WMI struct.
+
+    Args:
+        name (str): Name of the struct, used for the record type
+        fields (list): Tuples of name, C type and optional array length.
+            Fields of type pad are left out of the record.
+        defaults (dict, optional): Values of fields that may be omitted
+            when packing
+    """
+
+    def __init__(self, name, fields, defaults=None):
+        self.name = name
+        fmt = ['<']
+        names = list()
+        arrays = list()
+        for field in fields:
+            fname, ctype = field[0], field[1]
+            count = field[2] if len(field) > 2 else None
+            fmt.append('%d%s' % (count or 1, ctypes[ctype]))
+            if ctype == 'pad':
+                continue
+            if count is not None:
+                arrays.append((len(names), count))
+            names.append(fname)
+        self.struct = struct.Struct(''.join(fmt))
+        self.size = self.struct.size
+        self.fields = tuple(names)
+        self.record = namedtuple(name, names)
+        self.defaults = dict(defaults or dict())
+        self._arrays = dict(arrays)
+        # Slices of the flat values belonging to each field of the record
+        self._slices = list()
+        pos = 0
+        for i in range(len(names)):
+            count = self._arrays.get(i)
+            if count is None:
+                self._slices.append(pos)
+                pos += 1
+            else:
+                self._slices.append(slice(pos, pos + count))
+                pos += count
+
+    def __repr__(self):
+        return 'WMIStruct(%s, %d bytes)' % (self.name, self.size)
+
+    def _flatten(self, args, kwargs):
+        if kwargs or len(args) != len(self.fields):
+            values = dict(self.defaults)
+            values.update(zip(self.fields, args))
+            values.update(kwargs)
+            try:
+                args = [values[name] for name in self.fields]
+            except KeyError as e:
+                raise TypeError('%s: missing value for %s' % (self.name, e))
+        if not self._arrays:
+            return args
+        flat = list()
+        for i, value in enumerate(args):
+            count = self._arrays.get(i)
+            if count is None:
+                flat.append(value)
+            elif len(value) != count:
+                raise ValueError('%s: %s needs %d elements, got %d' % (
+                    self.name, self.fields[i], count, len(value)))
+            else:
+                flat.extend(value)
+        return flat
+
+    def pack(self, *args, **kwargs):
+        """Pack the values given in field order or by name."""
+        return self.struct.pack(*self._flatten(args, kwargs))
+
+    def pack_into(self, buffer, offset, *args, **kwargs):
+        """Pack the values into buffer at offset, see pack."""
+        self.struct.pack_into(buffer, offset, *self._flatten(args, kwargs))
+
+    def unpack(self, data, offset=0):
+        """Unpack a record from data. Trailing bytes are ignored."""
+        flat = self.struct.unpack_from(data, offset)
+        if not self._arrays:
+            return self.record._make(flat)
+        return self.record._make([flat[s] for s in self._slices])
+
+
+WMICommand = namedtuple('WMICommand', ['cmd_id', 'cmd', 'event_ids', 'event'])
+
+WMI_NUM_MCS = 13
+MAX_NUM_OF_SECTORS = 128
+
+wmi_status_event = WMIStruct('wmi_status_event', [
+    ('status', 'u8'), ('reserved', 'pad', 3)])
+
+wmi_rs_cfg_cmd = WMIStruct('wmi_rs_cfg_cmd', [
+    ('cid', 'u8'),
+    ('rs_enable', 'u8'),
+    ('per_threshold', 'u8', WMI_NUM_MCS),
+    ('min_frame_cnt', 'u8', WMI_NUM_MCS),
+    ('stop_th', 'u8'),
+    ('mcs1_fail_th', 'u8'),
+    ('max_back_failure_th', 'u8'),
+    ('dbg_disable_internal_trigger', 'u8'),
+    ('back_failure_mask', 'le32'),
+    ('mcs_en_vec', 'le32')], defaults={
+        'rs_enable': 1,
+        'per_threshold': (0, 0, 40, 15, 10, 0, 20, 15, 10, 0, 15, 10, 10),
+        'min_frame_cnt': (0x00, 0x20, 0x40, 0x40, 0x40, 0x00, 0x50, 0x50,
+                          0x50, 0x00, 0xA0, 0xA0, 0xA0),
+        'stop_th': 0x01, 'mcs1_fail_th': 0x50, 'max_back_failure_th': 0x03,
+        'dbg_disable_internal_trigger': 0x00, 'back_failure_mask': 0x0010,
+        'mcs_en_vec': 0x1dde})
+
+wmi_rs_cfg_done_event = WMIStruct('wmi_rs_cfg_done_event', [
+    ('cid', 'u8'), ('status', 'u8'), ('reserved', 'pad', 2)])
+
+wmi_get_detailed_rs_res_cmd = WMIStruct('wmi_get_detailed_rs_res_cmd', [
+    ('cid', 'u8'), ('reserved', 'pad', 3)])
+
+wmi_get_detailed_rs_res_event = WMIStruct('wmi_get_detailed_rs_res_event', [
+    ('cid', 'u8'),
+    ('status', 'u8'),
+    ('num_of_tx_pkt', 'u8', WMI_NUM_MCS),
+    ('num_of_non_acked_pkt', 'u8', WMI_NUM_MCS),
+    ('tsf', 'le32'),
+    ('mcs', 'u8'),
+    ('reserved', 'pad', 3)])
+
+wmi_bf_control_cmd = WMIStruct('wmi_bf_control_cmd', [
+    ('bf_triggers', 'le32'),
+    ('cid', 'u8'),
+    ('txss_mode', 'u8'),
+    ('brp_mode', 'u8'),
+    ('bf_trigger_max_cts_failure_thr', 'u8'),
+    ('bf_trigger_max_cts_failure_dense_thr', 'u8'),
+    ('bf_trigger_max_back_failure_thr', 'u8'),
+    ('bf_trigger_max_back_failure_dense_thr', 'u8'),
+    ('reserved0', 'pad', 1),
+    ('wrong_sector_bis_thr', 'le32'),
+    ('long_term_enable', 'u8'),
+    ('long_term_update_thr', 'u8'),
+    ('long_term_mbps_th_tbl', 'u8', WMI_NUM_MCS),
+    ('reserved1', 'pad', 1),
+    ('long_term_trig_timeout_per_mcs', 'le16', WMI_NUM_MCS),
+    ('reserved2', 'pad', 2)], defaults={
+        'bf_triggers': 0, 'txss_mode': 0, 'brp_mode': 0,
+        'bf_trigger_max_cts_failure_thr': 0,
+        'bf_trigger_max_cts_failure_dense_thr': 0,
+        'bf_trigger_max_back_failure_thr': 0,
+        'bf_trigger_max_back_failure_dense_thr': 0,
+        'wrong_sector_bis_thr': 0, 'long_term_enable': 0,
+        'long_term_update_thr': 0,
+        'long_term_mbps_th_tbl': (0, ) * WMI_NUM_MCS,
+        'long_term_trig_timeout_per_mcs': (0, ) * WMI_NUM_MCS})
+
+wmi_set_rf_sector_on_cmd = WMIStruct('wmi_set_rf_sector_on_cmd', [
+    ('sector_idx', 'le16'), ('sector_type', 'u8'), ('rf_modules_vec', 'u8')])
+
+wmi_prio_tx_sectors_order_cmd = WMIStruct('wmi_prio_tx_sectors_order_cmd', [
+    ('tx_sectors_priority_array', 'u8', MAX_NUM_OF_SECTORS),
+    ('sector_sweep_type', 'u8'),
+    ('cid', 'u8'),
+    ('reserved', 'pad', 2)])
+
+wmi_prio_tx_sectors_number_cmd = WMIStruct('wmi_prio_tx_sectors_number_cmd', [
+    ('beacon_number_of_sectors', 'u8'),
+    ('txss_number_of_sectors', 'u8'),
+    ('cid', 'u8'),
+    ('reserved', 'pad', 1)])
+
+wmi_prio_tx_sectors_set_default_cfg_cmd = WMIStruct(
+    'wmi_prio_tx_sectors_set_default_cfg_cmd', [
+        ('sector_sweep_type', 'u8'), ('cid', 'u8'), ('reserved', 'pad', 2)])
+
+wmi_ps_dev_profile_cfg_cmd = WMIStruct('wmi_ps_dev_profile_cfg_cmd', [
+    ('ps_profile', 'u8'), ('reserved', 'pad', 3)])
+
+wmi_ps_dev_profile_cfg_event = WMIStruct('wmi_ps_dev_profile_cfg_event', [
+    ('status', 'le32')])
+
+wmi_ps_dev_profile_cfg_read_cmd = WMIStruct(
+    'wmi_ps_dev_profile_cfg_read_cmd', [('reserved', 'pad', 4)])
+
+wmi_ps_dev_profile_cfg_read_event = WMIStruct(
+    'wmi_ps_dev_profile_cfg_read_event', [
+        ('ps_profile', 'u8'), ('reserved', 'pad', 3)])
+
+wmi_aoa_meas_cmd = WMIStruct('wmi_aoa_meas_cmd', [
+    ('mac_addr', 'u8', 6),
+    ('channel', 'u8'),
+    ('aoa_meas_type', 'u8'),
+    ('meas_rf_mask', 'le32')])
+
+# Followed by length bytes of meas_data
+wmi_aoa_meas_event = WMIStruct('wmi_aoa_meas_event', [
+    ('mac_addr', 'u8', 6),
+    ('channel', 'u8'),
+    ('aoa_meas_type', 'u8'),
+    ('meas_rf_mask', 'le32'),
+    ('meas_status', 'u8'),
+    ('reserved', 'pad', 1),
+    ('length', 'le16')])
+
+wmi_set_active_silent_rssi_table_cmd = WMIStruct(
+    'wmi_set_active_silent_rssi_table_cmd', [('table', 'le32')])
+
+wmi_set_silent_rssi_table_done_event = WMIStruct(
+    'wmi_set_silent_rssi_table_done_event', [
+        ('status', 'le32'), ('table', 'le32')])
+
+commands = {
+    'echo': WMICommand(0x803, None, (0x1803, ), None),
+    'rs_cfg': WMICommand(
+        0x921, wmi_rs_cfg_cmd, (0x1921, ), wmi_rs_cfg_done_event),
+    'get_detailed_rs_res': WMICommand(
+        0x922, wmi_get_detailed_rs_res_cmd, (0x1922, ),
+        wmi_get_detailed_rs_res_event),
+    'aoa_meas': WMICommand(
+        0x923, wmi_aoa_meas_cmd, (0x1923, ), wmi_aoa_meas_event),
+    'ps_dev_profile_cfg': WMICommand(
+        0x91C, wmi_ps_dev_profile_cfg_cmd, (0x191C, ),
+        wmi_ps_dev_profile_cfg_event),
+    'ps_dev_profile_cfg_read': WMICommand(
+        0x942, wmi_ps_dev_profile_cfg_read_cmd, (0x1942, ),
+        wmi_ps_dev_profile_cfg_read_event),
+    'set_active_silent_rssi_table': WMICommand(
+        0x85C, wmi_set_active_silent_rssi_table_cmd, (0x185C, ),
+        wmi_set_silent_rssi_table_done_event),
+    'set_rf_sector_on': WMICommand(
+        0x9A4, wmi_set_rf_sector_on_cmd, (0x19A4, ), wmi_status_event),
+    'prio_tx_sectors_order': WMICommand(
+        0x9A5, wmi_prio_tx_sectors_order_cmd, (0x19A5, ), wmi_status_event),
+    'prio_tx_sectors_number': WMICommand(
+        0x9A6, wmi_prio_tx_sectors_number_cmd, (0x19A6, 0x19A5),
+        wmi_status_event),
+    'prio_tx_sectors_set_default_cfg': WMICommand(
+        0x9A7, wmi_prio_tx_sectors_set_default_cfg_cmd, (0x19A7, 0x19A5),
+        wmi_status_event),
+    'bf_control': WMICommand(
+        0x9AA, wmi_bf_control_cmd, (0x19AA, ), wmi_status_event),
+}
+
+# Commands of the table by their id
+commands_by_id = {cmd.cmd_id: cmd for cmd in commands.values()}
+
+
+def decode_event(cmd_id, data):
+    """Decode the completion event of a command of the table.
+
+    Returns:
+        dict: The fields of the event, None if the command is not in the
+            table or has no event struct
+    """
+    cmd = commands_by_id.get(cmd_id)
+    if cmd is None or cmd.event is None:
+        return None
+    return dict(cmd.event.unpack(data)._asdict())
+
+
+def encode_command(name, *args, **kwargs):
+    """Encode a command of the table.
+
+    Commands without a struct take the raw payload as only argument.
+
+    Returns:
+        tuple: cmd_id, payload and expected event ids, as taken by
+            WiGigWMI.wmi_transact_batch
+    """
+    cmd = commands[name]
+    if cmd.cmd is None:
+        payload, = args
+    else:
+        payload = cmd.cmd.pack(*args, **kwargs)
+    return cmd.cmd_id, payload, cmd.event_ids
@@ -1,7 +1,13 @@
+import logging
 import subprocess
 import socket
-import pkg_resources
+import threading
 import Pyro4
+from collections import OrderedDict
+
+from .tools.version import get_version
+
+logger = logging.getLogger(__name__)
 
 
 class TPyNode:
@@ -11,13 +17,91 @@ class TPyNode:
     The basic module provides basic commands to interface a node
     """
 
-    def __init__(self, pyro, **kwargs):
+    def __init__(self, pyro, module_factory=None, config_loader=None,
+                 **kwargs):
         self._pyro = pyro
         self._modules = dict()
+        self._module_instances = dict()
+        self._module_configs = OrderedDict()
+        self._module_factory = module_factory
+        self._config_loader = config_loader
+        self._lock = threading.RLock()
 
     def register_module(self, module, name):
         self._modules[name] = module
 
+    def add_module(self, config):
+        """Instantiate a module from its configuration and expose it."""
+        name = config['name']
+        with self._lock:
+            instance = self._module_factory(config)
+            uri = self._pyro.register(instance, name)
+            if not uri:
+                raise Exception('Unable to register module %s in daemon service.' % name)
+            logger.info('Registered %s Module instance at %s' % (config['module'], uri))
+            self._module_instances[name] = instance
+            self._module_configs[name] = config
+            self.register_module(config['module'], name)
+        return uri
+
+    def remove_module(self, name):
+        """Unregister a module from the daemon."""
+        with self._lock:
+            instance = self._module_instances.pop(name)
+            self._module_configs.pop(name, None)
+            self._modules.pop(name, None)
+            self._pyro.unregister(instance)
+            release = getattr(instance, '_release', None)
+            if callable(release):
+                release()
+            logger.info('Unregistered module %s' % name)
+
+    @Pyro4.expose
+    def reload(self):
+        """Reload the module configuration without restarting the daemon.
+
+        The configuration is read again and compared with the running one.
+        Only modules with added, removed or changed sections are
+        (re-)instantiated, all other modules keep running untouched.
+
+        Returns:
+            dict: Names of added, removed, changed, unchanged and failed modules
+        """
+        if self._config_loader is None or self._module_factory is None:
+            raise RuntimeError('Reloading is not supported by this node')
+
+        with self._lock:
+            configs = OrderedDict((c['name'], c) for c in self._config_loader())
+            result = {'added': list(), 'removed': list(), 'changed': list(),
+                      'unchanged': list(), 'failed': list()}
+
+            for name in list(self._module_configs):
+                if name not in configs:
+                    self.remove_module(name)
+                    result['removed'].append(name)
+                elif configs[name] != self._module_configs[name]:
+                    self.remove_module(name)
+                    result['changed'].append(name)
+                else:
+                    result['unchanged'].append(name)
+
+            for name, config in configs.items():
+                if name in self._module_configs:
+                    continue
+                try:
+                    self.add_module(config)
+                except Exception as e:
+                    logger.error('Unable to load module %s' % name)
+                    logger.exception(e)
+                    result['failed'].append(name)
+                    continue
+                if name not in result['changed']:
+                    result['added'].append(name)
+
+            logger.info('Reloaded modules: %s' % ', '.join(
+                '%d %s' % (len(v), k) for k, v in result.items()))
+            return result
+
     @Pyro4.expose
     def echo(self, message):
         return message
@@ -44,4 +128,4 @@ class TPyNode:
 
     @Pyro4.expose
     def version(self):
-        return pkg_resources.require('tpynode')[0].version
+        return get_version('tpynode')
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#          ###########   ###########   ##########    ##########
+#         ############  ############  ############  ############
+#         ##            ##            ##   ##   ##  ##        ##
+#         ##            ##            ##   ##   ##  ##        ##
+#         ###########   ####  ######  ##   ##   ##  ##    ######
+#          ###########  ####  #       ##   ##   ##  ##    #    #
+#                   ##  ##    ######  ##   ##   ##  ##    #    #
+#                   ##  ##    #       ##   ##   ##  ##    #    #
+#         ############  ##### ######  ##   ##   ##  ##### ######
+#         ###########    ###########  ##   ##   ##   ##########
+#
+#            S E C U R E   M O B I L E   N E T W O R K I N G
+#
+# Author:        Daniel Steinmetzer
+# E-Mail:        dsteinmetzer@seemoo.tu-darmstadt.de
+# Website:       https:://www.seemoo.de/dsteinmetzer
+# Project:       TPY - The Testbed Experimentation Framework
+# File:          worker.py
+# Date:          2026-10-19
+
+import atexit
+import logging
+import multiprocessing
+import os
+import signal
+import stat
+import tempfile
+import threading
+import Pyro4
+
+from .tools import genl
+
+logger = logging.getLogger(__name__)
+
+worker_start_timeout = 30
+
+
+def release_inherited_sockets(keep=()):
+    """Release all sockets inherited from the parent process.
+
+    The descriptors are pointed to /dev/null instead of being closed, so
+    inherited socket objects closing them later cannot hit a descriptor
+    reused by the worker.
+
+    Args:
+        keep (list): Descriptors to leave untouched
+    """
+    devnull = os.open(os.devnull, os.O_RDWR)
+    try:
+        for name in os.listdir('/proc/self/fd'):
+            fd = int(name)
+            if fd in keep or fd == devnull:
+                continue
+            try:
+                if stat.S_ISSOCK(os.fstat(fd).st_mode):
+                    os.dup2(devnull, fd)
+            except OSError:
+                pass
+    finally:
+        os.close(devnull)
+
+
+def run_module_worker(module_class, config, socket_path, conn):
+    """Entry point of a worker process hosting a single module.
+
+    The worker is forked from the multi-threaded daemon, so it first drops
+    the listening and client sockets of the daemon and the shared netlink
+    socket, together with its lock.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    release_inherited_sockets(keep=(conn.fileno(),))
+    genl.reset_nl80211()
+    try:
+        module = module_class(**config)
+        pyro = Pyro4.Daemon(unixsocket=socket_path)
+        pyro.register(module, config['name'])
+    except Exception as e:
+        logger.exception(e)
+        conn.send('%s: %s' % (type(e).__name__, e))
+        return
+    conn.send(None)
+    conn.close()
+    pyro.requestLoop()
+
+
+class ModuleWorker:
+
+    """ModuleWorker
+
+    Runs a module in a separate process. Calls to the module are forwarded
+    through a Pyro daemon listening on a unix socket. If the worker process
+    dies, it is started again on the next call.
+    """
+
+    def __init__(self, module_class, config):
+        self._module_class = module_class
+        self._config = config
+        self._name = config['name']
+        self._socket = os.path.join(
+            tempfile.gettempdir(),
+            'tpynode-%d-%s.sock' % (os.getpid(), self._name))
+        self._uri = 'PYRO:%s@./u:%s' % (self._name, self._socket)
+        self._process = None
+        self._generation = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        atexit.register(self.stop)
+
+    @property
+    def pid(self):
+        return self._process.pid if self._process else None
+
+    def is_alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def start(self):
+        if os.path.exists(self._socket):
+            os.remove(self._socket)
+        # Fork, as external modules cannot be pickled for spawn
+        ctx = multiprocessing.get_context('fork')
+        conn, child_conn = ctx.Pipe(duplex=False)
+        self._process = ctx.Process(
+            target=run_module_worker, name='tpynode-%s' % self._name,
+            args=(self._module_class, self._config, self._socket, child_conn),
+            daemon=True)
+        self._process.start()
+        child_conn.close()
+        if not conn.poll(worker_start_timeout):
+            self.stop()
+            raise Exception('Worker for module %s did not start.' % self._name)
+        error = conn.recv()
+        conn.close()
+        if error is not None:
+            self.stop()
+            raise Exception('Worker for module %s failed: %s' % (self._name, error))
+        self._generation += 1
+        logger.info('Started worker for module %s (pid %d)' % (self._name, self.pid))
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join(5)
+            logger.info('Stopped worker for module %s' % self._name)
+        self._process = None
+        if os.path.exists(self._socket):
+            os.remove(self._socket)
+
+    def proxy(self):
+        """Return the proxy to the worker for the calling thread."""
+        with self._lock:
+            if not self.is_alive():
+                logger.error('Worker for module %s died, restarting' % self._name)
+                self.stop()
+                self.start()
+            generation = self._generation
+        if getattr(self._local, 'generation', None) != generation:
+            self._local.proxy = Pyro4.core.Proxy(self._uri)
+            self._local.generation = generation
+        return self._local.proxy
+
+
+def create_forwarder(module_class, worker):
+    """Create an object exposing the same members as module_class that
+    forwards all calls to the module running in worker.
+    """
+    exposed = Pyro4.util.get_exposed_members(module_class)
+
+    def forward_method(name, oneway):
+        def method(self, *args, **kwargs):
+            return getattr(self._worker.proxy(), name)(*args, **kwargs)
+        method.__name__ = name
+        if oneway:
+            method = Pyro4.oneway(method)
+        return Pyro4.expose(method)
+
+    def forward_attr(name):
+        def fget(self):
+            return getattr(self._worker.proxy(), name)
+
+        def fset(self, value):
+            setattr(self._worker.proxy(), name, value)
+        fget.__name__ = name
+        return Pyro4.expose(property(fget, fset))
+
+    def release(self):
+        self._worker.stop()
+
+    members = {'__doc__': module_class.__doc__, '_release': release}
+    for name in exposed['methods']:
+        members[name] = forward_method(name, name in exposed['oneway'])
+    for name in exposed['attrs']:
+        members[name] = forward_attr(name)
+
+    forwarder_class = type('%sWorker' % module_class.__name__, (object,),
+                           members)
+    forwarder = forwarder_class()
+    forwarder._worker = worker
+    return forwarder